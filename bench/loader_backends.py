@@ -0,0 +1,50 @@
+"""
+Benchmark of the configuration parser backends.
+
+Usage: PYTHONPATH=src python bench/loader_backends.py [NUM_ITEMS]
+"""
+from __future__ import division, print_function, absolute_import, unicode_literals
+
+import sys
+import time
+import json
+import yaml
+from easy_menu.setting.loader import Loader, LIBYAML_AVAILABLE
+
+REPEAT = 3
+
+
+def make_menu(num_items, width=100):
+    return {'Main Menu': [
+        {'Sub Menu %d' % i: [{'Menu %d-%d' % (i, j): 'echo %d-%d' % (i, j)} for j in range(width)]}
+        for i in range(num_items // width)
+    ]}
+
+
+def measure(f):
+    ret = []
+    for _ in range(REPEAT):
+        t = time.time()
+        f()
+        ret.append(time.time() - t)
+    return min(ret)
+
+
+def main(num_items):
+    data = make_menu(num_items)
+    yaml_str = yaml.safe_dump(data, default_flow_style=False, allow_unicode=True)
+    json_str = json.dumps(data)
+
+    inputs = [('YAML', yaml_str, False), ('JSON', json_str, True)]
+    backends = ['yaml'] + (['libyaml'] if LIBYAML_AVAILABLE else []) + ['auto']
+
+    print('items: %d, YAML: %d bytes, JSON: %d bytes, best of %d' % (num_items, len(yaml_str), len(json_str), REPEAT))
+    for name, s, json_expected in inputs:
+        for backend in backends:
+            loader = Loader('.', '.', backend=backend)
+            assert loader._parse(s, json_expected) == data
+            print('%-4s %-8s %8.1f ms' % (name, backend, measure(lambda: loader._parse(s, json_expected)) * 1000))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
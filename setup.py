@@ -23,6 +23,9 @@ setup(
         'jinja2' + (' == 2.6' if sys.version_info[:2] == (3, 2) else ''),
         'mog-commons >= 0.2.0',
     ],
+    extras_require={
+        'inotify': ['inotify_simple'],
+    },
     tests_require=[
         'mock == 1.0.1',  # lock version for older version of setuptools
     ],
@@ -1 +1,2 @@
 from .command_executor import CommandExecutor
+from .job_table import Job, JobTable
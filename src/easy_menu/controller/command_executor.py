@@ -1,70 +1,631 @@
 from __future__ import division, print_function, absolute_import, unicode_literals
 
 import os
-from mog_commons.command import execute_command_with_pid, pid_exists
+import sys
+import errno
+import signal
+import subprocess
+import time
+import threading
+from datetime import datetime
+import six
+from mog_commons.command import SHOULD_NOT_ENCODE_ARGS, SHOULD_NOT_USE_BYTES
+from mog_commons.string import to_bytes
 from mog_commons.types import *
 from easy_menu.entity.command import Command, CommandLine
 from easy_menu.logger.logger import Logger
-from easy_menu.controller.executor import Executor
+from easy_menu.exceptions import CommandError
+from easy_menu.controller.executor import Executor, LineResult, Usage, END_TIMEOUT, END_INTERRUPTED, END_CPU_LIMIT, \
+    END_SIGNAL
+from easy_menu.controller.lock_registry import new_lock_registry
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+RUNNING_CACHE_TTL = 1.0  # in seconds
+TERMINATE_GRACE = 3  # seconds from SIGTERM to SIGKILL
+RETURN_CODE_TIMEOUT = 124  # same as timeout(1)
+RETURN_CODE_INTERRUPTED = 130
 
 
 class CommandExecutor(Executor):
     @types(logger=Logger)
-    def __init__(self, logger, encoding, stdin, stdout, stderr, pid_dir):
+    def __init__(self, logger, encoding, stdin, stdout, stderr, pid_dir, new_session=False, locks=None):
+        """
+        :param pid_dir: directory to put the lock files
+        :param new_session: run the commands in a new session detached from the terminal
+        :param locks: LockRegistry instance, or None to create one for pid_dir
+        """
         self.logger = logger
         self.encoding = encoding
         self.stdin = stdin
         self.stdout = stdout
         self.stderr = stderr
         self.pid_dir = pid_dir
+        self.new_session = new_session
+        self.locks = new_lock_registry(pid_dir) if locks is None else locks
+        self._output_lock = threading.Lock()
+        self._running_cache = {}  # hash string of the command line: (checked time, running)
+        self._processes = {}  # process id: Popen of the running command lines
+        self._killed = {}  # process id: reason why the process group was killed
+        self._usages = {}  # process id: Usage of the reaped process
+        self._killing = {}  # process id: number of the threads killing its process group
+        self._process_lock = threading.Lock()
+
+    def detached(self, stdin, stdout, stderr):
+        """
+        :return: copy of this executor for background jobs, which never receive signals from the terminal
+        """
+        return CommandExecutor(self.logger, self.encoding, stdin, stdout, stderr, self.pid_dir, new_session=True,
+                               locks=self.locks)
 
     @types(int, command=Command)
-    def execute(self, command):
-        ret_code = 0
+    def execute(self, command, force=False, wait=None):
+        return self.execute_detail(command, force, wait)[0]
+
+    def execute_detail(self, command, force=False, wait=None):
+        """
+        Run the command lines one after another, or at the same time if the command is configured as parallel.
+
+        The locks and the slots of all the command lines are taken before running any of them.
+
+        :param command: Command:
+        :param force: run without the locks even if the command is running (the slots are still required)
+        :param wait: function called with the position in the queue while waiting for a free slot, and with 0 when
+                     the slot is taken after waiting; return False to cancel. If None, never wait.
+                     The CommandLine and the limit of the slot are passed as well.
+        :return: tuple of the return code (the first non-zero one) and list of LineResult
+        :raise CommandError: if any lock is held by another execution, or no slot is taken
+        """
+        handles = self._acquire_locks(command, force, wait)
+        fds = [h.fd for h in handles if h.fd is not None]
+        try:
+            if command.parallel:
+                results = self._execute_parallel(command, fds)
+            else:
+                results = self._execute_sequential(command, fds)
+        finally:
+            self._release_locks(handles)
+        return next((r.return_code for r in results if r.return_code), 0), results
+
+    def _acquire_locks(self, command, force, wait):
+        locked = set(x.to_hash_string() for x in command.command_lines if x.meta.lock)
+        limits = {}  # key: (CommandLine, limit)
+        for x in command.command_lines:
+            key = x.to_hash_string()
+            if x.meta.max_concurrent is not None and key not in locked:
+                if key not in limits or x.meta.max_concurrent < limits[key][1]:
+                    limits[key] = (x, x.meta.max_concurrent)
+
+        # always in the same order not to deadlock with other executions
+        handles = []
+        try:
+            for key in ([] if force else sorted(locked)):
+                handle = self.locks.acquire(key)
+                if handle is None:
+                    raise CommandError('Already running: %s' % command.title)
+                handles.append(handle)
+                self._running_cache[key] = (time.time(), True)
+            for key in sorted(limits):
+                handles.append(self._acquire_slot(command, key, limits[key][0], limits[key][1], wait))
+        except BaseException:
+            self._release_locks(handles)
+            raise
+        return handles
+
+    def _acquire_slot(self, command, key, command_line, limit, wait):
+        """
+        Take a free slot in the order of the queue.
+
+        :param command_line: CommandLine of the key
+        :return: LockHandle of the slot
+        """
+        ticket = self.locks.enqueue(key)
+        try:
+            waited = False
+            while True:
+                position = self.locks.position(ticket)
+                if position == 1:
+                    handle = self.locks.acquire_slot(key, limit)
+                    if handle is not None:
+                        if waited and wait is not None:
+                            wait(0, command_line, limit)
+                        return handle
+                if wait is None:
+                    raise CommandError('Too many running (max %d): %s' % (limit, command.title))
+                if not wait(position, command_line, limit):
+                    raise CommandError('Cancelled: %s' % command.title)
+                waited = True
+        finally:
+            self.locks.release(ticket)
+
+    def _release_locks(self, handles):
+        for handle in handles:
+            self.locks.release(handle)
+            self._running_cache.pop(handle.key, None)
+
+    def _execute_sequential(self, command, fds):
+        results = []
         for command_line in command.command_lines:
+            start_time = datetime.now()
             try:
-                self.logger.info('Command started: %s' % command_line.cmd)
-                if command_line.meta.lock:
-                    pid_file = self._pid_file_path(command_line)
-
-                    # create pid directory
-                    if not os.path.exists(os.path.dirname(pid_file)):
-                        os.makedirs(os.path.dirname(pid_file))
-                else:
-                    pid_file = None
-
-                ret_code = execute_command_with_pid(
-                    command_line.cmd, pid_file=pid_file, shell=True, cwd=command_line.meta.work_dir,
-                    env=command_line.meta.env, stdin=self.stdin, stdout=self.stdout, stderr=self.stderr,
-                    cmd_encoding=self.encoding)
-                self.logger.info('Command ended with return code: %d' % ret_code)
-
+                ret_code, reason, usage = self._execute_line(command_line, fds)
             except KeyboardInterrupt:
                 self.logger.info('Command interrupted.')
-                ret_code = 130
+                ret_code, reason, usage = RETURN_CODE_INTERRUPTED, END_INTERRUPTED, None
+            results.append(LineResult(command_line, ret_code, start_time, datetime.now(), reason, usage))
 
             # if a command fails, the successors will not run
             if ret_code != 0:
                 break
-        return ret_code
+        return results
+
+    def _execute_parallel(self, command, fds):
+        """
+        Run the command lines with a pool of worker threads.
+
+        The output is prefixed by the command line number and written line by line.
+        """
+        command_lines = command.command_lines
+        num_workers = min(len(command_lines), command.max_parallel or len(command_lines))
+        width = len(str(len(command_lines)))
+        results = [LineResult(x, None, None, None, None, None) for x in command_lines]
+        queue = iter(list(enumerate(command_lines)))
+        queue_lock = threading.Lock()
+        errors = []
+
+        def worker():
+            while True:
+                with queue_lock:
+                    i, command_line = next(queue, (None, None))
+                if command_line is None:
+                    return
+                start_time = datetime.now()
+                try:
+                    ret_code, reason, usage = self._execute_line(command_line, fds, '[%*d] ' % (width, i + 1))
+                except Exception as e:
+                    errors.append(e)
+                    return
+                results[i] = LineResult(command_line, ret_code, start_time, datetime.now(), reason, usage)
+
+        threads = [threading.Thread(target=worker) for _ in range(num_workers)]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        try:
+            for t in threads:
+                while t.is_alive():
+                    t.join(0.1)
+        except KeyboardInterrupt:
+            # the running processes are killed; the rest are not started
+            self.logger.info('Command interrupted.')
+            with queue_lock:
+                for _ in queue:
+                    pass
+            with self._process_lock:
+                processes = list(self._processes.values())
+            self._terminate(processes, END_INTERRUPTED)
+            for t in threads:
+                t.join()
+            results = [r if r.return_code is not None else
+                       r._replace(return_code=RETURN_CODE_INTERRUPTED, reason=END_INTERRUPTED) for r in results]
+
+        # same as the sequential execution, e.g. the working directory does not exist
+        if errors:
+            raise errors[0]
+        return results
+
+    def _execute_line(self, command_line, fds, prefix=None):
+        """
+        :param fds: file descriptors of the locks to pass to the command processes
+        :param prefix: prefix of each output line, or None to pass through the output
+        :return: tuple of the return code, the reason why it ended (None if exited by itself) and Usage
+        """
+        self.logger.info('Command started: %s' % command_line.cmd)
+        ret_code, reason, usage = self._call(command_line, fds, prefix)
+        self.logger.info('Command ended with return code: %d' % ret_code)
+        if usage is not None:
+            self.logger.info('Resource usage: %s' % usage.formatted())
+        return ret_code, reason, usage
+
+    def _call(self, command_line, fds, prefix=None):
+        """
+        Run the command line in the shell in its own process group and wait for it.
+
+        The process group is killed on timeout or interrupt, escalating from SIGTERM to SIGKILL.
+        The command processes inherit the file descriptors of the locks, so that the locks are held until the
+        command ends even if this process dies first.
+
+        :param fds: file descriptors of the locks to pass to the command processes
+        :param prefix: prefix of each output line, or None to pass through the output
+        :return: tuple of the return code, the reason why it ended (None if exited by itself) and Usage (None if
+                 not available)
+        """
+        meta = command_line.meta
+        kwargs = {}
+        tty_fd = None
+        if os.name != 'nt':
+            kwargs = self._group_options()
+            if prefix is None and 'process_group' in kwargs:
+                tty_fd = self._foreground_tty()
+            if fds and six.PY3:
+                kwargs['pass_fds'] = fds
+        if prefix is None:
+            stdin, stdout, stderr = self.stdin, self.stdout, self.stderr
+        else:
+            # parallel command lines cannot share the input
+            stdin, stdout, stderr = open(os.devnull, 'rb'), subprocess.PIPE, subprocess.PIPE
+
+        p = subprocess.Popen(self._shell_args(command_line), shell=True, cwd=meta.work_dir,
+                             env=self._encode_env(meta.env.flatten()), stdin=stdin,
+                             stdout=stdout, stderr=stderr, **kwargs)
+        with self._process_lock:
+            self._processes[p.pid] = p
+        if tty_fd is not None:
+            self._set_foreground(tty_fd, p.pid)
+            try:
+                # the shell may have been stopped by reading the terminal before it was handed over
+                os.killpg(p.pid, signal.SIGCONT)
+            except OSError:
+                pass
+        copiers = []
+        if prefix is not None:
+            stdin.close()
+            data = to_bytes(prefix, self.encoding)
+            copiers = [threading.Thread(target=self._copy_lines, args=(p.stdout, self.stdout, data)),
+                       threading.Thread(target=self._copy_lines, args=(p.stderr, self.stderr, data))]
+            for t in copiers:
+                t.daemon = True
+                t.start()
+        try:
+            try:
+                # the process is left unreaped until its group is checked
+                ret = self._wait(p, meta.timeout, False, tty_fd)
+                if ret is None:
+                    self.logger.info('Command timed out after %s seconds.' % meta.timeout)
+                    self._terminate([p], END_TIMEOUT)
+                elif ret == -signal.SIGINT:
+                    # the rest of the process group may ignore SIGINT
+                    self._terminate([p], END_INTERRUPTED)
+                ret = self._poll(p, True)
+            finally:
+                if tty_fd is not None:
+                    self._set_foreground(tty_fd, os.getpgrp())
+            for t in copiers:
+                t.join()
+        except BaseException:
+            self._terminate([p], END_INTERRUPTED)
+            self._poll(p, True)
+            raise
+        finally:
+            with self._process_lock:
+                self._processes.pop(p.pid, None)
+                reason = self._killed.pop(p.pid, None)
+                usage = self._usages.pop(p.pid, None)
+
+        if reason == END_TIMEOUT:
+            return RETURN_CODE_TIMEOUT, reason, usage
+        if reason == END_INTERRUPTED:
+            return RETURN_CODE_INTERRUPTED, reason, usage
+        if ret >= 0:
+            return ret, None, usage
+
+        # killed by a signal
+        sig = -ret
+        if sig == getattr(signal, 'SIGXCPU', None) and meta.cpu_limit is not None:
+            return 128 + sig, END_CPU_LIMIT, usage
+        return 128 + sig, END_SIGNAL, usage
+
+    def _group_options(self):
+        """
+        :return: keyword arguments for Popen to start the shell in its own process group without preexec_fn, which
+                 may deadlock the child when the menu has other threads (background jobs and parallel command lines)
+        """
+        if not self.new_session and sys.version_info >= (3, 11):
+            return {'process_group': 0}
+        # before Python 3.11, only a new session gives a process group, without the controlling terminal
+        return {'start_new_session': True} if six.PY3 else {'preexec_fn': os.setsid}
+
+    def _shell_args(self, command_line):
+        """
+        :return: args for Popen to run the command line in the shell, with the resource limits and the niceness
+        """
+        setup = [] if os.name == 'nt' else self._limit_commands(command_line.meta)
+        if not setup:
+            return self._encode_args(command_line.cmd)
+        # the command line is passed as $1 to the wrapper, which needs no quoting
+        return self._encode_args(' && '.join(setup), 'sh', command_line.cmd)
+
+    def _limit_commands(self, meta):
+        """
+        :return: list of the shell commands to apply the meta, ending with the one to run the command line ("$1"),
+                 or an empty list if nothing to apply
+        """
+        ret = []
+        if resource is not None:
+            if meta.cpu_limit is not None:
+                # SIGXCPU at the soft limit, SIGKILL at the hard limit
+                hard = self._cap_rlimit(resource.RLIMIT_CPU, meta.cpu_limit + 1)
+                ret += ['ulimit -S -t %d' % min(meta.cpu_limit, hard), 'ulimit -H -t %d' % hard]
+            if meta.memory_limit is not None:
+                ret.append('ulimit -v %d' % (self._cap_rlimit(resource.RLIMIT_AS, meta.memory_limit) // 1024))
+        if meta.nice is not None:
+            ret.append('exec nice -n %d /bin/sh -c "$1"' % meta.nice)
+        elif ret:
+            ret.append('exec /bin/sh -c "$1"')
+        return ret
+
+    @staticmethod
+    def _cap_rlimit(kind, value):
+        """
+        :return: the value not exceeding the current hard limit, which cannot be raised
+        """
+        hard = resource.getrlimit(kind)[1]
+        return value if hard == resource.RLIM_INFINITY else min(value, hard)
+
+    def _foreground_tty(self):
+        """
+        :return: file descriptor of the terminal if the input is the terminal and this process is its foreground,
+                 otherwise None
+        """
+        if not self._is_main_thread():
+            return None  # signal handlers can be changed only in the main thread
+        try:
+            fd = self.stdin.fileno()
+            if os.isatty(fd) and os.tcgetpgrp(fd) == os.getpgrp():
+                return fd
+        except (AttributeError, ValueError, IOError, OSError):
+            pass
+        return None
+
+    @staticmethod
+    def _is_main_thread():
+        if hasattr(threading, 'main_thread'):
+            return threading.current_thread() is threading.main_thread()
+        # Python 2 has no public API for the main thread
+        return isinstance(threading.current_thread(), threading._MainThread)
+
+    @staticmethod
+    def _set_foreground(tty_fd, pgid):
+        """Give the terminal to the process group so that it can read the input and receive Ctrl-C."""
+        handler = signal.signal(signal.SIGTTOU, signal.SIG_IGN)
+        try:
+            os.tcsetpgrp(tty_fd, pgid)
+        except OSError:
+            pass
+        finally:
+            signal.signal(signal.SIGTTOU, handler)
+
+    def _wait(self, p, timeout, reap=True, tty_fd=None):
+        """
+        :param reap: reap the process after it ends
+        :param tty_fd: file descriptor of the terminal given to the process (see _poll)
+        :return: return code, or None if timed out
+        """
+        if timeout is None:
+            return self._poll(p, True, reap, tty_fd)
+
+        deadline = time.time() + timeout
+        while True:
+            ret = self._poll(p, False, reap, tty_fd)
+            if ret is not None:
+                return ret
+            if time.time() >= deadline:
+                return None
+            time.sleep(min(0.05, max(0, deadline - time.time())))
+
+    def _poll(self, p, block=False, reap=True, tty_fd=None):
+        """
+        Check the process by waitid(2) without reaping it, and reap it by wait4(2) to collect its resource usage.
+
+        The process is never reaped while its group is being killed, since the zombie keeps the process group id
+        from being reused by another process.
+
+        :param block: wait until the process ends
+        :param reap: reap the process if it has ended
+        :param tty_fd: file descriptor of the terminal given to the process, or None; if given, the process stopped
+                       by Ctrl-Z is resumed (see _suspend)
+        :return: return code, or None if the process is running (or not reaped yet while reap is True)
+        """
+        if p.returncode is not None:
+            return p.returncode
+        if not hasattr(os, 'waitid'):
+            return p.wait() if block else p.poll()
+
+        flags = os.WEXITED | os.WNOWAIT | (0 if block else os.WNOHANG) | (0 if tty_fd is None else os.WSTOPPED)
+        while True:
+            try:
+                info = os.waitid(os.P_PID, p.pid, flags)
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                if e.errno != errno.ECHILD:
+                    raise
+                # reaped by another thread just now
+                return p.returncode
+            if info is None:
+                return None
+            if info.si_code == os.CLD_STOPPED:
+                self._suspend(p, tty_fd)
+                continue
+
+            ret = -info.si_status if info.si_code in (os.CLD_KILLED, os.CLD_DUMPED) else info.si_status
+            if not reap:
+                return ret
+            with self._process_lock:
+                if p.returncode is None and p.pid not in self._killing:
+                    ru = os.wait4(p.pid, 0)[2]  # never blocks
+                    self._usages[p.pid] = Usage.from_rusage(ru)
+                    p.returncode = ret
+            if p.returncode is not None or not block:
+                return p.returncode
+            time.sleep(0.05)
+
+    def _suspend(self, p, tty_fd):
+        """
+        Handle the foreground command stopped by Ctrl-Z, which still owns the terminal.
+
+        Take the terminal back and stop this process as a job of the parent shell, then give the terminal back and
+        continue the command when resumed. Without job control (e.g. the menu is the login shell), the kernel
+        discards SIGTSTP to the orphaned process group and the command is continued at once.
+        """
+        self._set_foreground(tty_fd, os.getpgrp())
+        try:
+            os.kill(0, signal.SIGTSTP)
+        except OSError:
+            pass
+        self._set_foreground(tty_fd, p.pid)
+        try:
+            os.killpg(p.pid, signal.SIGCONT)
+        except OSError:
+            pass
+
+    def _terminate(self, processes, reason):
+        """
+        Kill the process groups of the processes, sending SIGTERM first and SIGKILL after TERMINATE_GRACE seconds.
+
+        :param processes: list of Popen (the ones already reaped are skipped)
+        :param reason: reason to record for each process
+        """
+        with self._process_lock:
+            processes = [p for p in processes if p.returncode is None]
+            for p in processes:
+                self._killed.setdefault(p.pid, reason)
+                self._killing[p.pid] = self._killing.get(p.pid, 0) + 1
+
+        try:
+            if os.name == 'nt':
+                for p in processes:
+                    if p.poll() is None:
+                        p.kill()
+                return
+
+            alive = self._kill_groups(processes, signal.SIGTERM)
+            deadline = time.time() + TERMINATE_GRACE
+            while alive and time.time() < deadline:
+                time.sleep(0.05)
+                alive = [p for p in alive if self._group_alive(p)]
+            if alive:
+                self.logger.info('Command did not stop. Killing the process group.')
+                self._kill_groups(alive, signal.SIGKILL)
+        finally:
+            with self._process_lock:
+                for p in processes:
+                    self._killing[p.pid] -= 1
+                    if not self._killing[p.pid]:
+                        del self._killing[p.pid]
+
+    @staticmethod
+    def _kill_groups(processes, sig):
+        """
+        The processes must not be reaped, otherwise the process group id may have been reused.
+
+        :return: list of the processes whose groups exist
+        """
+        ret = []
+        for p in processes:
+            try:
+                os.killpg(p.pid, sig)
+                ret.append(p)
+            except OSError as e:
+                if e.errno != errno.ESRCH:
+                    raise
+        return ret
+
+    def _group_alive(self, p):
+        """
+        :return: True if any process in the group of the unreaped process may be running
+        """
+        if self._poll(p, reap=False) is None:
+            return True
+
+        # the zombie leader is in the group as well
+        try:
+            os.killpg(p.pid, 0)
+        except OSError as e:
+            if e.errno == errno.ESRCH:
+                return False
+            raise
+        return self._has_group_members(p.pid)
+
+    @staticmethod
+    def _has_group_members(pgid):
+        """
+        :return: True if any running process other than the leader is in the group, or unknown without procfs
+        """
+        if not os.path.isdir('/proc/self'):
+            return True
+        for name in os.listdir('/proc'):
+            if not name.isdigit() or int(name) == pgid:
+                continue
+            try:
+                with open('/proc/%s/stat' % name, 'rb') as f:
+                    # the command name may contain spaces and parentheses
+                    fields = f.read().rsplit(b')', 1)[1].split()
+            except (IOError, OSError, IndexError):
+                continue  # ended just now
+            if fields[0] != b'Z' and int(fields[2]) == pgid:
+                return True
+        return False
+
+    def _copy_lines(self, pipe, output, prefix):
+        """Copy the output of the parallel command line with the prefix, never splitting a line."""
+        with pipe:
+            for line in iter(pipe.readline, b''):
+                if not line.endswith(b'\n'):
+                    line += b'\n'
+                with self._output_lock:
+                    self._write_bytes(output, prefix + line)
+
+    def _write_bytes(self, output, data):
+        out = getattr(output, 'buffer', output)
+        if out is not output:
+            output.flush()
+        try:
+            out.write(data)
+        except TypeError:
+            # text stream
+            out.write(data.decode(self.encoding, 'replace'))
+        out.flush()
+
+    def _encode_args(self, cmd, *params):
+        """
+        :param params: positional parameters of the shell ($0, $1, ...)
+        """
+        # same as mog_commons.command.execute_command
+        args = [x if SHOULD_NOT_ENCODE_ARGS else to_bytes(x, self.encoding) for x in (cmd,) + params]
+        return args if SHOULD_NOT_USE_BYTES or params else args[0]
+
+    def _encode_env(self, env):
+        d = dict(os.environ, **env)
+        if SHOULD_NOT_ENCODE_ARGS:
+            return d
+        return dict((k.encode(self.encoding), v.encode(self.encoding)) for k, v in d.items())
 
     @types(bool, command=Command)
     def is_running(self, command):
-        def check_pid(cmdline):
-            if not cmdline.meta.lock:
-                return False
+        return self.running_commands([command], 0)[0]
 
-            path = self._pid_file_path(cmdline)
-            if not os.path.exists(path):
-                return False
+    def running_commands(self, commands, max_age=RUNNING_CACHE_TTL):
+        """
+        Check if the locked command lines are running for all the commands at once.
 
-            with open(path, 'r') as f:
-                pid = int(f.read())
-            return pid_exists(pid)
+        The result of each command line is reused for max_age seconds so that redrawing pages does not touch
+        the file system every time.
 
-        return any(check_pid(c) for c in command.command_lines)
+        :param commands: list of Command
+        :param max_age: seconds to reuse the previous result
+        :return: list of bool for each command
+        """
+        now = time.time()
+        keys = [[x.to_hash_string() for x in c.command_lines if x.meta.lock] for c in commands]
 
-    @types(String, cmdline=CommandLine)
-    def _pid_file_path(self, cmdline):
-        h = cmdline.to_hash_string()
-        return os.path.join(self.pid_dir, h[:2], h[2:])
+        expired = set(k for ks in keys for k in ks
+                      if k not in self._running_cache or self._running_cache[k][0] + max_age <= now)
+        if expired:
+            held = self.locks.held(expired)
+            for k in expired:
+                self._running_cache[k] = (now, k in held)
+        return [any(self._running_cache[k][1] for k in ks) for ks in keys]
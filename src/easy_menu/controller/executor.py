@@ -1,8 +1,68 @@
 from __future__ import division, print_function, absolute_import, unicode_literals
 
+import sys
 from abc import ABCMeta, abstractmethod
+from collections import namedtuple
 import six
 
+# why the command line ended other than exiting by itself
+END_TIMEOUT = 'timeout'
+END_INTERRUPTED = 'interrupted'
+END_CPU_LIMIT = 'cpu_limit'
+END_SIGNAL = 'signal'
+
+# result of one command line (return_code is None if not started, reason is one of END_* or None,
+# usage is Usage or None if not available)
+LineResult = namedtuple('LineResult', ['command_line', 'return_code', 'start_time', 'end_time', 'reason', 'usage'])
+
+
+class Usage(namedtuple('Usage', ['user_time', 'system_time', 'max_rss', 'block_in', 'block_out',
+                                 'voluntary_switches', 'involuntary_switches'])):
+    """
+    Resource usage of a command line, including the descendant processes waited for.
+
+    Times are in seconds, and max_rss is in bytes. On Linux, max_rss is never less than the memory of the menu
+    process when the command was spawned, since the kernel counts it until the exec.
+    """
+
+    __slots__ = ()
+
+    @staticmethod
+    def from_rusage(ru):
+        """
+        :param ru: struct_rusage returned by os.wait4
+        """
+        # ru_maxrss is in kilobytes except on macOS
+        max_rss = ru.ru_maxrss if sys.platform == 'darwin' else ru.ru_maxrss * 1024
+        return Usage(ru.ru_utime, ru.ru_stime, max_rss, ru.ru_inblock, ru.ru_oublock, ru.ru_nvcsw, ru.ru_nivcsw)
+
+    @staticmethod
+    def total(usages):
+        """
+        :param usages: list of Usage or None
+        :return: sum of the usages (max of max_rss), or None if no usage is available
+        """
+        usages = [u for u in usages if u is not None]
+        if not usages:
+            return None
+        return Usage(*[max(xs) if k == 'max_rss' else sum(xs) for k, xs in zip(Usage._fields, zip(*usages))])
+
+    def formatted(self):
+        return 'user %.2fs, sys %.2fs, max RSS %s, block I/O %d in / %d out, context switches %d / %d' % (
+            self.user_time, self.system_time, format_bytes(self.max_rss), self.block_in, self.block_out,
+            self.voluntary_switches, self.involuntary_switches)
+
+
+def format_bytes(n):
+    """
+    :param n: number of bytes
+    :return: string such as "12.3 MB"
+    """
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if n < 1024 or unit == 'GB':
+            return ('%d %s' if unit == 'B' else '%.1f %s') % (n, unit)
+        n /= 1024
+
 
 @six.add_metaclass(ABCMeta)
 class Executor(object):
@@ -12,5 +72,19 @@ class Executor(object):
     def execute(self, command):
         """abstract method"""
 
+    def execute_detail(self, command, force=False, wait=None):
+        """
+        :param force: run even if the command is running
+        :param wait: function called while waiting for a free slot (see CommandExecutor)
+        :return: tuple of the return code and list of LineResult (empty if not available)
+        """
+        return self.execute(command), []
+
     def is_running(self, command):
         """abstract method"""
+
+    def running_commands(self, commands):
+        """
+        :return: list of bool for each command
+        """
+        return [self.is_running(c) for c in commands]
@@ -0,0 +1,136 @@
+from __future__ import division, print_function, absolute_import, unicode_literals
+
+import os
+import time
+import threading
+import traceback
+from datetime import datetime
+from mog_commons.string import to_bytes
+from mog_commons.types import *
+from easy_menu.entity.command import Command
+from easy_menu.exceptions import CommandError
+from easy_menu.controller.command_executor import CommandExecutor
+
+SLOT_POLL_INTERVAL = 1  # in seconds
+
+
+class Job(object):
+    """
+    Command running in background.
+    """
+
+    def __init__(self, job_id, title, log_path, start_time):
+        """
+        :param job_id: serial number in the session starting from 1
+        :param title: title of the command
+        :param log_path: path to the file which the output is written to
+        :param start_time: datetime when the job started
+        """
+        self.job_id = job_id
+        self.title = title
+        self.log_path = log_path
+        self.start_time = start_time
+        self.end_time = None
+        self.return_code = None
+
+    @property
+    def running(self):
+        return self.end_time is None
+
+    def elapsed(self, now):
+        """
+        :param now: current datetime
+        :return: timedelta from the start to the end (or now if running)
+        """
+        return (now if self.end_time is None else self.end_time) - self.start_time
+
+
+class JobTable(object):
+    """
+    Runs commands in background threads and keeps all the jobs started in the session.
+
+    The output of each job is written to a log file, and the command processes are detached from the terminal
+    so that the keyboard interrupts for the foreground commands never stop them.
+    """
+
+    @types(executor=CommandExecutor)
+    def __init__(self, executor, log_dir):
+        """
+        :param executor: CommandExecutor instance for the foreground commands
+        :param log_dir: directory to write the log files
+        """
+        self.executor = executor
+        self.log_dir = log_dir
+        self.jobs = []
+        self._lock = threading.Lock()
+
+    @types(Job, command=Command)
+    def start(self, command, force=False):
+        """
+        Start the command in background.
+
+        :param command: Command instance
+        :param force: run even if the command is running
+        :return: Job instance
+        """
+        if not os.path.exists(self.log_dir):
+            os.makedirs(self.log_dir)
+
+        start_time = datetime.now()
+        with self._lock:
+            job_id = len(self.jobs) + 1
+            log_path = os.path.join(self.log_dir, '%s-%d-%d.log' % (
+                start_time.strftime('%Y%m%d-%H%M%S'), os.getpid(), job_id))
+            job = Job(job_id, command.title, log_path, start_time)
+            self.jobs.append(job)
+
+        # open the log file here to report errors immediately
+        log = open(log_path, 'wb')
+        thread = threading.Thread(target=self._run, args=(job, command, log, force))
+        thread.daemon = True
+        thread.start()
+        return job
+
+    def running_jobs(self):
+        """
+        :return: list of the running jobs
+        """
+        return [job for job in self.jobs if job.running]
+
+    def _run(self, job, command, log, force):
+        return_code = 1
+        try:
+            with log, open(os.devnull, 'rb') as devnull:
+                try:
+                    return_code = self.executor.detached(devnull, log, log).execute(command, force, self._waiter(log))
+                except (IOError, OSError) as e:
+                    log.write(('%s: %s\n' % (e.__class__.__name__, e)).encode(self.executor.encoding, 'replace'))
+                    return_code = 127
+                except CommandError as e:
+                    log.write(('%s\n' % e).encode(self.executor.encoding, 'replace'))
+                except Exception:
+                    # never leave the job running forever
+                    log.write(to_bytes(traceback.format_exc(), self.executor.encoding))
+        finally:
+            # end_time should be the last since it marks the job finished
+            job.return_code = return_code
+            job.end_time = datetime.now()
+
+    def _waiter(self, log):
+        """
+        :return: function to wait for a free slot in background, writing the queue position to the log
+        """
+        last = [None]
+
+        def wait(position, command_line, limit):
+            if position != last[0]:
+                last[0] = position
+                msg = 'Started.\n' if position == 0 else 'Waiting for a free slot of "%s" (max %d): position %d\n' % (
+                    command_line.cmd, limit, position)
+                log.write(msg.encode(self.executor.encoding))
+                log.flush()
+            if position:
+                time.sleep(SLOT_POLL_INTERVAL)
+            return True
+
+        return wait
@@ -0,0 +1,271 @@
+from __future__ import division, print_function, absolute_import, unicode_literals
+
+import os
+import errno
+import time
+import itertools
+from abc import ABCMeta, abstractmethod
+from collections import namedtuple
+import six
+from mog_commons.command import pid_exists
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+ACQUIRE_GRACE = 0.05  # in seconds
+
+# lock held by this process (fd is None if the lock is not bound to a file descriptor)
+LockHandle = namedtuple('LockHandle', ['key', 'fd'])
+
+
+@six.add_metaclass(ABCMeta)
+class LockRegistry(object):
+    """
+    Exclusive locks of the command lines shared by all the sessions on the host.
+
+    Each lock is a file named after the key (hash string of the command line) under lock_dir, and exists only
+    while the lock is held unless the holder has crashed. Use `new_lock_registry` to get the best implementation
+    for the platform.
+
+    A counting semaphore of a key is a set of locks "<key>.<n>" (slots), and its waiters line up by holding the
+    locks "<key>.q<time>-<pid>-<serial>" (tickets). The tickets of the crashed waiters are no longer held like any
+    other lock, so they never block the queue.
+    """
+
+    def __init__(self, lock_dir):
+        """
+        :param lock_dir: directory to put the lock files
+        """
+        self.lock_dir = lock_dir
+        self._serial = itertools.count()
+
+    def path(self, key):
+        return os.path.join(self.lock_dir, key[:2], key[2:])
+
+    @abstractmethod
+    def acquire(self, key):
+        """
+        Check and take the lock atomically.
+
+        :param key: hash string of the command line
+        :return: LockHandle, or None if the lock is held by anyone else
+        """
+
+    @abstractmethod
+    def release(self, handle):
+        """
+        :param handle: LockHandle returned by acquire
+        """
+
+    def acquire_slot(self, key, limit):
+        """
+        :param key: hash string of the command line
+        :param limit: number of the slots
+        :return: LockHandle of any free slot, or None if all the slots are held
+        """
+        slots = ['%s.%d' % (key, i) for i in range(limit)]
+        held = self.held(slots)
+        for slot in slots:
+            if slot not in held:
+                handle = self.acquire(slot)
+                if handle is not None:
+                    return handle
+        return None
+
+    def enqueue(self, key):
+        """
+        :param key: hash string of the command line
+        :return: LockHandle of the ticket (release it to leave the queue)
+        """
+        return self.acquire('%s.q%017.6f-%d-%d' % (key, time.time(), os.getpid(), next(self._serial)))
+
+    def position(self, ticket):
+        """
+        :param ticket: LockHandle returned by enqueue
+        :return: position in the queue starting from 1
+        """
+        d, name = ticket.key[:2], ticket.key[2:]
+        prefix = name[:name.index('.q') + 2]
+        earlier = [x for x in self._list_dir(os.path.join(self.lock_dir, d)) if x.startswith(prefix) and x < name]
+        return 1 + sum(1 for x in earlier if self._is_held(os.path.join(self.lock_dir, d, x)))
+
+    def held(self, keys=None):
+        """
+        List the locks held by any process, listing each directory only once.
+
+        :param keys: keys to check, or None for all the lock files
+        :return: set of the keys held
+        """
+        if keys is None:
+            by_dir = dict((d, None) for d in self._list_dir(self.lock_dir))
+        else:
+            by_dir = {}
+            for k in keys:
+                by_dir.setdefault(k[:2], set()).add(k[2:])
+
+        ret = set()
+        for d, names in by_dir.items():
+            for name in self._list_dir(os.path.join(self.lock_dir, d)):
+                if (names is None or name in names) and self._is_held(os.path.join(self.lock_dir, d, name)):
+                    ret.add(d + name)
+        return ret
+
+    @abstractmethod
+    def _is_held(self, path):
+        """
+        :param path: path to the lock file
+        :return: True if the lock is held by any process
+        """
+
+    def _make_dir(self, path):
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    @staticmethod
+    def _list_dir(path):
+        try:
+            return os.listdir(path)
+        except OSError:
+            return []
+
+
+class FcntlLockRegistry(LockRegistry):
+    """
+    Locks by flock(2), which the kernel releases when the holder dies.
+
+    The lock file is removed by the holder before unlocking. Since another process may have opened the file just
+    before that, the lock is taken again if the locked file is no longer at the path. flock(2) is used instead of
+    the POSIX record locks because the latter belong to the process and cannot exclude the threads of the same
+    session, e.g. background jobs.
+    Checking a lock takes a shared lock for a moment, so acquire retries for ACQUIRE_GRACE seconds before giving up.
+    The file descriptor is closed on exec, and passed to the command processes explicitly (see CommandExecutor) so
+    that the lock lasts as long as the command even if the menu exits first.
+    """
+
+    def acquire(self, key):
+        path = self.path(key)
+        self._make_dir(path)
+
+        deadline = time.time() + ACQUIRE_GRACE
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+                if not self._try_lock(fd, fcntl.LOCK_EX):
+                    os.close(fd)
+                    if time.time() >= deadline:
+                        return None
+                    time.sleep(0.005)
+                    continue
+
+                try:
+                    same = os.path.samestat(os.fstat(fd), os.stat(path))
+                except OSError:
+                    same = False
+                if not same:
+                    # removed by the previous holder
+                    os.close(fd)
+                    continue
+
+                # for information only
+                os.ftruncate(fd, 0)
+                os.write(fd, str(os.getpid()).encode('ascii'))
+                return LockHandle(key, fd)
+            except BaseException:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+                raise
+
+    def release(self, handle):
+        try:
+            os.remove(self.path(handle.key))
+        except OSError:
+            pass
+        finally:
+            os.close(handle.fd)
+
+    def _is_held(self, path):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return False  # released just now
+        try:
+            if self._try_lock(fd, fcntl.LOCK_SH):
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                return False
+            return True
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _try_lock(fd, operation):
+        try:
+            fcntl.flock(fd, operation | fcntl.LOCK_NB)
+            return True
+        except (IOError, OSError) as e:
+            if e.errno in (errno.EAGAIN, errno.EACCES, errno.EWOULDBLOCK):
+                return False
+            raise
+
+
+class PidLockRegistry(LockRegistry):
+    """
+    Locks by files containing the process id of the holder, for the platforms without fcntl.
+
+    The file is created exclusively, and taken over if the holder no longer exists.
+    """
+
+    def acquire(self, key):
+        path = self.path(key)
+        self._make_dir(path)
+
+        while True:
+            try:
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+                if self._is_held(path):
+                    return None
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+
+            try:
+                os.write(fd, str(os.getpid()).encode('ascii'))
+            finally:
+                os.close(fd)
+            return LockHandle(key, None)
+
+    def release(self, handle):
+        try:
+            os.remove(self.path(handle.key))
+        except OSError:
+            pass
+
+    def _is_held(self, path):
+        try:
+            with open(path, 'r') as f:
+                pid = int(f.read())
+        except (IOError, OSError):
+            return False  # released just now
+        except ValueError:
+            return True  # being written
+        return pid_exists(pid)
+
+
+def new_lock_registry(lock_dir):
+    """
+    :param lock_dir: directory to put the lock files
+    :return: FcntlLockRegistry if available, otherwise PidLockRegistry
+    """
+    return (PidLockRegistry if fcntl is None else FcntlLockRegistry)(lock_dir)
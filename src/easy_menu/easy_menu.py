@@ -5,12 +5,15 @@ import signal
 import os
 import socket
 import getpass
+import locale
 from mog_commons.terminal import TerminalHandler
-from easy_menu.view import Terminal
-from easy_menu.controller import CommandExecutor
+from easy_menu.view import Terminal, SearchIndex
+from easy_menu.controller import CommandExecutor, JobTable
 from easy_menu.setting.setting import Setting
 from easy_menu.logger import SystemLogger
-from easy_menu.exceptions import EasyMenuError
+from easy_menu.entity import Command
+from easy_menu.setting.loader import Loader
+from easy_menu.exceptions import EasyMenuError, SettingError
 
 
 def get_hostname():
@@ -23,6 +26,54 @@ def get_username():
     return getpass.getuser()
 
 
+def run(menu_path, config_path=None, work_dir=None, stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr,
+        **kwargs):
+    """
+    Execute the command in the menu without the menu screen nor confirmation.
+
+    The configuration is loaded in the same way as the interactive mode, so the meta configurations and the audit
+    logging also apply.
+
+    :param menu_path: titles separated by ">" (e.g. "Main Menu > Sub Menu > Command")
+    :param config_path: path or url of the configuration (looked up from work_dir if None)
+    :param work_dir: working directory
+    :param kwargs: other parameters of Setting
+    :return: return code of the command
+    :raise EasyMenuError: if failed to load the configuration or the command is not available
+    """
+    if config_path is not None and not Loader.is_url(config_path):
+        config_path = os.path.abspath(config_path)
+    setting = Setting(config_path=config_path, work_dir=work_dir, stdin=stdin, stdout=stdout, stderr=stderr, **kwargs)
+    return run_setting(setting.lookup_config(), menu_path)
+
+
+def run_setting(setting, menu_path):
+    """
+    Execute the command at the menu path with the setting before loading the configuration.
+
+    :param setting: Setting instance
+    :param menu_path: titles separated by ">"
+    :return: return code of the command
+    """
+    encoding = setting.encoding or getattr(setting.stdout, 'encoding', None) or locale.getpreferredencoding()
+
+    # load only the sub menus on the path; messages from the loader go to stderr not to mix with the output
+    loaded = setting.copy(encoding=encoding, stdout=setting.stderr, lazy=True, watch=False).load_config()
+    try:
+        titles = [s.strip() for s in menu_path.split('>')]
+        if titles[0] == loaded.root_menu.title:
+            titles = titles[1:]
+        command = loaded.root_menu.find(titles)
+    finally:
+        loaded.close()
+    if not isinstance(command, Command):
+        raise SettingError('Command not found: %s' % menu_path)
+
+    executor = CommandExecutor(SystemLogger(encoding), encoding, setting.stdin, setting.stdout, setting.stderr,
+                               setting.pid_dir)
+    return executor.execute(command)
+
+
 def main(stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr, keep_input_clean=True, timing=True):
     """
     Main function
@@ -30,11 +81,25 @@ def main(stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr, keep_input_clean
 
     base_setting = Setting(stdin=stdin, stdout=stdout, stderr=stderr).parse_args(sys.argv)
 
+    if base_setting.gc_cache:
+        num_entries, num_bytes = base_setting.gc_eval_cache()
+        base_setting.stdout.write('Removed %d cache entries (%d bytes).\n' % (num_entries, num_bytes))
+        return 0
+
+    if base_setting.run_path is not None:
+        try:
+            return run_setting(base_setting.lookup_config(), base_setting.run_path)
+        except (EasyMenuError, IOError, OSError) as e:
+            # IOError and OSError may come from the command, e.g. working directory does not exist
+            base_setting.stderr.write('%s: %s\n' % (e.__class__.__name__, e))
+            return 2
+
     # for terminal restoration
     handler = TerminalHandler(stdin=stdin, stdout=stdout, stderr=stderr,
                               keep_input_clean=keep_input_clean, getch_enabled=base_setting.getch_enabled)
     signal.signal(signal.SIGTERM, handler.restore_terminal)
 
+    setting = None
     try:
         setting = base_setting.resolve_encoding(handler).lookup_config().load_config()
         executor = CommandExecutor(
@@ -52,9 +117,14 @@ def main(stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr, keep_input_clean
             encoding=setting.encoding,
             lang=setting.lang,
             width=setting.width,
-            timing=timing
+            timing=timing,
+            watcher=setting.watcher,
+            search_index=SearchIndex(setting.root_menu),
+            job_table=JobTable(executor, setting.job_dir)
         )
 
+        if setting.watcher:
+            setting.watcher.start(executor.logger)
         t.loop()
     except (KeyboardInterrupt, EOFError):
         pass
@@ -72,4 +142,6 @@ def main(stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr, keep_input_clean
     finally:
         # assume to restore original terminal settings
         handler.restore_terminal(None, None)
+        if setting is not None:
+            setting.close()
     return 0
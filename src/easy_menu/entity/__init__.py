@@ -3,7 +3,9 @@ KEYWORD_INCLUDE = 'include'
 KEYWORD_EVAL = 'eval'
 
 from .item import Item
+from .env import Env
 from .meta import Meta
 from .command_line import CommandLine
 from .command import Command
 from .menu import Menu
+from .lazy_menu import LazyMenu
@@ -1,34 +1,36 @@
 from __future__ import division, print_function, absolute_import, unicode_literals
 
 import six
-from mog_commons.case_class import CaseClass
-from mog_commons.string import to_unicode
 from mog_commons.collection import get_single_item
 from mog_commons.types import *
-from easy_menu.entity import Item, Meta
+from easy_menu.entity import Item
+from easy_menu.entity.entity import to_unicode
 from easy_menu.entity.command_line import CommandLine
 
 
 class Command(Item):
-    @types(title=Unicode, command_lines=ListOf(CommandLine))
+    __slots__ = ('title', 'command_lines')
+    _fields = __slots__
+    _types = {'title': Unicode, 'command_lines': ListOf(CommandLine)}
+
     def __init__(self, title, command_lines):
         """
         :param title:
         :param command_lines:
         :return:
         """
-        CaseClass.__init__(self, ('title', title), ('command_lines', command_lines))
+        self.title = title
+        self.command_lines = command_lines
 
     @staticmethod
-    @types(Item, data=dict, meta=Meta)
-    def parse(data, meta, loader, encoding='utf-8', depth=0):
+    def parse(data, meta, loader, encoding='utf-8', chain=()):
         """
         Parse one command operation.
         :param data: dict:
         :param meta: Meta: meta configuration inherited from the parent menu
         :param loader: not used
         :param encoding: string:
-        :param depth: not used
+        :param chain: not used
         :return: Command:
         """
         if len(data) != 1:
@@ -47,7 +49,29 @@ class Command(Item):
         else:
             raise ValueError('Invalid command content type: %s' % type(content).__name__)
 
-    @types(Unicode)
+    @property
+    def background(self):
+        """True if any command line is configured to run in background"""
+        return any(x.meta.background for x in self.command_lines)
+
+    @property
+    def parallel(self):
+        """True if the command lines are configured to run at the same time"""
+        return len(self.command_lines) > 1 and any(x.meta.parallel for x in self.command_lines)
+
+    @property
+    def max_parallel(self):
+        """max number of the command lines running at the same time (None if no limit)"""
+        limits = [x.meta.max_parallel for x in self.command_lines if x.meta.max_parallel is not None]
+        return min(limits) if limits else None
+
+    @property
+    def max_concurrent(self):
+        """max number of the executions running on the host at the same time (None if no limit)"""
+        limits = [x.meta.max_concurrent for x in self.command_lines
+                  if x.meta.max_concurrent is not None and not x.meta.lock]
+        return min(limits) if limits else None
+
     def formatted(self):
         return '\n'.join(
             ['* %s:' % self.title] + ['  %s' % line for x in self.command_lines for line in x.formatted().splitlines()])
@@ -2,16 +2,19 @@ from __future__ import division, print_function, absolute_import, unicode_litera
 
 import os
 import hashlib
-from mog_commons.case_class import CaseClass
 from mog_commons.collection import get_single_item
 from mog_commons.functional import oget
 from mog_commons.types import *
-from mog_commons.string import to_unicode, is_strlike, to_bytes
+from mog_commons.string import is_strlike, to_bytes
 from easy_menu.entity import Meta
+from easy_menu.entity.entity import Entity, to_unicode
 
 
-class CommandLine(CaseClass):
-    @types(cmd=Unicode, meta=Meta, encoding=String)
+class CommandLine(Entity):
+    __slots__ = ('cmd', 'meta', 'encoding')
+    _fields = __slots__
+    _types = {'cmd': Unicode, 'meta': Meta, 'encoding': String}
+
     def __init__(self, cmd, meta, encoding='utf-8'):
         """
         :param cmd: command line string
@@ -19,7 +22,9 @@ class CommandLine(CaseClass):
         :param encoding: encoding for command line string
         :return:
         """
-        CaseClass.__init__(self, ('cmd', cmd), ('meta', meta), ('encoding', encoding))
+        self.cmd = cmd
+        self.meta = meta
+        self.encoding = encoding
 
     @staticmethod
     def parse(data, meta, encoding='utf-8'):
@@ -45,7 +50,6 @@ class CommandLine(CaseClass):
         else:
             raise ValueError('CommandLine must be string or dict, not %s.' % type(data).__name__)
 
-    @types(Unicode)
     def formatted(self):
         buf = [
             '- cmd: %s' % self.cmd,
@@ -55,9 +59,19 @@ class CommandLine(CaseClass):
             buf.append('  env: {%s}' % ', '.join('%s: %s' % (k, v) for k, v in sorted(self.meta.env.items())))
         if self.meta.lock:
             buf.append('  lock: True')
+        if self.meta.background:
+            buf.append('  background: True')
+        if self.meta.parallel:
+            buf.append('  parallel: True')
+        if self.meta.max_parallel is not None:
+            buf.append('  max_parallel: %d' % self.meta.max_parallel)
+        if self.meta.max_concurrent is not None:
+            buf.append('  max_concurrent: %d' % self.meta.max_concurrent)
+        for k in ['timeout', 'cpu_limit', 'memory_limit', 'nice']:
+            if getattr(self.meta, k) is not None:
+                buf.append('  %s: %s' % (k, getattr(self.meta, k)))
         return '\n'.join(buf)
 
-    @types(String)
     def to_hash_string(self):
         # ignore work directory
         data = b''.join(to_bytes(s) for s in [self.cmd, sorted(self.meta.env.items())])
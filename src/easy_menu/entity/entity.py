@@ -0,0 +1,134 @@
+from __future__ import division, print_function, absolute_import, unicode_literals
+
+import six
+from mog_commons.types import ComposableType, IterableOf, DictOf
+
+
+class Entity(object):
+    """
+    Compact base class of the menu entities.
+
+    Each subclass lists its compared fields in `_fields` and declares `__slots__` so that large trees need no
+    per-instance dict. Equality and repr behave like CaseClass (fields with None on both sides are ignored).
+    The argument types are not checked on construction; call `check_types` (or `Item.validate` for the whole
+    tree) once after loading instead.
+    """
+
+    __slots__ = ()
+
+    # names of the compared fields in order
+    _fields = ()
+
+    # dict of field name to the expected type (the same notation as mog_commons.types)
+    _types = {}
+
+    def __eq__(self, other):
+        if not isinstance(other, self.__class__):
+            return False
+
+        for k in self._fields:
+            a, b = getattr(self, k), getattr(other, k)
+            if a is not None or b is not None:
+                if a != b:
+                    return False
+        return True
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, ', '.join('%s=%r' % (k, getattr(self, k)) for k in self._fields))
+
+    def __getstate__(self):
+        return dict((k, getattr(self, k)) for k in self._slot_names() if hasattr(self, k))
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            setattr(self, k, v)
+
+    @classmethod
+    def _slot_names(cls):
+        return [k for c in cls.__mro__ for k in c.__dict__.get('__slots__', ()) if k != '__weakref__']
+
+    def values(self):
+        """
+        :return: key-value dict : { string: any }
+        """
+        return dict((k, getattr(self, k)) for k in self._fields)
+
+    def copy(self, **kwargs):
+        """
+        :param kwargs:
+        :return: copy of this object modifying the kwargs
+        """
+        for k in kwargs:
+            assert k in self._fields, 'Invalid key: %s' % k
+
+        d = self.values()
+        d.update(kwargs)
+        return self.__class__(**d)
+
+    def check_types(self):
+        """
+        Check the types of the fields of this instance (not recursive).
+        :raise TypeError: if any field has an unexpected type
+        """
+        for k, expect in self._types.items():
+            actual = getattr(self, k)
+            if not check_type(actual, expect):
+                raise TypeError('%s.%s must be %s, not %s.' % (
+                    self.__class__.__name__, k, type_name(expect), type(actual).__name__))
+
+
+def check_type(obj, cls):
+    """
+    :param obj: object to check
+    :param cls: type, tuple of types or mog_commons.types label such as ListOf
+    :return: True if obj matches cls
+    """
+    if isinstance(cls, type):
+        return isinstance(obj, cls)
+    if isinstance(cls, tuple):
+        return any(check_type(obj, t) for t in cls)
+    if isinstance(cls, IterableOf):
+        return isinstance(obj, cls.iterable_type) and all(check_type(x, cls.elem_type) for x in obj)
+    if isinstance(cls, DictOf):
+        return isinstance(obj, dict) and all(
+            check_type(k, cls.key_type) and check_type(v, cls.value_type) for k, v in obj.items())
+    return cls.check(obj)
+
+
+class TupleOfFields(ComposableType):
+    """Label for a tuple of a fixed length with the type of each element, unlike TupleOf"""
+
+    def __init__(self, *elem_types):
+        self.elem_types = elem_types
+
+    def name(self):
+        return 'tuple(%s)' % ', '.join(type_name(t) for t in self.elem_types)
+
+    def check(self, obj):
+        return isinstance(obj, tuple) and len(obj) == len(self.elem_types) and all(
+            check_type(x, t) for x, t in zip(obj, self.elem_types))
+
+
+def type_name(cls):
+    if isinstance(cls, ComposableType):
+        return cls.name()
+    if isinstance(cls, tuple):
+        return '(%s)' % '|'.join(type_name(t) for t in cls)
+    return cls.__name__
+
+
+def to_unicode(s, encoding='utf-8'):
+    """
+    Same as mog_commons.string.to_unicode but without the runtime type checks, which dominate the parse time
+    of large menus.
+    """
+    if isinstance(s, six.text_type):
+        return s
+    if isinstance(s, bytes):
+        return s.decode(encoding or 'utf-8')
+    return to_unicode(str(s), encoding) if six.PY2 else str(s)
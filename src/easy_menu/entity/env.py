@@ -0,0 +1,110 @@
+from __future__ import division, print_function, absolute_import, unicode_literals
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+
+class Env(Mapping):
+    """
+    Immutable environment variables shared along the menu tree.
+
+    Each instance keeps only the variables set at its own level and refers to the parent's instance,
+    so nested menus and command lines do not copy the whole dict. Use `flatten` to get a plain dict.
+    Equality and hash are based on the flattened contents.
+    """
+
+    __slots__ = ('delta', 'parent', '_hash')
+
+    def __init__(self, delta=None, parent=None):
+        """
+        :param delta: dict of the variables set at this level
+        :param parent: Env instance inherited from the parent, or None
+        """
+        self.delta = dict(delta or {})
+        self.parent = parent if parent else None
+
+        # hash of the flattened items, updated incrementally
+        h = 0 if self.parent is None else hash(self.parent)
+        for k, v in self.delta.items():
+            if self.parent is not None and k in self.parent:
+                h ^= hash((k, self.parent[k]))
+            h ^= hash((k, v))
+        self._hash = h
+
+    def updated(self, delta):
+        """
+        :param delta: dict of the variables to add or overwrite
+        :return: new Env instance (self if nothing is changed)
+        """
+        if not delta or all(k in self and self[k] == v for k, v in delta.items()):
+            return self
+        return Env(delta, self)
+
+    def flatten(self):
+        """
+        :return: dict of all the variables
+        """
+        chain = []
+        env = self
+        while env is not None:
+            chain.append(env.delta)
+            env = env.parent
+
+        ret = {}
+        for d in reversed(chain):
+            ret.update(d)
+        return ret
+
+    def __getitem__(self, key):
+        env = self
+        while env is not None:
+            if key in env.delta:
+                return env.delta[key]
+            env = env.parent
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        env = self
+        while env is not None:
+            if key in env.delta:
+                return True
+            env = env.parent
+        return False
+
+    def __iter__(self):
+        return iter(self.flatten())
+
+    def __len__(self):
+        return len(self.flatten())
+
+    def __bool__(self):
+        return bool(self.delta) or self.parent is not None
+
+    __nonzero__ = __bool__
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if isinstance(other, Env):
+            if self._hash != other._hash:
+                return False
+            if self.parent is other.parent and self.delta == other.delta:
+                return True
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        return self.flatten() == dict(other.items())
+
+    def __ne__(self, other):
+        ret = self.__eq__(other)
+        return ret if ret is NotImplemented else not ret
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        return repr(self.flatten())
+
+    def __reduce__(self):
+        return Env, (self.delta, self.parent)
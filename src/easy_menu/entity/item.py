@@ -2,19 +2,22 @@ from __future__ import division, print_function, absolute_import, unicode_litera
 
 from abc import ABCMeta, abstractmethod
 import six
-from mog_commons.case_class import CaseClass
 from mog_commons.collection import get_single_item
-from mog_commons.types import *
-from easy_menu.entity.meta import Meta
-from easy_menu.setting.loader import Loader
+from easy_menu.entity.entity import Entity, to_unicode
+from easy_menu.exceptions import ConfigError
+
+# max number of threads to load the files matched by a glob pattern
+GLOB_WORKERS = 8
 
 
 @six.add_metaclass(ABCMeta)
-class Item(CaseClass):
+class Item(Entity):
     """
     Abstract item class
     """
 
+    __slots__ = ()
+
     @staticmethod
     def _is_command_like(content):
         """
@@ -40,49 +43,260 @@ class Item(CaseClass):
         return False
 
     @staticmethod
-    @types(data=dict, meta=Meta, loader=Loader)
-    def parse(data, meta, loader, encoding='utf-8', depth=0):
+    def find_sources(data, lazy=False):
+        """
+        Find "include" and "eval" sections in the raw data without loading them.
+        :param data: dict representation of one menu
+        :param lazy: lazy loading setting inherited from the parent menu
+        :return: list of tuple (is_command, path_or_url_or_cmdline, eval_expire, eval_stale) in declaration order
+                 (sections to be loaded lazily are excluded)
+        """
+        from easy_menu.entity import KEYWORD_META, KEYWORD_INCLUDE, KEYWORD_EVAL
+
+        ret = []
+        stack = [(data, lazy)]
+        while stack:
+            item, lazy = stack.pop()
+            if not isinstance(item, dict):
+                continue
+
+            if isinstance(item.get(KEYWORD_META), dict) and isinstance(item[KEYWORD_META].get('lazy'), bool):
+                lazy = item[KEYWORD_META]['lazy']
+
+            keys = [k for k in item if k != KEYWORD_META]
+            if KEYWORD_EVAL in keys:
+                keys = [k for k in keys if k not in ('cache', 'stale')]
+
+            if keys == [KEYWORD_INCLUDE] and isinstance(item[KEYWORD_INCLUDE], six.string_types):
+                if not lazy:
+                    ret.append((False, item[KEYWORD_INCLUDE], None, None))
+            elif keys == [KEYWORD_EVAL] and isinstance(item[KEYWORD_EVAL], six.string_types):
+                expire, stale = item.get('cache'), item.get('stale')
+                if not lazy:
+                    ret.append((True, item[KEYWORD_EVAL], expire if isinstance(expire, int) else None,
+                                stale if isinstance(stale, int) else None))
+            else:
+                for k in keys:
+                    if isinstance(item[k], list) and not Item._is_command_like(item[k]):
+                        stack.extend((x, lazy) for x in reversed(item[k]))
+        return ret
+
+    @staticmethod
+    def parse(data, meta, loader, encoding='utf-8', chain=()):
         """
         :param data:
         :param meta:
         :param loader:
         :param encoding:
-        :param depth: indicator for the nesting level
+        :param chain: keys of the "include" and "eval" sources leading to the data (see Loader.source_key)
         :return:
         """
-        from easy_menu.entity import Menu, Command, KEYWORD_META, KEYWORD_INCLUDE, KEYWORD_EVAL
+        stack = []
+        item = Item._parse_node(data, meta, loader, encoding, chain, stack)
+        return Item._parse_stack(stack, item, loader, encoding)
 
-        # avoid for inclusion loops and stack overflow
-        assert depth < 50, 'Nesting level too deep.'
+    @staticmethod
+    def _parse_source(is_command, path_or_url_or_cmdline, eval_expire, eval_stale, meta, loader, encoding, chain):
+        """
+        Build a menu from an "include" or "eval" section.
+        The menu is shared among the sections with the same source and the same inherited meta.
+        """
+        stack = []
+        item = Item._push_source(is_command, path_or_url_or_cmdline, eval_expire, eval_stale, meta, loader, encoding,
+                                 chain, stack)
+        return Item._parse_stack(stack, item, loader, encoding)
+
+    @staticmethod
+    def _parse_stack(stack, item, loader, encoding):
+        """
+        Build the menus on the stack without recursion, so that the nesting level is unlimited.
+        :param stack: list of _MenuFrame
+        :param item: item already built if the stack is empty
+        :return: the bottom menu of the stack
+        """
+        while stack:
+            frame = stack[-1]
+            if len(frame.items) < len(frame.content):
+                x = Item._parse_node(frame.content[len(frame.items)], frame.meta, loader, encoding, frame.chain, stack)
+                if x is not None:
+                    frame.items.append(x)
+            else:
+                stack.pop()
+                item = frame.build(loader)
+                if stack:
+                    stack[-1].items.append(item)
+        return item
+
+    @staticmethod
+    def _parse_node(data, meta, loader, encoding, chain, stack):
+        """
+        :return: new item, or None if a menu to be built is pushed to the stack
+        """
+        from easy_menu.entity import LazyMenu, Command, KEYWORD_META, KEYWORD_INCLUDE, KEYWORD_EVAL
+
+        if isinstance(data, _GlobMatch):
+            return Item._push_include(data.path, meta, loader, encoding, chain, stack)
+        if not isinstance(data, dict):
+            raise TypeError('data must be dict, not %s.' % type(data).__name__)
 
         # if the data has meta key, it should be a menu.
         if KEYWORD_META in data:
-            return Menu.parse(data, meta, loader, encoding, depth)
+            Item._push_menu(data, meta, encoding, chain, None, stack)
+            return None
 
-        # parse eval cache setting
+        # parse eval cache setting (the data may be shared with the loader cache, so never modify it)
         eval_expire = None
+        eval_stale = None
+        entries = list(data.items())
         if KEYWORD_EVAL in data:
-            if 'cache' in data:
-                eval_expire = data['cache']
-                del data['cache']
+            eval_expire = data.get('cache')
+            eval_stale = data.get('stale')
+            entries = [(k, v) for k, v in entries if k not in ('cache', 'stale')]
 
-        assert len(data) == 1, 'Item should have only one element, not %s.' % len(data)
+        assert len(entries) == 1, 'Item should have only one element, not %s.' % len(entries)
 
-        title, content = get_single_item(data)
+        title, content = entries[0]
 
         if title == KEYWORD_INCLUDE:
             assert isinstance(content, six.string_types), \
                 '"include" section must have string content, not %s.' % type(content).__name__
-            return Menu.parse(loader.load(False, content), meta, loader, encoding, depth)
+            if loader.is_glob(content):
+                Item._push_glob(content, meta, loader, encoding, chain, stack)
+                return None
+            return Item._push_include(content, meta, loader, encoding, chain, stack)
         elif title == KEYWORD_EVAL:
             assert isinstance(content, six.string_types), \
                 '"eval" section must have string content, not %s.' % type(content).__name__
-            return Menu.parse(loader.load(True, content, eval_expire), meta, loader, encoding, depth)
+            if meta.lazy:
+                content = to_unicode(content, encoding)
+                return LazyMenu(content, meta, True, content, eval_expire, loader, encoding, eval_stale)
+            return Item._push_source(True, content, eval_expire, eval_stale, meta, loader, encoding, chain, stack)
         elif Item._is_command_like(content):
-            return Command.parse(data, meta, loader, encoding, depth)
+            return Command.parse(data, meta, loader, encoding, chain)
         else:
-            return Menu.parse(data, meta, loader, encoding, depth)
+            Item._push_menu(data, meta, encoding, chain, None, stack)
+            return None
+
+    @staticmethod
+    def _push_menu(data, meta, encoding, chain, origin, stack):
+        from easy_menu.entity import Menu
+
+        title, content, meta = Menu._parse_header(data, meta, encoding)
+        stack.append(_MenuFrame(title, content, meta, chain, origin))
+
+    @staticmethod
+    def _push_include(path_or_url, meta, loader, encoding, chain, stack):
+        """
+        :return: new item, or None if a menu to be built is pushed to the stack
+        """
+        from easy_menu.entity import LazyMenu
+
+        if meta.lazy:
+            path_or_url = to_unicode(path_or_url, encoding)
+            return LazyMenu(path_or_url, meta, False, path_or_url, None, loader, encoding)
+        return Item._push_source(False, path_or_url, None, None, meta, loader, encoding, chain, stack)
+
+    @staticmethod
+    def _push_glob(pattern, meta, loader, encoding, chain, stack):
+        """
+        Build one menu titled with the pattern from all the matched files in the path order.
+        The files are loaded concurrently, then each of them is included as is, never expanded as a pattern again.
+        """
+        # skip the files including this section, such as "*.yml" in the directory of the root configuration
+        paths = [p for p in loader.glob(pattern) if loader.source_key(False, p) not in chain]
+        if not meta.lazy:
+            loader.prefetch([(False, p, None, None) for p in paths], GLOB_WORKERS)
+        stack.append(_MenuFrame(to_unicode(pattern, encoding), [_GlobMatch(p) for p in paths], meta, chain, None))
+
+    @staticmethod
+    def _push_source(is_command, path_or_url_or_cmdline, eval_expire, eval_stale, meta, loader, encoding, chain,
+                     stack):
+        """
+        :return: the menu already built from the same source, or None if the new menu is pushed to the stack
+        """
+        key = loader.source_key(is_command, path_or_url_or_cmdline)
+        menu = loader.menus.get((key, meta))
+        if menu is not None:
+            return menu
+
+        if key in chain:
+            cycle = chain[chain.index(key):] + (key,)
+            raise ConfigError(chain[-1][1], 'Include cycle detected: %s' % ' -> '.join(k[1] for k in cycle))
+
+        data = loader.load(is_command, path_or_url_or_cmdline, eval_expire, eval_stale)
+        origin = (is_command, path_or_url_or_cmdline, eval_expire, eval_stale, meta, chain)
+        Item._push_menu(data, meta, encoding, chain + (key,), origin, stack)
+        return None
+
+    @staticmethod
+    def validate(item):
+        """
+        Check the types of all the entities in the tree once after loading.
+        Menus shared among sections and not-loaded lazy menus are visited once.
+        :param item: root item
+        :raise TypeError: if any entity has an unexpected field type
+        """
+        from easy_menu.entity import Menu, Command, CommandLine
+
+        visited = set()
+        stack = [item]
+        while stack:
+            x = stack.pop()
+            if id(x) in visited:
+                continue
+            visited.add(id(x))
+
+            x.check_types()
+            if isinstance(x, Menu):
+                stack.append(x.meta)
+                stack.extend(x.items)
+            elif isinstance(x, Command):
+                stack.extend(x.command_lines)
+            elif isinstance(x, CommandLine):
+                stack.append(x.meta)
 
     @abstractmethod
     def formatted(self):
         """abstract method"""
+
+
+class _GlobMatch(object):
+    """File path matched by a glob pattern, in place of the raw item data"""
+
+    __slots__ = ('path',)
+
+    def __init__(self, path):
+        self.path = path
+
+
+class _MenuFrame(object):
+    """Menu being built by the parser"""
+
+    __slots__ = ('title', 'content', 'meta', 'chain', 'origin', 'items')
+
+    def __init__(self, title, content, meta, chain, origin):
+        """
+        :param title: menu title
+        :param content: list of raw item data or _GlobMatch
+        :param meta: Meta instance for the items
+        :param chain: keys of the sources leading to the content
+        :param origin: tuple of (is_command, path_or_url_or_cmdline, eval_expire, eval_stale, meta, chain)
+                       if built from an "include" or "eval" section
+        """
+        self.title = title
+        self.content = content
+        self.meta = meta
+        self.chain = chain
+        self.origin = origin
+        self.items = []
+
+    def build(self, loader):
+        from easy_menu.entity import Menu
+
+        menu = Menu(self.title, self.items, self.meta)
+        if self.origin is not None:
+            is_command, path_or_url_or_cmdline, _, _, meta, _ = self.origin
+            menu.stale_since = loader.stale_since(is_command, path_or_url_or_cmdline)
+            menu.origin = self.origin
+            loader.menus[(self.chain[-1], meta)] = menu
+        return menu
@@ -0,0 +1,72 @@
+from __future__ import division, print_function, absolute_import, unicode_literals
+
+from mog_commons.types import *
+from easy_menu.entity import Item
+from easy_menu.entity.entity import TupleOfFields
+from easy_menu.entity.menu import Menu
+from easy_menu.exceptions import ConfigError
+
+
+class LazyMenu(Menu):
+    """
+    Placeholder of the sub menu built from an "include" or "eval" section.
+
+    The source is loaded when the sub menu is opened for the first time, then the result is kept for the session.
+    """
+
+    __slots__ = ('source', 'loader', 'encoding', 'loaded')
+    _fields = ('title', 'items', 'meta', 'source')
+    # is_command, path_or_url_or_cmdline, eval_expire and eval_stale
+    _types = dict(Menu._types, source=TupleOfFields(bool, Unicode, Option(int), Option(int)))
+
+    def __init__(self, title, meta, is_command, path_or_url_or_cmdline, eval_expire=None, loader=None,
+                 encoding='utf-8', eval_stale=None):
+        """
+        :param title: temporary title until loaded
+        :param meta: meta configuration inherited from the parent menu
+        :param is_command: True if using command line output
+        :param path_or_url_or_cmdline:
+        :param eval_expire: seconds to read
+        :param loader: Loader instance (not compared)
+        :param encoding:
+        :param eval_stale: seconds to read after expired while refreshing in background
+        :return:
+        """
+        Menu.__init__(self, title, [], meta)
+        self.source = (is_command, path_or_url_or_cmdline, eval_expire, eval_stale)
+        self.loader = loader
+        self.encoding = encoding
+        self.loaded = False
+
+    def load(self):
+        """
+        Load the source and replace the contents of this placeholder.
+        :return: self
+        """
+        if not self.loaded:
+            is_command, path_or_url_or_cmdline, eval_expire, eval_stale = self.source
+            data = self.loader.load(is_command, path_or_url_or_cmdline, eval_expire, eval_stale)
+            try:
+                # loaded on demand, so the sections including this menu again never loop
+                chain = (self.loader.source_key(is_command, path_or_url_or_cmdline),)
+                menu = Menu.parse(data, self.meta, self.loader, self.encoding, chain)
+                if self.loader.validate:
+                    Item.validate(menu)
+            except (AssertionError, ValueError, TypeError) as e:
+                raise ConfigError(path_or_url_or_cmdline, e)
+
+            self.title, self.items, self.meta = menu.title, menu.items, menu.meta
+            self.stale_since = self.loader.stale_since(is_command, path_or_url_or_cmdline)
+            self.loaded = True
+        return self
+
+    def formatted(self):
+        if self.loaded:
+            return Menu.formatted(self)
+        return '# %s: (not loaded)' % self.title
+
+    def __getstate__(self):
+        # loader should be attached again after unpickling
+        d = Menu.__getstate__(self)
+        d['loader'] = None
+        return d
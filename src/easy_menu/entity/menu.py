@@ -1,10 +1,10 @@
 from __future__ import division, print_function, absolute_import, unicode_literals
 
 import six
-from mog_commons.string import to_unicode
-from mog_commons.collection import get_single_item
 from mog_commons.types import *
 from easy_menu.entity import Meta, Item
+from easy_menu.entity.entity import to_unicode
+from easy_menu.exceptions import EasyMenuError
 
 
 class Menu(Item):
@@ -12,45 +12,110 @@ class Menu(Item):
     Menu is built from an one-element dict having title string as key and item list element as value
     """
 
-    @types(title=Unicode, items=ListOf(Item), meta=Meta)
-    def __init__(self, title, items, meta=Meta()):
+    __slots__ = ('title', 'items', 'meta', 'stale_since', 'origin')
+    _fields = ('title', 'items', 'meta')
+    _types = {'title': Unicode, 'items': ListOf(Item), 'meta': Meta, 'stale_since': Option(float)}
+
+    def __init__(self, title, items, meta=Meta(), stale_since=None):
         """
         :param title:
         :param items:
         :param meta:
+        :param stale_since: time when the data was loaded if built from stale data (not compared)
         :return:
         """
-        Item.__init__(self, ('title', title), ('items', items), ('meta', meta))
+        self.title = title
+        self.items = items
+        self.meta = meta
+        self.stale_since = stale_since
+
+        # tuple of (is_command, path_or_url_or_cmdline, eval_expire, eval_stale, meta, chain)
+        # if built from an "include" or "eval" section (not compared)
+        self.origin = None
 
     @staticmethod
-    @types(Item, data=dict, meta=Meta)
-    def parse(data, meta, loader, encoding='utf-8', depth=0):
+    def parse(data, meta, loader, encoding='utf-8', chain=()):
         """
         :param data:
         :param meta:
         :param loader:
         :param encoding:
-        :param depth:
+        :param chain: keys of the "include" and "eval" sources leading to the data (see Loader.source_key)
         :return:
         """
-        from easy_menu.entity import KEYWORD_META, Item
+        stack = []
+        Item._push_menu(data, meta, encoding, chain, None, stack)
+        return Item._parse_stack(stack, None, loader, encoding)
+
+    @staticmethod
+    def _parse_header(data, meta, encoding):
+        """
+        Check the menu data without parsing the items.
+        :return: tuple of the title, list of raw item data and Meta instance for the items
+        """
+        from easy_menu.entity import KEYWORD_META
+
+        if not isinstance(data, dict):
+            raise TypeError('data must be dict, not %s.' % type(data).__name__)
 
-        # read meta configurations
+        # read meta configurations (the data may be shared with the loader cache, so never modify it)
         if KEYWORD_META in data:
             meta = meta.updated(data[KEYWORD_META], encoding)
-            del data[KEYWORD_META]
+        entries = [(k, v) for k, v in data.items() if k != KEYWORD_META]
 
-        assert len(data) == 1, 'Menu should have only one item, not %s.' % len(data)
+        assert len(entries) == 1, 'Menu should have only one item, not %s.' % len(entries)
 
-        title, content = get_single_item(data)
+        title, content = entries[0]
         assert isinstance(title, six.string_types), 'Menu title must be string, not %s.' % type(title).__name__
         assert isinstance(content, list), 'Menu content must be list, not %s.' % type(content).__name__
-        title = to_unicode(title, encoding)
+        return to_unicode(title, encoding), content, meta
+
+    def find(self, titles):
+        """
+        Find the item by the titles from the top level of this menu.
+
+        Only the lazy sub menus on the way are loaded. Since the title of a lazy menu is unknown until loaded,
+        the unloaded ones are tried in order when no other item matches, skipping the ones failing to load.
+
+        :param titles: list of titles (the title of this menu is excluded)
+        :return: Menu or Command, or None if not found
+        :raise EasyMenuError, IOError, OSError: the first error of the lazy menus tried if none of them matches
+        """
+        from easy_menu.entity import LazyMenu
+
+        item = self
+        for title in titles:
+            if not isinstance(item, Menu):
+                return None
+            if isinstance(item, LazyMenu):
+                item.load()
 
-        items = [Item.parse(item, meta, loader, encoding, depth + 1) for item in content]
-        return Menu(title, items, meta)
+            found = None
+            for x in item.items:
+                if x.title == title and not (isinstance(x, LazyMenu) and not x.loaded):
+                    found = x
+                    break
+            else:
+                error = None
+                for x in item.items:
+                    if not isinstance(x, LazyMenu) or x.loaded:
+                        continue
+                    try:
+                        x.load()
+                    except (EasyMenuError, IOError, OSError) as e:
+                        # an unrelated sub menu should not hide the item
+                        error = error or e
+                        continue
+                    if x.title == title:
+                        found = x
+                        break
+                if found is None and error is not None:
+                    raise error
+            if found is None:
+                return None
+            item = found
+        return item
 
-    @types(Unicode)
     def formatted(self):
         """Return formatted string for pretty printing."""
         return '\n'.join(
@@ -1,28 +1,85 @@
 from __future__ import division, print_function, absolute_import, unicode_literals
 
-import copy
-from mog_commons.case_class import CaseClass
+import re
+import weakref
+import six
 from mog_commons.types import *
-from mog_commons.string import to_unicode
+from easy_menu.entity.entity import Entity, check_type, type_name, to_unicode
+from easy_menu.entity.env import Env
 
 
-class Meta(CaseClass):
+MEMORY_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+class Meta(Entity):
     """
     Meta settings for running commands
     """
 
-    @types(work_dir=Option(Unicode), env=Option(DictOf(Unicode, Unicode)), lock=bool)
-    def __init__(self, work_dir=None, env=None, lock=False):
+    __slots__ = ('work_dir', 'env', 'lock', 'lazy', 'background', 'parallel', 'max_parallel', 'max_concurrent',
+                 'timeout', 'cpu_limit', 'memory_limit', 'nice', '__weakref__')
+    _fields = ('work_dir', 'env', 'lock', 'lazy', 'background', 'parallel', 'max_parallel', 'max_concurrent',
+               'timeout', 'cpu_limit', 'memory_limit', 'nice')
+    _types = {'work_dir': Option(Unicode), 'env': Env, 'lock': bool, 'lazy': bool, 'background': bool,
+              'parallel': bool, 'max_parallel': Option(int), 'max_concurrent': Option(int),
+              'timeout': (type(None), int, float), 'cpu_limit': Option(int),
+              'memory_limit': (type(None),) + six.integer_types, 'nice': Option(int)}
+
+    # canonical instances shared by the menu tree
+    _instances = weakref.WeakValueDictionary()
+
+    def __init__(self, work_dir=None, env=None, lock=False, lazy=False, background=False, parallel=False,
+                 max_parallel=None, max_concurrent=None, timeout=None, cpu_limit=None, memory_limit=None, nice=None):
         """
         :param work_dir:
-        :param env:
+        :param env: dict or Env instance
         :param lock:
+        :param lazy: load "include" and "eval" sections when the sub menu is opened
+        :param background: run the commands in background by default
+        :param parallel: run the command lines of each command at the same time
+        :param max_parallel: max number of the command lines running at the same time (no limit if None)
+        :param max_concurrent: max number of the processes of each command line running on the host (no limit if None)
+        :param timeout: seconds to kill each command line
+        :param cpu_limit: max CPU time in seconds of each process
+        :param memory_limit: max address space in bytes of each process
+        :param nice: niceness added to the command processes (0-19)
         :return:
         """
-        env = env or {}
-        CaseClass.__init__(self, ('work_dir', work_dir), ('env', env), ('lock', lock))
+        self.work_dir = work_dir
+        self.env = env if isinstance(env, Env) else Env(env)
+        self.lock = lock
+        self.lazy = lazy
+        self.background = background
+        self.parallel = parallel
+        self.max_parallel = max_parallel
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        self.cpu_limit = cpu_limit
+        self.memory_limit = memory_limit
+        self.nice = nice
+
+    def _key(self):
+        return tuple(getattr(self, k) for k in self._fields)
+
+    def __hash__(self):
+        # used as a part of the key to share the parsed menus
+        return hash(self._key())
+
+    def interned(self):
+        """
+        :return: the canonical instance equal to this one
+        """
+        return Meta._instances.setdefault(self._key(), self)
+
+    def check_types(self):
+        Entity.check_types(self)
+
+        env = self.env
+        while env is not None:
+            if not check_type(env.delta, DictOf(Unicode, Unicode)):
+                raise TypeError('Meta.env must be dict(%s->%s), not %r.' % (Unicode.__name__, Unicode.__name__, env))
+            env = env.parent
 
-    @types(data=dict)
     def updated(self, data, encoding):
         """
         Load configuration and return updated instance.
@@ -33,33 +90,124 @@ class Meta(CaseClass):
             'work_dir': Meta._load_work_dir,
             'env': Meta._load_env,
             'lock': Meta._load_lock,
+            'lazy': Meta._load_lazy,
+            'background': Meta._load_background,
+            'parallel': Meta._load_parallel,
+            'max_parallel': Meta._load_max_parallel,
+            'max_concurrent': Meta._load_max_concurrent,
+            'timeout': Meta._load_timeout,
+            'cpu_limit': Meta._load_cpu_limit,
+            'memory_limit': Meta._load_memory_limit,
+            'nice': Meta._load_nice,
         }
 
+        if not isinstance(data, dict):
+            raise TypeError('data must be dict, not %s.' % type(data).__name__)
+
         ret = self.copy()
         for k, v in data.items():
             ret = functions.get(k, self.__unknown_field(k))(ret, v, encoding)
-        return ret
+        return ret.interned()
 
-    @types(data=String, encoding=String)
     def _load_work_dir(self, data, encoding):
         """Overwrite working directory"""
+        Meta._check_data(data, String)
         self.work_dir = to_unicode(data, encoding)
         return self
 
-    @types(data=DictOf(String, String), encoding=String)
     def _load_env(self, data, encoding):
         """Merge environment variables"""
-        d = copy.copy(self.env)
-        d.update([(to_unicode(k, encoding), to_unicode(v, encoding)) for k, v in data.items()])
-        self.env = d
+        Meta._check_data(data, DictOf(String, String))
+        self.env = self.env.updated(dict((to_unicode(k, encoding), to_unicode(v, encoding)) for k, v in data.items()))
         return self
 
-    @types(data=bool, encoding=String)
     def _load_lock(self, data, encoding):
         """Overwrite lock setting"""
+        Meta._check_data(data, bool)
         self.lock = data
         return self
 
+    def _load_lazy(self, data, encoding):
+        """Overwrite lazy loading setting"""
+        Meta._check_data(data, bool)
+        self.lazy = data
+        return self
+
+    def _load_background(self, data, encoding):
+        """Overwrite background setting"""
+        Meta._check_data(data, bool)
+        self.background = data
+        return self
+
+    def _load_parallel(self, data, encoding):
+        """Overwrite parallel setting"""
+        Meta._check_data(data, bool)
+        self.parallel = data
+        return self
+
+    def _load_max_parallel(self, data, encoding):
+        """Overwrite the max number of the parallel command lines"""
+        Meta._check_data(data, int)
+        if isinstance(data, bool) or data <= 0:
+            raise ValueError('max_parallel must be a positive integer, not %r.' % data)
+        self.max_parallel = data
+        return self
+
+    def _load_max_concurrent(self, data, encoding):
+        """Overwrite the max number of the concurrent executions across the sessions"""
+        Meta._check_data(data, int)
+        if isinstance(data, bool) or data <= 0:
+            raise ValueError('max_concurrent must be a positive integer, not %r.' % data)
+        self.max_concurrent = data
+        return self
+
+    def _load_timeout(self, data, encoding):
+        """Overwrite the timeout in seconds"""
+        Meta._check_data(data, (int, float))
+        if isinstance(data, bool) or data <= 0:
+            raise ValueError('timeout must be a positive number, not %r.' % data)
+        self.timeout = data
+        return self
+
+    def _load_cpu_limit(self, data, encoding):
+        """Overwrite the CPU time limit in seconds"""
+        Meta._check_data(data, int)
+        if isinstance(data, bool) or data <= 0:
+            raise ValueError('cpu_limit must be a positive integer, not %r.' % data)
+        self.cpu_limit = data
+        return self
+
+    def _load_memory_limit(self, data, encoding):
+        """Overwrite the memory limit by bytes or a string with the unit such as 512M"""
+        Meta._check_data(data, six.integer_types + (String,))
+        value = 0
+        if isinstance(data, bool):
+            pass
+        elif isinstance(data, six.integer_types):
+            value = data
+        else:
+            m = re.match(r'^\s*(\d+)\s*([KMGT]?)B?\s*$', to_unicode(data, encoding), re.IGNORECASE)
+            if m:
+                value = int(m.group(1)) * MEMORY_UNITS[m.group(2).upper()]
+        if value <= 0:
+            raise ValueError('memory_limit must be a positive integer or a size such as 512M, not %r.' % data)
+        self.memory_limit = value
+        return self
+
+    def _load_nice(self, data, encoding):
+        """Overwrite the niceness"""
+        Meta._check_data(data, int)
+        if isinstance(data, bool) or not 0 <= data <= 19:
+            raise ValueError('nice must be an integer from 0 to 19, not %r.' % data)
+        self.nice = data
+        return self
+
+    @staticmethod
+    def _check_data(data, expect):
+        # configuration values are checked on every load since they come from the user
+        if not check_type(data, expect):
+            raise TypeError('data must be %s, not %s.' % (type_name(expect), type(data).__name__))
+
     @staticmethod
     def __unknown_field(key):
         def f(x, y, z):
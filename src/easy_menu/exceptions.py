@@ -13,6 +13,10 @@ class SettingError(EasyMenuError):
     """Setting error."""
 
 
+class CommandError(EasyMenuError):
+    """Command execution error."""
+
+
 class ConfigError(EasyMenuError):
     """Configuration error."""
 
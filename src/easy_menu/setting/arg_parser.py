@@ -1,6 +1,7 @@
 from __future__ import division, print_function, absolute_import, unicode_literals
 
 from optparse import OptionParser
+from easy_menu.setting.loader import LOADER_BACKENDS
 
 VERSION = 'easy-menu %s' % __import__('easy_menu').__version__
 
@@ -30,11 +31,92 @@ def __get_parser():
         help='set working directory to DIR'
     )
 
+    p.add_option(
+        '--workers', dest='workers', default=1, type='int', metavar='NUM',
+        help='load "include" and "eval" sections concurrently with NUM threads (default: 1)'
+    )
+
+    p.add_option(
+        '--lazy', dest='lazy', action='store_true', default=False,
+        help='load "include" and "eval" sections when the sub menu is opened (default: False)'
+    )
+
+    p.add_option(
+        '--loader-backend', dest='loader_backend', default='auto', type='choice', choices=LOADER_BACKENDS,
+        metavar='BACKEND',
+        help='set configuration parser to BACKEND (%s) (default: auto)' % ', '.join(LOADER_BACKENDS)
+    )
+
     p.add_option(
         '--clear-cache', dest='clear_cache', action='store_true', default=False,
         help='clear old cache when evaluating "eval" section (default: False)'
     )
 
+    p.add_option(
+        '--cache-max-size', dest='cache_max_mb', default=256, type='int', metavar='MB',
+        help='evict least recently used "eval" cache entries beyond MB megabytes (default: 256)'
+    )
+
+    p.add_option(
+        '--cache-compress', dest='cache_compress', action='store_true', default=False,
+        help='compress new "eval" cache entries (default: False)'
+    )
+
+    p.add_option(
+        '--cache-lock-timeout', dest='cache_lock_timeout', default=60, type='int', metavar='SEC',
+        help='wait SEC seconds for another process evaluating the same "eval" section, then use the expired cache '
+             '(default: 60)'
+    )
+
+    p.add_option(
+        '--url-max-age', dest='url_max_age', default=None, type='int', metavar='SEC',
+        help='use the local copy of the configuration loaded by URL without any request for SEC seconds '
+             '(default: always revalidate)'
+    )
+
+    p.add_option(
+        '--fallback', dest='fallback', action='store_true', default=False,
+        help='keep the last known good copy of each "eval" section and URL, and use it when loading fails '
+             '(default: False)'
+    )
+
+    p.add_option(
+        '--fetch-timeout', dest='fetch_timeout', default=None, type='float', metavar='SEC',
+        help='with --fallback, use the last known good copy if loading "eval" section or URL takes more than SEC '
+             'seconds (default: wait until finished)'
+    )
+
+    p.add_option(
+        '--watch', dest='watch', action='store_true', default=False,
+        help='reload the menu when the configuration files are modified (default: False)'
+    )
+
+    p.add_option(
+        '--watch-interval', dest='watch_interval', default=2, type='float', metavar='SEC',
+        help='check the configuration files every SEC seconds in watch mode (default: 2)'
+    )
+
+    p.add_option(
+        '--run', dest='run_path', default=None, type='string', metavar='PATH',
+        help='execute the command at PATH (titles separated by ">", e.g. "Main Menu > Sub Menu > Command") '
+             'without the menu screen and exit with its return code'
+    )
+
+    p.add_option(
+        '--gc-cache', dest='gc_cache', action='store_true', default=False,
+        help='remove expired "eval" cache entries and exit'
+    )
+
+    p.add_option(
+        '--menu-cache', dest='menu_cache', action='store_true', default=False,
+        help='reuse the compiled menu while its sources are unchanged (default: False)'
+    )
+
+    p.add_option(
+        '--no-validate', dest='validate', action='store_false', default=True,
+        help='skip checking the types of the loaded menu entities for trusted configurations (default: enabled)'
+    )
+
     p.add_option(
         '--no-getch', dest='getch_enabled', action='store_false', default=True,
         help='disable real-time key input (without pressing ENTER key) (default: enabled)'
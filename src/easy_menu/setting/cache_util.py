@@ -0,0 +1,46 @@
+from __future__ import division, print_function, absolute_import, unicode_literals
+
+import os
+import tempfile
+
+TEMP_FILE_PREFIX = '.tmp-'
+
+
+def make_dirs(path):
+    """
+    Make the directory and its parents if not exist.
+    It may be created by another thread or process at the same time.
+    """
+    if not os.path.exists(path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+
+
+def write_atomic(path, data):
+    """
+    Write binary data to a temporary file and rename it so that readers never see a partial file.
+    """
+    make_dirs(os.path.dirname(path))
+
+    fd, temp_path = tempfile.mkstemp(prefix=TEMP_FILE_PREFIX, dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        _replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _replace(src, dst):
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+    else:
+        # os.rename does not overwrite the existing file on Windows
+        if os.name == 'nt' and os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
@@ -0,0 +1,284 @@
+from __future__ import division, print_function, absolute_import, unicode_literals
+
+import os
+import time
+import zlib
+import sqlite3
+import hashlib
+from contextlib import closing, contextmanager
+from mog_commons.string import to_bytes, to_unicode
+from mog_commons.types import *
+from easy_menu.setting.cache_util import make_dirs, write_atomic, TEMP_FILE_PREFIX
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+INDEX_FILE_NAME = 'index.db'
+INDEX_TIMEOUT = 30
+LOCK_DIR_NAME = 'lock'
+LOCK_POLL_INTERVAL = 0.1
+
+INDEX_SCHEMA = """CREATE TABLE IF NOT EXISTS entries (
+  name TEXT PRIMARY KEY,
+  cmdline TEXT NOT NULL,
+  size INTEGER NOT NULL,
+  created REAL NOT NULL,
+  accessed REAL NOT NULL,
+  expire INTEGER NOT NULL,
+  compressed INTEGER NOT NULL
+)"""
+
+
+class EvalCache(object):
+    """
+    Store of the outputs of "eval" sections.
+
+    Each output is written to one file named by the hash of the command line, and a SQLite index in the cache
+    directory records its size, creation time and last access time.
+    When the total size exceeds the limit, the least recently used entries are evicted.
+    """
+
+    @types(max_size=Option(int), compress=bool)
+    def __init__(self, cache_dir, encoding='utf-8', max_size=None, compress=False):
+        """
+        :param cache_dir: cache directory
+        :param encoding: encoding for command line string
+        :param max_size: max total size in bytes (None: unlimited)
+        :param compress: compress new entries with zlib if true
+        """
+        self.cache_dir = cache_dir
+        self.encoding = encoding
+        self.max_size = max_size
+        self.compress = compress
+
+    def path(self, cmdline):
+        return os.path.join(self.cache_dir, *self._name(cmdline).split('/'))
+
+    def get(self, cmdline, expire, now=None):
+        """
+        :param cmdline: command line string
+        :param expire: seconds to read (None: read even if expired)
+        :param now: current time
+        :return: cached data if it is not expired, otherwise None
+        """
+        now = time.time() if now is None else now
+        name = self._name(cmdline)
+
+        with self._connect() as conn:
+            row = conn.execute('SELECT created, compressed FROM entries WHERE name = ?', (name,)).fetchone()
+            if row is None or (expire is not None and now - row[0] >= expire):
+                return None
+            conn.execute('UPDATE entries SET accessed = ? WHERE name = ?', (now, name))
+
+        try:
+            with open(self.path(cmdline), 'rb') as f:
+                data = f.read()
+            return zlib.decompress(data) if row[1] else data
+        except (IOError, zlib.error):
+            return None
+
+    def created(self, cmdline):
+        """
+        :param cmdline: command line string
+        :return: time when the entry was written, or None if not found
+        """
+        with self._connect() as conn:
+            row = conn.execute('SELECT created FROM entries WHERE name = ?', (self._name(cmdline),)).fetchone()
+        return None if row is None else row[0]
+
+    def put(self, cmdline, data, expire, now=None):
+        """
+        :param cmdline: command line string
+        :param data: encoded binary
+        :param expire: seconds to keep
+        :param now: current time
+        """
+        now = time.time() if now is None else now
+        name = self._name(cmdline)
+        path = self.path(cmdline)
+        stored = zlib.compress(data) if self.compress else data
+        write_atomic(path, stored)
+
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         (name, to_unicode(cmdline, self.encoding), len(stored), now, now, expire, int(self.compress)))
+        if self.max_size is not None:
+            self.evict(self.max_size)
+
+    @contextmanager
+    def lock(self, cmdline, timeout, on_wait=None):
+        """
+        Exclusive lock per command line shared among processes.
+
+        The lock file may be removed by gc while it is not held, so the file is opened again if the one locked
+        is no longer at the path.
+
+        :param cmdline: command line string
+        :param timeout: seconds to wait for the lock
+        :param on_wait: function called once when the lock is held by another process
+        :return: context manager which yields True if the lock is acquired, or False if timed out
+        """
+        if fcntl is None:
+            # file locking is not supported on this platform
+            yield True
+            return
+
+        path = self._lock_path(self._name(cmdline))
+        make_dirs(os.path.dirname(path))
+
+        deadline = time.time() + timeout
+        while True:
+            with open(path, 'a') as f:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    locked = True
+                except (IOError, OSError):
+                    locked = False
+                if locked:
+                    if not self._is_same_file(f, path):
+                        # removed by gc just before locked
+                        continue
+                    try:
+                        yield True
+                    finally:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                    return
+            if on_wait is not None:
+                on_wait()
+                on_wait = None
+            if time.time() >= deadline:
+                yield False
+                return
+            time.sleep(LOCK_POLL_INTERVAL)
+
+    def evict(self, max_size):
+        """
+        Remove the least recently used entries until the total size becomes equal or less than max_size.
+        :return: tuple of the number of removed entries and removed bytes
+        """
+        with self._connect() as conn:
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            removed = []
+            for name, size in conn.execute('SELECT name, size FROM entries ORDER BY accessed'):
+                if total <= max_size:
+                    break
+                removed.append((name, size))
+                total -= size
+        return self._remove(removed)
+
+    def gc(self, now=None):
+        """
+        Remove expired entries, entries without data files and data files without entries, then evict the least
+        recently used entries if the total size still exceeds max_size.
+        The lock files not held and without entries are also removed (not counted).
+        :return: tuple of the number of removed entries and removed bytes
+        """
+        now = time.time() if now is None else now
+
+        with self._connect() as conn:
+            rows = conn.execute('SELECT name, size, created + expire FROM entries').fetchall()
+        removed = [(name, size) for name, size, expires_at in rows
+                   if expires_at <= now or not os.path.exists(self._path_of(name))]
+        num_entries, num_bytes = self._remove(removed)
+
+        # files written by older versions or left by interrupted processes
+        names = set(name for name, _, _ in rows)
+        for d in os.listdir(self.cache_dir):
+            if len(d) != 2 or not os.path.isdir(os.path.join(self.cache_dir, d)):
+                continue
+            for f in os.listdir(os.path.join(self.cache_dir, d)):
+                if f.startswith(TEMP_FILE_PREFIX):
+                    # may be being written by another process
+                    continue
+                if '%s/%s' % (d, f) not in names:
+                    path = os.path.join(self.cache_dir, d, f)
+                    num_entries, num_bytes = num_entries + 1, num_bytes + os.path.getsize(path)
+                    os.remove(path)
+
+        # the limit may have been lowered since the entries were written
+        if self.max_size is not None:
+            evicted_entries, evicted_bytes = self.evict(self.max_size)
+            num_entries, num_bytes = num_entries + evicted_entries, num_bytes + evicted_bytes
+
+        # lock files of the commands which failed or were never cached
+        lock_dir = os.path.join(self.cache_dir, LOCK_DIR_NAME)
+        if fcntl is not None and os.path.isdir(lock_dir):
+            with self._connect() as conn:
+                names = set(name.replace('/', '') for name, in conn.execute('SELECT name FROM entries'))
+            for f in os.listdir(lock_dir):
+                if f not in names:
+                    self._remove_lock(os.path.join(lock_dir, f))
+        return num_entries, num_bytes
+
+    def _remove(self, entries):
+        if entries:
+            with self._connect() as conn:
+                conn.executemany('DELETE FROM entries WHERE name = ?', [(name,) for name, _ in entries])
+            for name, _ in entries:
+                if os.path.exists(self._path_of(name)):
+                    os.remove(self._path_of(name))
+                if fcntl is not None:
+                    self._remove_lock(self._lock_path(name))
+        return len(entries), sum(size for _, size in entries)
+
+    @staticmethod
+    def _remove_lock(path):
+        """
+        Remove the lock file unless it is held by anyone.
+        """
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'a') as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                # removed while locked, so the next holder finds it replaced (see lock)
+                os.remove(path)
+        except (IOError, OSError):
+            pass
+
+    @staticmethod
+    def _is_same_file(f, path):
+        try:
+            a, b = os.fstat(f.fileno()), os.stat(path)
+        except OSError:
+            return False
+        return (a.st_dev, a.st_ino) == (b.st_dev, b.st_ino)
+
+    def _connect(self):
+        """
+        :return: context manager which commits and closes the connection
+        """
+        make_dirs(self.cache_dir)
+        return _Connection(os.path.join(self.cache_dir, INDEX_FILE_NAME))
+
+    def _name(self, cmdline):
+        h = hashlib.md5(to_bytes(cmdline, self.encoding)).hexdigest()
+        return '%s/%s' % (h[:2], h[2:])
+
+    def _path_of(self, name):
+        return os.path.join(self.cache_dir, *name.split('/'))
+
+    def _lock_path(self, name):
+        return os.path.join(self.cache_dir, LOCK_DIR_NAME, name.replace('/', ''))
+
+
+class _Connection(object):
+    """SQLite connection used in one "with" block"""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+
+    def __enter__(self):
+        self.conn = sqlite3.connect(self.path, timeout=INDEX_TIMEOUT)
+        self.conn.execute(INDEX_SCHEMA)
+        return self.conn
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        with closing(self.conn):
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
@@ -0,0 +1,58 @@
+from __future__ import division, print_function, absolute_import, unicode_literals
+
+import os
+import json
+import time
+import hashlib
+from mog_commons.string import to_bytes, to_unicode
+from easy_menu.setting.cache_util import write_atomic
+
+META_SUFFIX = '.json'
+
+
+class FallbackStore(object):
+    """
+    Last-known-good copies of the configurations loaded by URL or command line.
+
+    The copy is used when the source fails or does not respond in time.
+    """
+
+    def __init__(self, cache_dir):
+        """
+        :param cache_dir: cache directory
+        """
+        self.cache_dir = cache_dir
+
+    def path(self, is_command, path_or_url_or_cmdline):
+        key = '%s\n%s' % ('eval' if is_command else 'url', path_or_url_or_cmdline)
+        h = hashlib.md5(to_bytes(key, 'utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, h[:2], h[2:])
+
+    def get(self, is_command, path_or_url_or_cmdline):
+        """
+        :return: tuple of the data and the time when it was saved, or None if not found
+        """
+        path = self.path(is_command, path_or_url_or_cmdline)
+        try:
+            with open(path + META_SUFFIX, 'rb') as f:
+                meta = json.loads(to_unicode(f.read(), 'utf-8'))
+            with open(path, 'rb') as f:
+                data = f.read()
+        except (IOError, ValueError):
+            return None
+
+        if meta.get('source') != path_or_url_or_cmdline:
+            return None
+        return data, meta['saved']
+
+    def put(self, is_command, path_or_url_or_cmdline, data, now=None):
+        """
+        :param data: encoded binary loaded successfully
+        :param now: current time
+        """
+        now = time.time() if now is None else now
+        path = self.path(is_command, path_or_url_or_cmdline)
+
+        meta = {'source': path_or_url_or_cmdline, 'saved': now}
+        write_atomic(path, data)
+        write_atomic(path + META_SUFFIX, to_bytes(json.dumps(meta), 'utf-8'))
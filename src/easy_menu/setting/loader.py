@@ -2,89 +2,181 @@ from __future__ import division, print_function, absolute_import, unicode_litera
 
 import os
 import sys
-import time
 import re
+import copy
+import glob
+import json
 import yaml
 import hashlib
+import threading
+from multiprocessing.pool import ThreadPool
 from six.moves.urllib.request import urlopen
-from jinja2 import Environment
+from jinja2 import Environment, FunctionLoader, FileSystemBytecodeCache
 from mog_commons.command import capture_command
 from mog_commons.string import *
 from mog_commons.io import print_safe
 from mog_commons.types import *
-from easy_menu.exceptions import ConfigError, EncodingError
+from easy_menu.exceptions import ConfigError, EncodingError, SettingError
+from easy_menu.setting.eval_cache import EvalCache
+from easy_menu.setting.url_cache import UrlCache
+from easy_menu.setting.fallback_store import FallbackStore
+
+try:
+    from yaml import CSafeLoader as FastYAMLLoader
+    LIBYAML_AVAILABLE = True
+except ImportError:
+    FastYAMLLoader = yaml.SafeLoader
+    LIBYAML_AVAILABLE = False
 
 URL_PATTERN = re.compile(r'^http[s]?://')
+GLOB_PATTERN = re.compile(r'[*?[]')
+TEMPLATE_MARKERS = ['{{', '{%', '{#']
+TRAILING_NEWLINE_PATTERN = re.compile(r'(\r\n|\r|\n)\Z')
+
+# auto: use json module for JSON input, otherwise libyaml if available
+# libyaml: C-accelerated YAML parser only
+# yaml: pure-Python YAML parser only
+LOADER_BACKENDS = ['auto', 'libyaml', 'yaml']
+
+# seconds to wait for another process evaluating the same command line
+DEFAULT_CACHE_LOCK_TIMEOUT = 60
 
 
 class Loader(object):
-    def __init__(self, work_dir, cache_dir, encoding='utf-8', stdout=sys.stdout, clear_cache=False):
+    def __init__(self, work_dir, cache_dir, encoding='utf-8', stdout=sys.stdout, clear_cache=False, backend='auto',
+                 template_cache_dir=None, cache_max_size=None, cache_compress=False,
+                 cache_lock_timeout=DEFAULT_CACHE_LOCK_TIMEOUT, url_cache_dir=None, url_max_age=None,
+                 fallback_dir=None, fetch_timeout=None, validate=True):
+        if backend not in LOADER_BACKENDS:
+            raise SettingError('Unknown loader backend: %s' % backend)
+        if backend == 'libyaml' and not LIBYAML_AVAILABLE:
+            raise SettingError('libyaml is not available.')
+
         self.work_dir = work_dir
         self.cache_dir = cache_dir
         self.encoding = encoding
         self.stdout = stdout
         self.clear_cache = clear_cache
+        self.backend = backend
+        self.template_cache_dir = template_cache_dir
+        self.eval_cache = EvalCache(cache_dir, encoding, cache_max_size, cache_compress)
+        self.cache_lock_timeout = cache_lock_timeout
+        self.url_cache = None if url_cache_dir is None else UrlCache(url_cache_dir, url_max_age)
+        self.fallback = None if fallback_dir is None else FallbackStore(fallback_dir)
+        self.fetch_timeout = fetch_timeout
+        self.validate = validate
         self.cache = {}
+        self.fetched = {}
+        self.sources = {}
+        self.errors = {}
+        self.stale = {}
+        self.refresh_threads = []
+        self.menus = {}
+        self._print_lock = threading.Lock()
+        self._lock = threading.Lock()  # for cache, fetched and sources read by the watcher thread
+        self._templates = {}
+        self._environment = None
+
+    def clone(self, invalidate=()):
+        """
+        Create a quiet loader which shares the settings and the raw data read so far.
+
+        :param invalidate: keys of the sources to read again
+        :return: new Loader instance
+        """
+        ret = copy.copy(self)
+        ret.stdout = None
+        ret.cache = {}
+        with self._lock:
+            ret.fetched = dict((k, v) for k, v in self.fetched.items() if k not in invalidate)
+        ret.sources = {}
+        ret.errors = {}
+        # the stale data shared is still stale
+        ret.stale = dict((k, v) for k, v in list(self.stale.items()) if k in ret.fetched)
+        ret.refresh_threads = []
+        ret.menus = {}
+        ret._print_lock = threading.Lock()
+        ret._lock = threading.Lock()
+        ret._templates = {}
+        ret._environment = None
+        return ret
+
+    def source_items(self):
+        """
+        :return: list of the keys and the fingerprints of the sources used so far (safe from any thread)
+        """
+        with self._lock:
+            return list(self.sources.items())
+
+    def close(self):
+        """Close the idle connections kept for the urls (shared with the clones)."""
+        if self.url_cache is not None:
+            self.url_cache.close()
 
     @staticmethod
     def is_url(path):
         return path is not None and bool(URL_PATTERN.match(path))
 
-    @types(is_command=bool, path_or_url_or_cmdline=String, eval_expire=Option(int))
-    def load(self, is_command, path_or_url_or_cmdline, eval_expire=None):
+    @staticmethod
+    def is_glob(path):
+        return path is not None and not Loader.is_url(path) and bool(GLOB_PATTERN.search(path))
+
+    def glob(self, pattern):
+        """
+        Expand a glob pattern relative to the working directory.
+
+        :param pattern: glob pattern of the file paths
+        :return: sorted list of the matched file paths (relative to the working directory if the pattern is relative)
+        """
+        if self.work_dir is None or os.path.isabs(pattern):
+            return sorted(p for p in glob.glob(pattern) if os.path.isfile(p))
+        paths = glob.glob(os.path.join(self.work_dir, pattern))
+        return sorted(os.path.relpath(p, self.work_dir) for p in paths if os.path.isfile(p))
+
+    @types(is_command=bool, path_or_url_or_cmdline=String, eval_expire=Option(int), eval_stale=Option(int))
+    def load(self, is_command, path_or_url_or_cmdline, eval_expire=None, eval_stale=None):
         """
         Load data from one file, url or command line, then store to a dict.
 
         :param is_command: True if using command line output
         :param path_or_url_or_cmdline:
         :param eval_expire: seconds to read
+        :param eval_stale: seconds to read after expired while refreshing in background
         :return: dict representation of data
         """
         assert path_or_url_or_cmdline
 
-        # normalize file path
-        is_url = self.is_url(path_or_url_or_cmdline)
-        if not is_command and not is_url:
-            if self.work_dir is not None and not os.path.isabs(path_or_url_or_cmdline):
-                path_or_url_or_cmdline = os.path.join(self.work_dir, path_or_url_or_cmdline)
+        path_or_url_or_cmdline = self._normalize(is_command, path_or_url_or_cmdline)
 
         # if already loaded, use cache data
-        c = self.cache.get((is_command, path_or_url_or_cmdline))
+        key = (is_command, path_or_url_or_cmdline)
+        c = self.cache.get(key)
         if c is not None:
             return c
 
+        # if failed in prefetching, report the same error
+        if key in self.errors:
+            raise self.errors[key]
+
         try:
-            if is_command:
-                # execute command
-                if eval_expire is None:
-                    data = self._eval_command(path_or_url_or_cmdline)
-                else:
-                    # if eval_expire is defined, check the cache on disk
-                    data = self._eval_command_with_cache(path_or_url_or_cmdline, eval_expire)
-            elif self.is_url(path_or_url_or_cmdline):
-                # read from URL
-                print_safe('Reading from URL: %s' % path_or_url_or_cmdline, self.encoding, output=self.stdout)
-                data = urlopen(path_or_url_or_cmdline).read()
-            else:
-                # read from file as bytes
-                print_safe('Reading file: %s' % path_or_url_or_cmdline, self.encoding, output=self.stdout)
-                with open(path_or_url_or_cmdline, 'rb') as f:
-                    data = f.read()
+            data = self.read(is_command, path_or_url_or_cmdline, eval_expire, eval_stale)
+
+            # remember the fingerprint of the source actually used
+            with self._lock:
+                self.sources[key] = self.fetched[key][1]
 
             # decode string with fallback
             data_str = unicode_decode(data, [self.encoding, 'utf-8'])
 
             # apply jinja2 template rendering
-            try:
-                data_str = Environment().from_string(data_str).render()
-            finally:
-                pass
+            data_str = self._render(data_str, path_or_url_or_cmdline)
 
-            # load as YAML string
-            menu = yaml.load(data_str)
+            # load as YAML (or JSON) string
+            menu = self._parse(data_str, is_command or path_or_url_or_cmdline.endswith('.json'))
 
             # update cache data (Note: cache property is mutable!)
-            self.cache[(is_command, path_or_url_or_cmdline)] = menu
+            with self._lock:
+                self.cache[key] = menu
         except IOError:
             raise ConfigError(path_or_url_or_cmdline, 'Failed to open.')
         except UnicodeDecodeError:
@@ -93,41 +185,338 @@ class Loader(object):
             raise ConfigError(path_or_url_or_cmdline, 'YAML format error: %s' % to_unicode(str(e)))
         return menu
 
+    def source_key(self, is_command, path_or_url_or_cmdline):
+        """
+        Identify the source of an "include" or "eval" section regardless of how it is referred to.
+
+        :param is_command: True if using command line output
+        :param path_or_url_or_cmdline:
+        :return: tuple of is_command and the real path, url or command line
+        """
+        path = self._normalize(is_command, path_or_url_or_cmdline)
+        if not is_command and not self.is_url(path):
+            path = os.path.realpath(path)
+        return is_command, path
+
+    def prefetch(self, sources, workers):
+        """
+        Load multiple sources concurrently and store them to the cache.
+
+        Errors are not raised here but kept until the same source is loaded again.
+        :param sources: list of tuple (is_command, path_or_url_or_cmdline, eval_expire, eval_stale)
+                        (glob patterns are expanded to the matched files)
+        :param workers: max number of threads
+        :return: list of dict representation of data newly loaded
+        """
+        expanded = []
+        for source in sources:
+            if not source[0] and self.is_glob(source[1]):
+                expanded.extend((False, path, None, None) for path in self.glob(source[1]))
+            else:
+                expanded.append(source)
+
+        targets = []
+        seen = set()
+        for is_command, path_or_url_or_cmdline, eval_expire, eval_stale in expanded:
+            key = (is_command, self._normalize(is_command, path_or_url_or_cmdline))
+            if key not in self.cache and key not in self.errors and key not in seen:
+                seen.add(key)
+                targets.append(key + (eval_expire, eval_stale))
+
+        def f(target):
+            try:
+                return self.load(*target)
+            except Exception as e:
+                self.errors[target[:2]] = e
+
+        if not targets:
+            return []
+
+        pool = ThreadPool(min(workers, len(targets)))
+        try:
+            results = pool.map(f, targets)
+        finally:
+            pool.close()
+            pool.join()
+        return [r for r in results if r is not None]
+
+    @types(bytes, is_command=bool, path_or_url_or_cmdline=String, eval_expire=Option(int), eval_stale=Option(int))
+    def read(self, is_command, path_or_url_or_cmdline, eval_expire=None, eval_stale=None):
+        """
+        Read raw data from one normalized file path, url or command line, and keep it with its fingerprint.
+
+        :param is_command: True if using command line output
+        :param path_or_url_or_cmdline:
+        :param eval_expire: seconds to read
+        :param eval_stale: seconds to read after expired while refreshing in background
+        :return: encoded binary
+        """
+        key = (is_command, path_or_url_or_cmdline)
+        if key in self.fetched:
+            return self.fetched[key][0]
+
+        if is_command:
+            # execute command
+            if eval_expire is None:
+                data = self._eval_command(path_or_url_or_cmdline)
+            else:
+                # if eval_expire is defined, check the cache on disk
+                data = self._eval_command_with_cache(path_or_url_or_cmdline, eval_expire, eval_stale)
+        elif self.is_url(path_or_url_or_cmdline):
+            # read from URL
+            data = self._read_url(path_or_url_or_cmdline)
+        else:
+            # read from file as bytes
+            self._print('Reading file: %s' % path_or_url_or_cmdline)
+            with open(path_or_url_or_cmdline, 'rb') as f:
+                data = f.read()
+
+        fingerprint = (eval_expire, eval_stale, self.digest(data), self.file_stat(is_command, path_or_url_or_cmdline))
+        with self._lock:
+            self.fetched[key] = (data, fingerprint)
+        return data
+
+    def stale_since(self, is_command, path_or_url_or_cmdline):
+        """
+        :return: time when the data was originally loaded if it was read from an expired "eval" cache or
+                 a last-known-good copy, otherwise None
+        """
+        return self.stale.get((is_command, self._normalize(is_command, path_or_url_or_cmdline)))
+
+    def join_refresh(self):
+        """Wait for all the background refresh of the "eval" cache."""
+        for t in self.refresh_threads:
+            t.join()
+
+    @staticmethod
+    def digest(data):
+        return hashlib.md5(data).hexdigest()
+
+    @classmethod
+    def file_stat(cls, is_command, path_or_url_or_cmdline):
+        """
+        :return: tuple of modification time and size for a local file, otherwise None
+        """
+        if is_command or cls.is_url(path_or_url_or_cmdline) or not os.path.exists(path_or_url_or_cmdline):
+            return None
+        st = os.stat(path_or_url_or_cmdline)
+        return st.st_mtime, st.st_size
+
+    def _render(self, data_str, name):
+        """
+        Render the string as a Jinja2 template if it contains any template syntax.
+
+        :param data_str: unicode string
+        :param name: template name used as the key of the bytecode cache
+        :return: rendered string
+        """
+        if not any(m in data_str for m in TEMPLATE_MARKERS):
+            # Jinja2 removes a single trailing newline by default
+            return TRAILING_NEWLINE_PATTERN.sub('', data_str, 1)
+
+        self._templates[name] = data_str
+        return self._get_environment().get_template(name).render()
+
+    def _get_environment(self):
+        """Create one Jinja2 environment for the loader. Compiled templates are stored to the cache directory."""
+        if self._environment is None:
+            bytecode_cache = None
+            if self.template_cache_dir is not None:
+                if not os.path.exists(self.template_cache_dir):
+                    os.makedirs(self.template_cache_dir)
+                bytecode_cache = FileSystemBytecodeCache(self.template_cache_dir)
+
+            # in-memory cache is disabled because the source of the same name can change
+            self._environment = Environment(loader=FunctionLoader(self._templates.get), bytecode_cache=bytecode_cache,
+                                            cache_size=0)
+        return self._environment
+
+    def _parse(self, data_str, json_expected):
+        """
+        :param data_str: unicode string
+        :param json_expected: True if the source may be written in JSON
+        :return: dict representation of data
+        """
+        if self.backend == 'auto' and (json_expected and data_str.lstrip()[:1] in ('{', '[')):
+            try:
+                return json.loads(data_str)
+            except ValueError:
+                pass  # YAML flow style or broken data
+
+        if self.backend == 'yaml':
+            return yaml.load(data_str, Loader=yaml.SafeLoader)
+
+        try:
+            return yaml.load(data_str, Loader=FastYAMLLoader)
+        except yaml.YAMLError:
+            if FastYAMLLoader is yaml.SafeLoader:
+                raise
+            # parse again for the detailed error message
+            return yaml.load(data_str, Loader=yaml.SafeLoader)
+
+    def _normalize(self, is_command, path_or_url_or_cmdline):
+        """Normalize file path"""
+        if not is_command and not self.is_url(path_or_url_or_cmdline):
+            if self.work_dir is not None and not os.path.isabs(path_or_url_or_cmdline):
+                return os.path.join(self.work_dir, path_or_url_or_cmdline)
+        return path_or_url_or_cmdline
+
+    def _read_url(self, url):
+        """
+        :param url:
+        :return: encoded binary
+        """
+        if self.url_cache is not None:
+            data = self.url_cache.get_fresh(url)
+            if data is not None:
+                self._print('Reading URL cache: %s' % self.url_cache.path(url))
+                return data
+
+        self._print('Reading from URL: %s' % url)
+        return self._fetch_with_fallback(False, url, lambda: (True, self._fetch_url(url)))
+
+    def _fetch_url(self, url):
+        if self.url_cache is None:
+            return urlopen(url).read()
+
+        data, not_modified = self.url_cache.fetch(url)
+        if not_modified:
+            self._print('Reading URL cache: %s' % self.url_cache.path(url))
+        return data
+
+    def _fetch_with_fallback(self, is_command, path_or_url_or_cmdline, f):
+        """
+        Keep the last-known-good copy of the source, and use it when the source fails or times out.
+
+        :param f: function which returns tuple of success flag and encoded binary, or raises IOError
+        :return: encoded binary
+        """
+        if self.fallback is None:
+            return f()[1]
+
+        copy = self.fallback.get(is_command, path_or_url_or_cmdline)
+        if copy is None:
+            # nothing to fall back on
+            ok, data = f()
+            if ok:
+                self.fallback.put(is_command, path_or_url_or_cmdline, data)
+            return data
+
+        result = []
+
+        def g():
+            try:
+                ok, data = f()
+            except IOError:
+                ok, data = False, None
+            if ok:
+                self.fallback.put(is_command, path_or_url_or_cmdline, data)
+            result.append((ok, data))
+
+        if self.fetch_timeout is None:
+            g()
+        else:
+            # the thread left behind still updates the copy when it finishes
+            t = threading.Thread(target=g)
+            t.daemon = True
+            t.start()
+            t.join(self.fetch_timeout)
+
+        if result and result[0][0]:
+            return result[0][1]
+
+        data, saved = copy
+        self._print('Reading last known good copy: %s' % self.fallback.path(is_command, path_or_url_or_cmdline))
+        self.stale[(is_command, path_or_url_or_cmdline)] = saved
+        return data
+
+    def _print(self, message):
+        if self.stdout is None:
+            return
+
+        # messages may come from multiple threads
+        with self._print_lock:
+            print_safe(message, self.encoding, output=self.stdout)
+
     def _eval_command(self, cmdline):
         """
         :param cmdline:
         :return: encoded binary
         """
 
-        # return code and stderr are ignored
-        print_safe('Executing: %s' % cmdline, self.encoding, output=self.stdout)
-        return capture_command(cmdline, shell=True, cwd=self.work_dir, cmd_encoding=self.encoding)[1]
+        # stderr is ignored, and return code is used only for the fallback
+        self._print('Executing: %s' % cmdline)
 
-    @types(cmdline=String, expire=int)
-    def _eval_command_with_cache(self, cmdline, expire):
-        path = self._eval_cache_path(cmdline)
+        def f():
+            ret, data, _ = capture_command(cmdline, shell=True, cwd=self.work_dir, cmd_encoding=self.encoding)
+            return ret == 0, data
+
+        return self._fetch_with_fallback(True, cmdline, f)
+
+    @types(cmdline=String, expire=int, stale=Option(int))
+    def _eval_command_with_cache(self, cmdline, expire, stale=None):
+        path = self.eval_cache.path(cmdline)
 
         # read cache
-        is_readable = not self.clear_cache and os.path.exists(path) and (time.time() - os.path.getmtime(path)) < expire
-        if is_readable:
-            print_safe('Reading eval cache: %s' % path, self.encoding, output=self.stdout)
-            with open(path, 'rb') as f:
-                return f.read()
+        if not self.clear_cache:
+            data = self.eval_cache.get(cmdline, expire)
+            if data is not None:
+                self._print('Reading eval cache: %s' % path)
+                return data
 
-        # execute command
-        data = self._eval_command(cmdline)
+            # stale-while-revalidate
+            if stale is not None:
+                data = self.eval_cache.get(cmdline, expire + stale)
+                if data is not None:
+                    self._print('Reading stale eval cache: %s' % path)
+                    self.stale[(True, cmdline)] = self.eval_cache.created(cmdline)
+                    self._refresh_eval_cache(cmdline, expire)
+                    return data
 
-        # write cache
-        print_safe('Writing eval cache: %s' % path, self.encoding, output=self.stdout)
+        # only one process executes the command, and the others wait for the result
+        with self.eval_cache.lock(cmdline, self.cache_lock_timeout,
+                                  lambda: self._print('Waiting for eval cache: %s' % path)) as locked:
+            if locked:
+                # the cache may have been refreshed while waiting
+                if not self.clear_cache:
+                    data = self.eval_cache.get(cmdline, expire)
+                    if data is not None:
+                        self._print('Reading eval cache: %s' % path)
+                        return data
+            else:
+                # timed out; expired data is better than running the command again
+                data = self.eval_cache.get(cmdline, None)
+                if data is not None:
+                    self._print('Reading stale eval cache: %s' % path)
+                    self.stale[(True, cmdline)] = self.eval_cache.created(cmdline)
+                    return data
 
-        # make parent directory
-        if not os.path.exists(os.path.dirname(path)):
-            os.makedirs(os.path.dirname(path))
+            # execute command
+            data = self._eval_command(cmdline)
 
-        with open(self._eval_cache_path(cmdline), 'wb') as f:
-            f.write(data)
+            # write cache unless the last-known-good copy is used
+            if (True, cmdline) not in self.stale:
+                self._print('Writing eval cache: %s' % path)
+                self.eval_cache.put(cmdline, data, expire)
         return data
 
-    def _eval_cache_path(self, cmdline):
-        h = hashlib.md5(to_bytes(cmdline, self.encoding)).hexdigest()
-        return os.path.join(self.cache_dir, h[:2], h[2:])
+    def _refresh_eval_cache(self, cmdline, expire):
+        """
+        Execute the command in a background thread and update the cache for the next launch.
+
+        The thread is not a daemon, so the process waits for the refresh on exit.
+        """
+
+        def f():
+            try:
+                # skip if another process is refreshing the same entry
+                with self.eval_cache.lock(cmdline, 0) as locked:
+                    if locked and self.eval_cache.get(cmdline, expire) is None:
+                        data = capture_command(cmdline, shell=True, cwd=self.work_dir, cmd_encoding=self.encoding)[1]
+                        self.eval_cache.put(cmdline, data, expire)
+            except Exception:
+                pass  # the cache is refreshed again on the next launch
+
+        t = threading.Thread(target=f)
+        t.start()
+        self.refresh_threads.append(t)
@@ -0,0 +1,118 @@
+from __future__ import division, print_function, absolute_import, unicode_literals
+
+import os
+import hashlib
+from six.moves import cPickle as pickle
+from mog_commons.string import to_bytes
+from mog_commons.io import print_safe
+from mog_commons.types import *
+from easy_menu.setting.loader import Loader
+from easy_menu.setting.cache_util import write_atomic
+
+PICKLE_PROTOCOL = 2
+
+# incremented when the format of the recorded sources or the pickled entities changes
+CACHE_FORMAT = 11
+
+
+class MenuCache(object):
+    """
+    Persistent cache of the compiled menu tree.
+
+    The cache entry records the fingerprints of all the files, urls and command lines read by the loader.
+    It is used only while every source is unchanged.
+    """
+
+    @types(loader=Loader, lazy=bool)
+    def __init__(self, cache_dir, loader, lazy=False):
+        self.cache_dir = cache_dir
+        self.loader = loader
+        self.lazy = lazy
+
+    def load(self, config_path):
+        """
+        :param config_path: path or url of the root configuration
+        :return: Menu if the cache is fresh, otherwise None
+        """
+        if self.loader.clear_cache:
+            return None
+
+        path = self._cache_path(config_path)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'rb') as f:
+                version, sources, root_menu = pickle.load(f)
+        except Exception:
+            # broken or incompatible cache file
+            return None
+
+        if version != self._version() or not all(self._is_fresh(*s) for s in sources):
+            return None
+
+        # rebuild to mark the sub menus read from an expired "eval" cache
+        if self.loader.stale:
+            return None
+
+        print_safe('Reading menu cache: %s' % path, self.loader.encoding, output=self.loader.stdout)
+        self._attach_loader(root_menu)
+
+        # sources are needed for watching
+        for s in sources:
+            self.loader.sources.setdefault(tuple(s[:2]), tuple(s[2:]))
+        return root_menu
+
+    def save(self, config_path, root_menu):
+        """
+        :param config_path: path or url of the root configuration
+        :param root_menu: Menu built from the sources recorded by the loader
+        """
+        # a menu built from an expired "eval" cache should be rebuilt on the next launch
+        if self.loader.stale:
+            return
+
+        path = self._cache_path(config_path)
+        print_safe('Writing menu cache: %s' % path, self.loader.encoding, output=self.loader.stdout)
+
+        sources = [k + v for k, v in sorted(self.loader.sources.items())]
+        try:
+            # pickle is recursive, so a deep menu tree raises RecursionError (RuntimeError before Python 3.5)
+            data = pickle.dumps((self._version(), sources, root_menu), PICKLE_PROTOCOL)
+            write_atomic(path, data)
+        except (pickle.PicklingError, TypeError, RuntimeError, IOError, OSError) as e:
+            # the menu works without the cache
+            print_safe('Failed to write menu cache: %s: %s' % (e.__class__.__name__, e), self.loader.encoding,
+                       output=self.loader.stdout)
+
+    def _is_fresh(self, is_command, path_or_url_or_cmdline, eval_expire, eval_stale, digest, stat):
+        # local file without any modification
+        if stat is not None and Loader.file_stat(is_command, path_or_url_or_cmdline) == stat:
+            return True
+
+        # compare the contents (the data read here is reused by the loader)
+        try:
+            data = self.loader.read(is_command, path_or_url_or_cmdline, eval_expire, eval_stale)
+        except IOError:
+            return False
+        return Loader.digest(data) == digest
+
+    def _attach_loader(self, root_menu):
+        """Lazy menus need the loader which is not pickled."""
+        from easy_menu.entity import Menu, LazyMenu
+
+        stack = [root_menu]
+        while stack:
+            menu = stack.pop()
+            if isinstance(menu, LazyMenu):
+                menu.loader = self.loader
+            stack.extend(x for x in menu.items if isinstance(x, Menu))
+
+    def _cache_path(self, config_path):
+        key = '\n'.join([config_path, self.loader.work_dir or '', self.loader.encoding or '', '%s' % self.lazy])
+        h = hashlib.md5(to_bytes(key, 'utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, h[:2], h[2:])
+
+    @staticmethod
+    def _version():
+        return '%s/%d' % (__import__('easy_menu').__version__, CACHE_FORMAT)
@@ -8,13 +8,22 @@ from mog_commons.functional import omap, oget
 from mog_commons.string import to_unicode
 
 from easy_menu.setting import arg_parser
-from easy_menu.setting.loader import Loader
-from easy_menu.entity import Menu, Meta
+from easy_menu.setting.loader import Loader, DEFAULT_CACHE_LOCK_TIMEOUT
+from easy_menu.setting.menu_cache import MenuCache
+from easy_menu.setting.eval_cache import EvalCache
+from easy_menu.setting.watcher import Watcher, DEFAULT_WATCH_INTERVAL
+from easy_menu.entity import Item, Menu, Meta
 from easy_menu.exceptions import SettingError, ConfigError
 
 DEFAULT_CONFIG_NAME = os.environ.get('EASY_MENU_CONFIG', 'easy-menu.yml')
 EVAL_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.easy-menu', 'eval')
 COMMAND_PID_DIR = os.path.join(os.path.expanduser('~'), '.easy-menu', 'pid')
+JOB_LOG_DIR = os.path.join(os.path.expanduser('~'), '.easy-menu', 'job')
+MENU_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.easy-menu', 'menu')
+TEMPLATE_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.easy-menu', 'template')
+URL_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.easy-menu', 'url')
+FALLBACK_DIR = os.path.join(os.path.expanduser('~'), '.easy-menu', 'fallback')
+DEFAULT_CACHE_MAX_MB = 256
 
 
 class Setting(CaseClass):
@@ -24,7 +33,13 @@ class Setting(CaseClass):
 
     def __init__(self, config_path=None, work_dir=None, root_menu=None, encoding=None, lang=None, width=None,
                  clear_cache=False, cache_dir=EVAL_CACHE_DIR, pid_dir=COMMAND_PID_DIR,
-                 stdin=None, stdout=None, stderr=None, getch_enabled=True, source_enabled=True):
+                 stdin=None, stdout=None, stderr=None, getch_enabled=True, source_enabled=True,
+                 menu_cache=False, menu_cache_dir=MENU_CACHE_DIR, workers=1, lazy=False,
+                 loader_backend='auto', template_cache_dir=TEMPLATE_CACHE_DIR, cache_max_mb=DEFAULT_CACHE_MAX_MB,
+                 cache_compress=False, gc_cache=False, cache_lock_timeout=DEFAULT_CACHE_LOCK_TIMEOUT,
+                 url_cache_dir=URL_CACHE_DIR, url_max_age=None, fallback=False, fallback_dir=FALLBACK_DIR,
+                 fetch_timeout=None, watch=False, watch_interval=DEFAULT_WATCH_INTERVAL, validate=True, watcher=None,
+                 run_path=None, job_dir=JOB_LOG_DIR, loader=None):
         is_url = Loader.is_url(config_path)
         work_dir = omap(lambda s: to_unicode(s, encoding), self._search_work_dir(work_dir, config_path, is_url))
 
@@ -42,7 +57,29 @@ class Setting(CaseClass):
                            ('stdout', oget(stdout, sys.stdout)),
                            ('stderr', oget(stderr, sys.stderr)),
                            ('getch_enabled', getch_enabled),
-                           ('source_enabled', source_enabled)
+                           ('source_enabled', source_enabled),
+                           ('menu_cache', menu_cache),
+                           ('menu_cache_dir', menu_cache_dir),
+                           ('workers', workers),
+                           ('lazy', lazy),
+                           ('loader_backend', loader_backend),
+                           ('template_cache_dir', template_cache_dir),
+                           ('cache_max_mb', cache_max_mb),
+                           ('cache_compress', cache_compress),
+                           ('gc_cache', gc_cache),
+                           ('cache_lock_timeout', cache_lock_timeout),
+                           ('url_cache_dir', url_cache_dir),
+                           ('url_max_age', url_max_age),
+                           ('fallback', fallback),
+                           ('fallback_dir', fallback_dir),
+                           ('fetch_timeout', fetch_timeout),
+                           ('watch', watch),
+                           ('watch_interval', watch_interval),
+                           ('validate', validate),
+                           ('watcher', watcher),
+                           ('run_path', run_path),
+                           ('job_dir', job_dir),
+                           ('loader', loader)
                            )
 
     @staticmethod
@@ -82,7 +119,14 @@ class Setting(CaseClass):
             arg_parser.parser.exit(2)
 
         return self.copy(config_path=path, work_dir=option.work_dir, encoding=option.encoding, lang=option.lang,
-                         width=option.width, clear_cache=option.clear_cache, getch_enabled=option.getch_enabled)
+                         width=option.width, clear_cache=option.clear_cache, getch_enabled=option.getch_enabled,
+                         menu_cache=option.menu_cache, workers=option.workers, lazy=option.lazy,
+                         loader_backend=option.loader_backend, cache_max_mb=option.cache_max_mb,
+                         cache_compress=option.cache_compress, gc_cache=option.gc_cache,
+                         cache_lock_timeout=option.cache_lock_timeout, url_max_age=option.url_max_age,
+                         fallback=option.fallback, fetch_timeout=option.fetch_timeout, watch=option.watch,
+                         watch_interval=option.watch_interval, validate=option.validate,
+                         run_path=option.run_path)
 
     def lookup_config(self):
         if self.config_path is None:
@@ -103,15 +147,64 @@ class Setting(CaseClass):
         Load the configuration file or url.
 
         If it contains 'include' sections, load them recursively.
+        When the menu cache is enabled and all the sources are unchanged, the compiled menu is used instead.
         :return: updated Setting instance
         """
         if self.config_path is None:
             raise SettingError('Not found configuration file.')
 
-        loader = Loader(self.work_dir, self.cache_dir, self.encoding, self.stdout, self.clear_cache)
-        data = loader.load(False, self.config_path)
-        try:
-            root_menu = Menu.parse(data, Meta(self.work_dir), loader, self.encoding, 0)
-        except (AssertionError, ValueError, TypeError) as e:
-            raise ConfigError(self.config_path, e)
-        return self.copy(root_menu=root_menu)
+        loader = Loader(self.work_dir, self.cache_dir, self.encoding, self.stdout, self.clear_cache,
+                        self.loader_backend, self.template_cache_dir, self._cache_max_size(), self.cache_compress,
+                        self.cache_lock_timeout, self.url_cache_dir, self.url_max_age,
+                        self.fallback_dir if self.fallback else None, self.fetch_timeout, self.validate)
+        menu_cache = MenuCache(self.menu_cache_dir, loader, self.lazy) if self.menu_cache else None
+
+        meta = Meta(self.work_dir, lazy=self.lazy)
+        root_menu = menu_cache.load(self.config_path) if menu_cache else None
+        if root_menu is None:
+            data = loader.load(False, self.config_path)
+            if self.workers > 1:
+                self._prefetch(loader, data)
+            try:
+                root_menu = Menu.parse(data, meta, loader, self.encoding, (loader.source_key(False, self.config_path),))
+                if self.validate:
+                    Item.validate(root_menu)
+                root_menu.stale_since = loader.stale_since(False, self.config_path)
+            except (AssertionError, ValueError, TypeError) as e:
+                raise ConfigError(self.config_path, e)
+
+            if menu_cache:
+                menu_cache.save(self.config_path, root_menu)
+
+        watcher = None
+        if self.watch:
+            watcher = Watcher(loader, root_menu, self.config_path, meta, oget(self.encoding, 'utf-8'),
+                              self.watch_interval)
+        return self.copy(root_menu=root_menu, watcher=watcher, loader=loader)
+
+    def close(self):
+        """Release the resources of the loaded configuration, e.g. the connections kept for the urls."""
+        if self.loader is not None:
+            self.loader.close()
+
+    def gc_eval_cache(self):
+        """
+        Remove expired "eval" cache entries.
+        :return: tuple of the number of removed entries and removed bytes
+        """
+        if not os.path.exists(self.cache_dir):
+            return 0, 0
+        return EvalCache(self.cache_dir, oget(self.encoding, 'utf-8'), self._cache_max_size()).gc()
+
+    def _cache_max_size(self):
+        return None if self.cache_max_mb is None else self.cache_max_mb * 1024 * 1024
+
+    def _prefetch(self, loader, data):
+        """
+        Load all the sources in the tree concurrently, level by level.
+
+        Menu is assembled afterwards from the loader cache, so the declaration order and errors are kept.
+        """
+        sources = Item.find_sources(data, self.lazy)
+        while sources:
+            sources = [s for d in loader.prefetch(sources, self.workers) for s in Item.find_sources(d)]
@@ -0,0 +1,219 @@
+from __future__ import division, print_function, absolute_import, unicode_literals
+
+import os
+import json
+import base64
+import time
+import hashlib
+import threading
+from six.moves import http_client
+from six.moves.urllib.parse import urlsplit, urljoin, unquote
+from six.moves.urllib.request import getproxies, proxy_bypass
+from mog_commons.string import to_bytes, to_unicode
+from mog_commons.types import *
+from easy_menu.setting.cache_util import write_atomic
+
+DEFAULT_TIMEOUT = 30
+MAX_REDIRECTS = 5
+REDIRECT_STATUSES = [301, 302, 303, 307, 308]
+META_SUFFIX = '.json'
+
+
+class UrlCache(object):
+    """
+    Local copy of the configurations loaded by URL.
+
+    Each response body is stored with its ETag and Last-Modified headers, and the next fetch is sent as
+    a conditional request. Connections are kept alive and reused for the same host.
+    The proxies are taken from the environment (http_proxy, https_proxy and no_proxy) in the same way as urllib.
+    """
+
+    @types(max_age=Option(int))
+    def __init__(self, cache_dir, max_age=None, timeout=DEFAULT_TIMEOUT):
+        """
+        :param cache_dir: cache directory
+        :param max_age: seconds to use the local copy without any request (None: always revalidate)
+        :param timeout: socket timeout in seconds
+        """
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.timeout = timeout
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def path(self, url):
+        h = hashlib.md5(to_bytes(url, 'utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, h[:2], h[2:])
+
+    def get_fresh(self, url, now=None):
+        """
+        :param url: url string
+        :param now: current time
+        :return: local copy if it was validated within max_age seconds, otherwise None
+        """
+        if self.max_age is None:
+            return None
+
+        now = time.time() if now is None else now
+        meta = self._read_meta(url)
+        if meta is None or now - meta['validated'] >= self.max_age:
+            return None
+        return self._read_body(url)
+
+    def fetch(self, url, now=None):
+        """
+        Send a request with the validators of the local copy.
+
+        :param url: url string
+        :param now: current time
+        :return: tuple of the response body and True if not modified
+        """
+        now = time.time() if now is None else now
+        meta = self._read_meta(url)
+        body = None if meta is None else self._read_body(url)
+
+        headers = {}
+        if body is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        status, response_headers, data = self._request(url, headers)
+
+        if status == 304 and body is not None:
+            meta['validated'] = now
+            self._write_meta(url, meta)
+            return body, True
+
+        if status != 200:
+            raise IOError('HTTP Error %d: %s' % (status, url))
+
+        write_atomic(self.path(url), data)
+        self._write_meta(url, {
+            'url': url,
+            'etag': response_headers.get('etag'),
+            'last_modified': response_headers.get('last-modified'),
+            'validated': now,
+        })
+        return data, False
+
+    def close(self):
+        """Close all the idle connections."""
+        with self._lock:
+            for conns in self._connections.values():
+                for conn in conns:
+                    conn.close()
+            self._connections = {}
+
+    def _request(self, url, headers):
+        """
+        :return: tuple of status code, dict of lower-cased headers and body
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(url)
+            key = (parts.scheme, parts.netloc)
+            target = parts.path or '/'
+            if parts.query:
+                target += '?' + parts.query
+            request_headers = headers
+            proxy = self._proxy(parts.scheme, parts.netloc)
+            if proxy is not None and parts.scheme != 'https':
+                # the proxy forwards the request to the absolute url
+                target = '%s://%s%s' % (parts.scheme, parts.netloc, target)
+                request_headers = dict(headers, **self._proxy_headers(proxy))
+
+            # a reused connection may have been closed by the server
+            conn, reused = self._acquire(key, proxy)
+            try:
+                status, response_headers, data = self._send(conn, target, request_headers)
+            except (IOError, http_client.HTTPException) as e:
+                conn.close()
+                if not reused:
+                    if isinstance(e, IOError):
+                        raise
+                    raise IOError('%s: %s' % (e.__class__.__name__, url))
+                conn, _ = self._acquire(key, proxy, reuse=False)
+                try:
+                    status, response_headers, data = self._send(conn, target, request_headers)
+                except (IOError, http_client.HTTPException) as e:
+                    conn.close()
+                    raise IOError('%s: %s' % (e.__class__.__name__, url))
+            self._release(key, conn)
+
+            if status in REDIRECT_STATUSES and 'location' in response_headers:
+                url = urljoin(url, response_headers['location'])
+                continue
+            return status, response_headers, data
+        raise IOError('Too many redirects: %s' % url)
+
+    @staticmethod
+    def _send(conn, target, headers):
+        conn.request('GET', target, headers=headers)
+        response = conn.getresponse()
+        data = response.read()
+        return response.status, dict((k.lower(), v) for k, v in response.getheaders()), data
+
+    def _acquire(self, key, proxy, reuse=True):
+        """
+        :param proxy: proxy url, or None to connect directly
+        :return: tuple of connection and True if the connection is reused
+        """
+        with self._lock:
+            conns = self._connections.get(key)
+            if reuse and conns:
+                return conns.pop(), True
+
+        scheme, netloc = key
+        cls = http_client.HTTPSConnection if scheme == 'https' else http_client.HTTPConnection
+        if proxy is None:
+            return cls(netloc, timeout=self.timeout), False
+
+        conn = cls(urlsplit(proxy).netloc.rpartition('@')[2], timeout=self.timeout)
+        if scheme == 'https':
+            # CONNECT to the host through the proxy, then TLS with the host
+            conn.set_tunnel(netloc, headers=self._proxy_headers(proxy))
+        return conn, False
+
+    @staticmethod
+    def _proxy(scheme, netloc):
+        """
+        :return: url of the proxy for the scheme and the host, or None if not configured or bypassed
+        """
+        proxy = getproxies().get(scheme)
+        if not proxy or proxy_bypass(netloc):
+            return None
+        return proxy if '://' in proxy else 'http://' + proxy
+
+    @staticmethod
+    def _proxy_headers(proxy):
+        """
+        :return: dict of the header to authenticate with the user and password in the proxy url
+        """
+        parts = urlsplit(proxy)
+        if parts.username is None:
+            return {}
+        credentials = '%s:%s' % (unquote(parts.username), unquote(parts.password or ''))
+        return {'Proxy-Authorization': 'Basic ' + base64.b64encode(to_bytes(credentials, 'utf-8')).decode('ascii')}
+
+    def _release(self, key, conn):
+        with self._lock:
+            self._connections.setdefault(key, []).append(conn)
+
+    def _read_body(self, url):
+        try:
+            with open(self.path(url), 'rb') as f:
+                return f.read()
+        except IOError:
+            return None
+
+    def _read_meta(self, url):
+        try:
+            with open(self.path(url) + META_SUFFIX, 'rb') as f:
+                meta = json.loads(to_unicode(f.read(), 'utf-8'))
+        except (IOError, ValueError):
+            return None
+        return meta if meta.get('url') == url else None
+
+    def _write_meta(self, url, meta):
+        write_atomic(self.path(url) + META_SUFFIX, to_bytes(json.dumps(meta), 'utf-8'))
@@ -0,0 +1,211 @@
+from __future__ import division, print_function, absolute_import, unicode_literals
+
+import os
+import copy
+import time
+import threading
+import weakref
+from mog_commons.types import *
+from easy_menu.setting.loader import Loader
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+DEFAULT_WATCH_INTERVAL = 2
+
+
+class Watcher(object):
+    """
+    Watches the local files used by the menu and rebuilds the changed sub trees in a background thread.
+
+    The new root menu is picked up by the terminal between key inputs, so rebuilding never blocks the user.
+    inotify is used to wake up immediately if inotify_simple is installed, otherwise the files are polled.
+    The files read by lazy menus are picked up from the loaders of the menus, which are forgotten with the menus.
+    """
+
+    @types(loader=Loader)
+    def __init__(self, loader, root_menu, config_path, meta, encoding='utf-8', interval=DEFAULT_WATCH_INTERVAL):
+        """
+        :param loader: Loader used to build root_menu
+        :param root_menu: Menu instance
+        :param config_path: path or url of the root configuration
+        :param meta: Meta instance for the root menu
+        :param encoding:
+        :param interval: seconds between checks
+        """
+        self.loader = loader
+        self.root_menu = root_menu
+        self.config_path = config_path
+        self.meta = meta
+        self.encoding = encoding
+        self.interval = interval
+        self.fingerprints = {}
+        self.logger = None
+        self._known = set()
+        self._loaders = weakref.WeakSet([loader])
+        self._updated = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._collect()
+
+    def start(self, logger=None):
+        """
+        :param logger: Logger to report the errors in rebuilding the menu
+        """
+        self.logger = logger
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def poll(self):
+        """
+        :return: new root menu if rebuilt since the last call, otherwise None
+        """
+        with self._lock:
+            updated, self._updated = self._updated, None
+        return updated
+
+    def check(self):
+        """
+        :return: set of the keys of the local files whose contents have changed
+        """
+        self._collect()
+
+        changed = set()
+        for key, (digest, stat) in list(self.fingerprints.items()):
+            new_stat = Loader.file_stat(*key)
+            if new_stat == stat:
+                continue
+            try:
+                with open(key[1], 'rb') as f:
+                    new_digest = Loader.digest(f.read())
+            except IOError:
+                new_digest = None
+            if new_digest != digest:
+                changed.add(key)
+            else:
+                # touched only
+                self.fingerprints[key] = (digest, new_stat)
+        return changed
+
+    def rebuild(self, changed):
+        """
+        Parse again only the sub trees loaded from the changed files.
+
+        :param changed: set of the keys of the changed files
+        :return: new root menu (the same instance if nothing is affected)
+        """
+        from easy_menu.entity import Item, Menu
+
+        loader = self.loader.clone(changed)
+        if (False, loader._normalize(False, self.config_path)) in changed:
+            root_menu = Menu.parse(loader.load(False, self.config_path), self.meta, loader, self.encoding,
+                                   (loader.source_key(False, self.config_path),))
+            root_menu.stale_since = loader.stale_since(False, self.config_path)
+        else:
+            root_menu = self._rebuild_menu(self.root_menu, changed, loader, {})
+        if loader.validate:
+            Item.validate(root_menu)
+
+        # files no longer used are forgotten
+        for key in changed:
+            del self.fingerprints[key]
+        for key, (_, _, digest, stat) in loader.source_items():
+            if stat is not None:
+                self.fingerprints[key] = (digest, stat)
+                self._known.add(key)
+
+        self.loader = loader
+        self._loaders.add(loader)
+        self.root_menu = root_menu
+        return root_menu
+
+    def _rebuild_menu(self, menu, changed, loader, done):
+        """
+        :param done: dict of id of the menu to the rebuilt menu (shared menus are rebuilt once)
+        """
+        if id(menu) not in done:
+            done[id(menu)] = self._rebuild_menu_once(menu, changed, loader, done)
+        return done[id(menu)]
+
+    def _rebuild_menu_once(self, menu, changed, loader, done):
+        from easy_menu.entity import Item, Menu, LazyMenu
+
+        if isinstance(menu, LazyMenu):
+            if not menu.loaded:
+                return menu
+            is_command, path_or_url_or_cmdline, eval_expire, eval_stale = menu.source
+            if (is_command, loader._normalize(is_command, path_or_url_or_cmdline)) in changed:
+                ret = LazyMenu(path_or_url_or_cmdline, menu.meta, is_command, path_or_url_or_cmdline, eval_expire,
+                               loader, menu.encoding, eval_stale)
+                return ret.load()
+        elif menu.origin is not None:
+            is_command, path_or_url_or_cmdline, eval_expire, eval_stale, meta, chain = menu.origin
+            if (is_command, loader._normalize(is_command, path_or_url_or_cmdline)) in changed:
+                return Item._parse_source(is_command, path_or_url_or_cmdline, eval_expire, eval_stale, meta, loader,
+                                          self.encoding, chain)
+
+        items = [self._rebuild_menu(x, changed, loader, done) if isinstance(x, Menu) else x for x in menu.items]
+        if all(a is b for a, b in zip(items, menu.items)):
+            return menu
+
+        # copy on write; the current tree may be being displayed
+        ret = copy.copy(menu)
+        ret.items = items
+        return ret
+
+    def _collect(self):
+        """Add the local files newly read by any loader (lazy menus may be loaded at any time)."""
+        for loader in list(self._loaders):
+            for key, (_, _, digest, stat) in loader.source_items():
+                if stat is not None and key not in self._known:
+                    self.fingerprints[key] = (digest, stat)
+                    self._known.add(key)
+
+    def _run(self):
+        inotify = self._create_inotify()
+        while not self._stopped.is_set():
+            if inotify is None:
+                self._stopped.wait(self.interval)
+            else:
+                self._wait_inotify(inotify)
+
+            try:
+                changed = self.check()
+                if changed:
+                    old = self.root_menu
+                    root_menu = self.rebuild(changed)
+                    if root_menu is not old:
+                        with self._lock:
+                            self._updated = root_menu
+            except Exception as e:
+                # keep the current menu until the files are fixed
+                if self.logger is not None:
+                    self.logger.error('Failed to reload the menu: %s: %s' % (e.__class__.__name__, e))
+
+    def _create_inotify(self):
+        if INotify is None:
+            return None
+        try:
+            return INotify()
+        except (IOError, OSError):
+            return None
+
+    def _wait_inotify(self, inotify):
+        # watch the directories to detect the files replaced by editors
+        mask = inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO | inotify_flags.CREATE | inotify_flags.DELETE
+        for d in set(os.path.dirname(path) for _, path in self.fingerprints):
+            try:
+                inotify.add_watch(d, mask)
+            except (IOError, OSError):
+                pass
+        inotify.read(timeout=int(self.interval * 1000))
+        time.sleep(0.05)  # wait for the editor to finish writing
@@ -1 +1,2 @@
 from .terminal import Terminal
+from .search_index import SearchIndex
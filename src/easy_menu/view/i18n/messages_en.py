@@ -17,3 +17,30 @@ MSG_SOURCE_TITLE = 'Source of the menu'
 MSG_DUPLICATE_TITLE = 'Duplicate check'
 MSG_DUPLICATE = '  Already running: %s'
 MSG_DUPLICATE_QUESTION = 'Do you really want to continue? (y/n) [n]: '
+MSG_LOADING_TITLE = 'Loading: %s'
+MSG_LOAD_ERROR_TITLE = 'Failed to load: %s'
+MSG_STALE_SINCE = '%s (stale since %s)'
+MSG_SEARCH_TITLE = 'Search: %s'
+MSG_SEARCH_INPUT = 'Type words to search, Enter to choose, Esc to cancel: '
+MSG_SEARCH_NO_MATCH = '  No matches.'
+MSG_SEARCH_MORE = '  ... more matches (type more words)'
+MSG_SEARCH_EDIT = 'Edit the query'
+MSG_CONFIRM_BACKGROUND = '  Would execute in background: %s'
+MSG_CONFIRM_QUESTION_BACKGROUND = 'Do you really want to execute? (y/n, b: in background) [n]: '
+MSG_JOBS_ITEM = '  [J] | Background jobs (%d running / %d)'
+MSG_JOBS_TITLE = 'Background jobs'
+MSG_JOB_STARTED_TITLE = 'Started in background: %s'
+MSG_JOB_STARTED = '  Job #%d is running. Press [J] in the menu to see the progress.'
+MSG_JOB_LOG = '  Log file: %s'
+MSG_JOB_RUNNING = 'running for %s'
+MSG_JOB_FINISHED = 'return code %d in %s'
+MSG_RUNNING = '%s (running)'
+MSG_SLOT_TITLE = 'Concurrency limit'
+MSG_SLOT_FULL = '  %s is running at the limit of %d.'
+MSG_SLOT_QUESTION = 'Do you want to wait for a free slot? (y/n) [n]: '
+MSG_SLOT_POSITION = '  Waiting for a free slot: position %d in the queue'
+MSG_SLOT_CANCEL = 'Press any key to cancel...'
+MSG_END_TIMEOUT = 'Timed out after %s seconds'
+MSG_END_INTERRUPTED = 'Interrupted'
+MSG_END_CPU_LIMIT = 'CPU time limit exceeded (%d seconds)'
+MSG_END_SIGNAL = 'Killed by signal %d'
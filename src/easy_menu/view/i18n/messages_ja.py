@@ -18,3 +18,30 @@ MSG_SOURCE_TITLE = 'ソース表示'
 MSG_DUPLICATE_TITLE = '多重実行チェック'
 MSG_DUPLICATE = '  %s は既に実行中です。'
 MSG_DUPLICATE_QUESTION = '本当によろしいですか? (y/n) [n]: '
+MSG_LOADING_TITLE = '読み込み中: %s'
+MSG_LOAD_ERROR_TITLE = '読み込み失敗: %s'
+MSG_STALE_SINCE = '%s (%s 時点)'
+MSG_SEARCH_TITLE = '検索: %s'
+MSG_SEARCH_INPUT = '検索語を入力してください (Enter: 選択, Esc: 中止): '
+MSG_SEARCH_NO_MATCH = '  該当なし'
+MSG_SEARCH_MORE = '  ... 他にも該当あり (検索語を追加してください)'
+MSG_SEARCH_EDIT = '検索語を修正'
+MSG_CONFIRM_BACKGROUND = '  %s をバックグラウンドで行います。'
+MSG_CONFIRM_QUESTION_BACKGROUND = 'よろしいですか? (y/n, b: バックグラウンド実行) [n]: '
+MSG_JOBS_ITEM = '  [J] | バックグラウンドジョブ (実行中 %d / %d)'
+MSG_JOBS_TITLE = 'バックグラウンドジョブ'
+MSG_JOB_STARTED_TITLE = 'バックグラウンド実行: %s'
+MSG_JOB_STARTED = '  ジョブ #%d を実行中です。メニューで [J] を押すと状況を確認できます。'
+MSG_JOB_LOG = '  ログファイル: %s'
+MSG_JOB_RUNNING = '実行中 %s'
+MSG_JOB_FINISHED = 'リターンコード %d (%s)'
+MSG_RUNNING = '%s (実行中)'
+MSG_SLOT_TITLE = '同時実行数の制限'
+MSG_SLOT_FULL = '  %s は同時実行数の上限 (%d) に達しています。'
+MSG_SLOT_QUESTION = '空きを待ちますか? (y/n) [n]: '
+MSG_SLOT_POSITION = '  空き待ち: 待ち順 %d 番目'
+MSG_SLOT_CANCEL = '何かキーを押すとキャンセルします...'
+MSG_END_TIMEOUT = '%s 秒でタイムアウトしました'
+MSG_END_INTERRUPTED = '中断されました'
+MSG_END_CPU_LIMIT = 'CPU 時間の上限 (%d 秒) を超えました'
+MSG_END_SIGNAL = 'シグナル %d で終了しました'
@@ -0,0 +1,198 @@
+from __future__ import division, print_function, absolute_import, unicode_literals
+
+from array import array
+from bisect import bisect_right
+from itertools import chain, compress, repeat
+from operator import contains
+from six.moves import range, map, filter
+from easy_menu.entity import Menu, LazyMenu
+
+PATH_SEPARATOR = ' > '
+MAX_SEARCH_STEPS = 256  # ranges to skip before intersecting the whole matches of the words
+
+
+class SearchIndex(object):
+    """
+    Index of all the commands and sub menus for incremental search.
+
+    An entry matches a query if every word is found in the title of the entry or of its ancestors. The entries are
+    numbered in the depth-first order, so the entries matching a word form the subtree ranges of the entries whose
+    own title contains it. All the lower-cased titles are joined into one text, and each range is found by the
+    C-level substring search from the current position, skipping the whole subtree already matched.
+    If the ranges of the words keep alternating without overlapping, e.g. two common words never in the same path,
+    the search switches to intersecting the sets of all the entries matching each word after MAX_SEARCH_STEPS
+    ranges, so that the time per query is bounded by a few scans of the titles.
+    Lazy menus are indexed as they are, and `outdated` tells when some of them have been loaded since.
+    """
+
+    def __init__(self, root_menu):
+        """
+        :param root_menu: Menu instance
+        """
+        self.root_menu = root_menu
+        self.items = []  # list of Menu or Command
+        self.parents = array('i')  # entry number of the parent menu (-1: root menu)
+        self.ends = array('i')  # entry number next to the last descendant
+        self.offsets = array('i')  # start position of each title in the text (and the end of the text)
+        self.text = ''  # lower-cased titles terminated by newlines
+        self._titles = []  # lower-cased titles
+        self._has_descendants = bytearray()  # 1 if the entry is a menu with any entry
+        self._matches = {}  # word: (entries whose own title contains it, set of the entries matching it)
+        self._lazy_menus = []  # lazy menus not loaded when indexed
+        self._build()
+
+    def _build(self):
+        titles = []
+        position = 0
+
+        # depth-first in the menu order; shared sub menus are indexed for each path
+        stack = [(x, -1) for x in reversed(self.root_menu.items)]
+        while stack:
+            item, parent = stack.pop()
+            index = len(self.items)
+            title = item.title.lower().replace('\n', ' ')
+            self.items.append(item)
+            self.parents.append(parent)
+            self.offsets.append(position)
+            titles.append(title)
+            position += len(title) + 1
+
+            if isinstance(item, LazyMenu) and not item.loaded:
+                self._lazy_menus.append(item)
+            elif isinstance(item, Menu):
+                stack.extend((x, index) for x in reversed(item.items))
+
+        self.offsets.append(position)
+        self.text = ''.join(t + '\n' for t in titles)
+        self._titles = titles
+
+        self.ends = array('i', range(1, len(self.items) + 1))
+        for i in range(len(self.items) - 1, -1, -1):
+            p = self.parents[i]
+            if p >= 0 and self.ends[p] < self.ends[i]:
+                self.ends[p] = self.ends[i]
+        self._has_descendants = bytearray(self.ends[i] > i + 1 for i in range(len(self.items)))
+
+    def outdated(self):
+        """
+        :return: True if any lazy menu has been loaded after indexed
+        """
+        return any(m.loaded for m in self._lazy_menus)
+
+    def search(self, query, limit):
+        """
+        Find the entries whose path contains all the words in the query (case-insensitive).
+
+        :param query: words separated by whitespaces
+        :param limit: max number of the entries to return
+        :return: list of the entry numbers in the menu order
+        """
+        words = [w for w in query.lower().split() if w != PATH_SEPARATOR.strip()]
+        if not words:
+            return []
+
+        ret = []
+        x = 0
+        steps = 0
+        while len(ret) < limit:
+            if steps >= MAX_SEARCH_STEPS:
+                return ret + self._search_sets(words, x, limit - len(ret))
+
+            # move x forward until all the words cover it
+            for w in words:
+                r = self._next_range(w, x)
+                if r is None:
+                    return ret
+                if r[0] > x:
+                    x = r[0]
+                    steps += 1
+                    break
+            else:
+                ret.append(x)
+                x += 1
+        return ret
+
+    def _search_sets(self, words, start, limit):
+        """
+        :return: list of the first entry numbers from start matching all the words, by the set intersection
+        """
+        cache, self._matches = self._matches, {}
+        matched = None
+        for w in sorted(set(words), key=len, reverse=True):
+            own, entries = self._match_word(w, cache)
+            self._matches[w] = own, entries
+            matched = entries if matched is None else matched & entries
+            if not matched:
+                return []
+        return sorted(filter(start.__le__, matched))[:limit]
+
+    def _match_word(self, word, cache):
+        """
+        :param cache: dict of the previous results, reused if any word is contained in the word
+        :return: tuple of the list of the entries whose own title contains the word, and the set of the entries
+                 whose own or ancestor's title contains the word
+        """
+        if word in cache:
+            return cache[word]
+
+        candidates = None
+        for k, (own, _) in cache.items():
+            if k in word and (candidates is None or len(own) < len(candidates)):
+                candidates = own
+        if candidates is None:
+            own = list(compress(range(len(self.items)), map(contains, self._titles, repeat(word))))
+        else:
+            own = list(compress(candidates, map(contains, map(self._titles.__getitem__, candidates), repeat(word))))
+
+        # add the descendants of the menus
+        menus = list(compress(own, map(self._has_descendants.__getitem__, own)))
+        entries = set(own)
+        entries.update(chain.from_iterable(map(range, menus, map(self.ends.__getitem__, menus))))
+        return own, entries
+
+    def _title(self, index):
+        return self.text[self.offsets[index]:self.offsets[index + 1] - 1]
+
+    def _next_range(self, word, x):
+        """
+        :return: the first range (start, end) of the entries matching the word that ends after x, or None
+        """
+        if x >= len(self.items):
+            return None
+
+        # x itself or its ancestors
+        end = None
+        i = x
+        while i >= 0:
+            if word in self._title(i):
+                end = self.ends[i]
+            i = self.parents[i]
+        if end is not None:
+            return x, end
+
+        pos = self.text.find(word, self.offsets[x])
+        if pos < 0:
+            return None
+        i = bisect_right(self.offsets, pos) - 1
+        return i, self.ends[i]
+
+    def titles(self, index):
+        """
+        :return: list of the titles from the top level to the entry (the root title is excluded)
+        """
+        ret = []
+        while index >= 0:
+            ret.append(self.items[index].title)
+            index = self.parents[index]
+        return ret[::-1]
+
+    def stack(self, index):
+        """
+        :return: list of Menu from the root menu to the parent of the entry
+        """
+        ret = []
+        index = self.parents[index]
+        while index >= 0:
+            ret.append(self.items[index])
+            index = self.parents[index]
+        return [self.root_menu] + ret[::-1]
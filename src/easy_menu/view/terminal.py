@@ -1,22 +1,35 @@
 from __future__ import division, print_function, absolute_import, unicode_literals
 
 import sys
+import select
 from datetime import datetime
 
 from mog_commons.string import *
 from mog_commons.io import print_safe
 from mog_commons.types import *
-from easy_menu.entity import Menu, Command
-from easy_menu.exceptions import EncodingError, SettingError
+from easy_menu.entity import Menu, LazyMenu, Command
+from easy_menu.exceptions import EasyMenuError, EncodingError, SettingError, CommandError
+from easy_menu.controller.executor import Usage, END_TIMEOUT, END_INTERRUPTED, END_CPU_LIMIT, END_SIGNAL, format_bytes
 from easy_menu.view import i18n
+from easy_menu.view.search_index import SearchIndex
+
+try:
+    import termios
+    import tty
+except ImportError:
+    termios = tty = None  # Windows
 
 DEFAULT_WINDOW_WIDTH = 78
 DEFAULT_PAGE_SIZE = 9
+JOB_REFRESH_INTERVAL = 1  # in seconds
+JOB_LOG_LINES = 20
+SLOT_POLL_INTERVAL = 1  # in seconds
 
 
 class Terminal(object):
     def __init__(self, root_menu, host, user, executor, handler, width=None, page_size=None, _input=sys.stdin,
-                 _output=sys.stdout, encoding=None, lang=None, timing=True, source_enabled=True):
+                 _output=sys.stdout, encoding=None, lang=None, timing=True, source_enabled=True, watcher=None,
+                 search_index=None, job_table=None):
         """
         :param root_menu: dict of root menu
         :param host: host name string
@@ -29,8 +42,11 @@ class Terminal(object):
         :param _output:
         :param encoding:
         :param lang: language setting
-        :param timing: bool: print running time after executing command if true
+        :param timing: bool: print running time and resource usage after executing command if true
         :param source_enabled: bool: allow source printing if true
+        :param watcher: Watcher instance which provides the reloaded menu
+        :param search_index: SearchIndex instance built for root_menu (built on the first search if None)
+        :param job_table: JobTable instance to run commands in background (disabled if None)
         :return:
         """
         # fields
@@ -48,6 +64,9 @@ class Terminal(object):
         self.i18n = self._find_i18n(lang)
         self.timing = timing
         self.source_enabled = source_enabled
+        self.watcher = watcher
+        self.search_index = search_index
+        self.job_table = job_table
 
         if self.width < 40:
             raise SettingError('width must be equal or greater than 40: width=%s' % self.width)
@@ -108,28 +127,47 @@ class Terminal(object):
             message,
         ]
 
-    def _get_description(self, item):
-        return (self.i18n.MSG_SUB_MENU if isinstance(item, Menu) else '%s') % item.title
+    def _get_description(self, item, running=False):
+        if isinstance(item, Menu):
+            return self._with_stale_since(self.i18n.MSG_SUB_MENU % item.title, item.stale_since)
+        if running:
+            return self.i18n.MSG_RUNNING % item.title
+        return item.title
+
+    def _with_stale_since(self, s, stale_since):
+        if stale_since is None:
+            return s
+        return self.i18n.MSG_STALE_SINCE % (s, self._format_datetime(datetime.fromtimestamp(stale_since)))
 
-    def _get_breadcrumb(self, titles):
+    def _get_breadcrumb(self, titles, stale_since=None):
         s = ' > '.join(titles)
         n = unicode_width(s)
-        limit = self.width - 5
-        return ('~' if limit < n else '') + unicode_right(s, limit)
+        limit = self.width - 5 - unicode_width(self._with_stale_since('', stale_since))
+        return self._with_stale_since(('~' if limit < n else '') + unicode_right(s, limit), stale_since)
 
-    def get_page(self, titles, page_items, offset, num_pages):
-        """Make menu page string."""
+    def get_page(self, titles, page_items, offset, num_pages, stale_since=None, jobs=None, running=None):
+        """
+        Make menu page string.
+
+        :param stale_since: time when the current menu was loaded if it is built from stale data
+        :param jobs: list of the background jobs
+        :param running: list of bool for each page item whether the command is running
+        """
 
         assert len(page_items) <= self.page_size, 'Number of page items must less or equal than page size.'
 
-        title = self._get_breadcrumb(titles)
+        title = self._get_breadcrumb(titles, stale_since)
 
         pager_lines = [] if num_pages <= 1 else [
             self.pager_line(offset, num_pages),
             self.thin_line(),
         ]
 
-        item_lines = [self.i18n.MSG_ITEM % (i + 1, self._get_description(item)) for i, item in enumerate(page_items)]
+        running = running or [False] * len(page_items)
+        item_lines = [self.i18n.MSG_ITEM % (i + 1, self._get_description(item, r))
+                      for i, (item, r) in enumerate(zip(page_items, running))]
+        if jobs:
+            item_lines.append(self.i18n.MSG_JOBS_ITEM % (len([j for j in jobs if j.running]), len(jobs)))
 
         quit_lines = [
             self.menu_line(),
@@ -140,20 +178,51 @@ class Terminal(object):
         message = self.i18n.MSG_INPUT_NUM % (0, len(page_items))
         return '\n'.join(self._get_header(title) + pager_lines + item_lines + quit_lines + self._get_footer(message))
 
-    def get_confirm(self, description):
+    def get_search(self, query, titles_list, has_more, selecting):
+        """
+        Make search page string.
+
+        :param query: current query string
+        :param titles_list: list of the titles of the matched entries
+        :param has_more: True if there are more matched entries than displayed
+        :param selecting: True if waiting for a result number, otherwise waiting for the query
+        """
+        limit = self.width - unicode_width(self.i18n.MSG_ITEM % (0, ''))
+        item_lines = []
+        for i, titles in enumerate(titles_list):
+            s = ' > '.join(titles)
+            item_lines.append(self.i18n.MSG_ITEM % (i + 1, ('~' if limit < unicode_width(s) else '') +
+                                                    unicode_right(s, limit - 1)))
+        if query and not titles_list:
+            item_lines.append(self.i18n.MSG_SEARCH_NO_MATCH)
+        if has_more:
+            item_lines.append(self.i18n.MSG_SEARCH_MORE)
+
+        if selecting:
+            quit_lines = [self.menu_line(), self.i18n.MSG_ITEM % (0, self.i18n.MSG_SEARCH_EDIT)]
+            message = self.i18n.MSG_INPUT_NUM % (0, len(titles_list))
+        else:
+            quit_lines = []
+            message = self.i18n.MSG_SEARCH_INPUT
+
+        return '\n'.join(
+            self._get_header(self.i18n.MSG_SEARCH_TITLE % query) + item_lines + quit_lines + self._get_footer(message))
+
+    def get_confirm(self, description, background=False, background_enabled=False):
         """
         Make confirmation page string
 
         :param description: description for the command to execute
+        :param background: True if the command runs in background
+        :param background_enabled: True if the user can choose to run the command in background
         :return: string
         """
 
         item_lines = [
-            self.i18n.MSG_CONFIRM % description
+            (self.i18n.MSG_CONFIRM_BACKGROUND if background else self.i18n.MSG_CONFIRM) % description
         ]
-        return '\n'.join(
-            self._get_header(self.i18n.MSG_CONFIRM_TITLE) + item_lines +
-            self._get_footer(self.i18n.MSG_CONFIRM_QUESTION))
+        question = self.i18n.MSG_CONFIRM_QUESTION_BACKGROUND if background_enabled else self.i18n.MSG_CONFIRM_QUESTION
+        return '\n'.join(self._get_header(self.i18n.MSG_CONFIRM_TITLE) + item_lines + self._get_footer(question))
 
     def get_duplicate(self, description):
         """
@@ -168,11 +237,106 @@ class Terminal(object):
             self._get_footer(self.i18n.MSG_DUPLICATE_QUESTION)
         )
 
+    def get_slot_full(self, description, limit):
+        """
+        Make the page string to ask whether to wait for a free slot.
+        """
+        return '\n'.join(
+            self._get_header(self.i18n.MSG_SLOT_TITLE) + [self.i18n.MSG_SLOT_FULL % (description, limit)] +
+            self._get_footer(self.i18n.MSG_SLOT_QUESTION))
+
+    def get_slot_wait(self, description, limit, position):
+        """
+        Make the page string while waiting for a free slot.
+
+        :param position: position in the queue starting from 1
+        """
+        item_lines = [
+            self.i18n.MSG_SLOT_FULL % (description, limit),
+            self.i18n.MSG_SLOT_POSITION % position,
+        ]
+        return '\n'.join(
+            self._get_header(self.i18n.MSG_SLOT_TITLE) + item_lines + self._get_footer(self.i18n.MSG_SLOT_CANCEL))
+
+    def get_job_started(self, job):
+        item_lines = [
+            self.i18n.MSG_JOB_STARTED % job.job_id,
+            self.i18n.MSG_JOB_LOG % job.log_path,
+        ]
+        return '\n'.join(
+            self._get_header(self.i18n.MSG_JOB_STARTED_TITLE % job.title) + item_lines +
+            self._get_footer(self.i18n.MSG_INPUT_ANY))
+
+    def _get_job_description(self, job, now):
+        elapsed = self._format_timedelta(job.elapsed(now))
+        if job.running:
+            status = self.i18n.MSG_JOB_RUNNING % elapsed
+        else:
+            status = self.i18n.MSG_JOB_FINISHED % (job.return_code, elapsed)
+        return '#%d %s - %s' % (job.job_id, job.title, status)
+
+    def get_jobs(self, jobs, now, return_title):
+        """
+        Make job table page string.
+
+        :param jobs: list of Job to show
+        :param now: current datetime
+        :param return_title: title of the menu to return
+        """
+        assert len(jobs) <= self.page_size, 'Number of jobs must less or equal than page size.'
+
+        item_lines = [self.i18n.MSG_ITEM % (i + 1, self._get_job_description(job, now)) for i, job in enumerate(jobs)]
+        quit_lines = [
+            self.menu_line(),
+            self.i18n.MSG_ITEM % (0, self.i18n.MSG_RETURN % return_title),
+        ]
+        message = self.i18n.MSG_INPUT_NUM % (0, len(jobs))
+        return '\n'.join(self._get_header(self.i18n.MSG_JOBS_TITLE) + item_lines + quit_lines +
+                         self._get_footer(message))
+
+    def get_job_log(self, job, lines, now):
+        """
+        Make log page string of the job.
+
+        :param lines: last lines of the log file
+        """
+        item_lines = [
+            self.i18n.MSG_JOB_LOG % job.log_path,
+            self.thin_line(),
+        ] + lines
+        return '\n'.join(
+            self._get_header(self._get_job_description(job, now)) + item_lines +
+            self._get_footer(self.i18n.MSG_INPUT_ANY))
+
+    def get_loading(self, title):
+        return '\n'.join(self._get_header(self.i18n.MSG_LOADING_TITLE % title) + [''])
+
+    def get_load_error(self, title, error):
+        return '\n'.join(
+            self._get_header(self.i18n.MSG_LOAD_ERROR_TITLE % title) +
+            ['%s: %s' % (error.__class__.__name__, error)] +
+            self._get_footer(self.i18n.MSG_INPUT_ANY))
+
     def get_before_execute(self, description):
         return '\n'.join(self._get_header(self.i18n.MSG_RUN_TITLE % description) + [''])
 
-    def get_after_execute(self, title, return_code, start_time, end_time):
+    def get_after_execute(self, title, return_code, start_time, end_time, results=None, reason=None, usage=None):
+        """
+        :param results: list of LineResult to show the summary of each command line
+        :param reason: description why the command ended if it did not exit by itself
+        :param usage: Usage of all the command lines
+        """
         items = [('Return code', '%d' % return_code)]
+        if reason is not None:
+            items.append(('Reason', reason))
+        if usage is not None and self.timing:
+            items += [
+                ('CPU time', 'user %.2fs, sys %.2fs' % (usage.user_time, usage.system_time)),
+                ('Max RSS', format_bytes(usage.max_rss)),
+                ('Block I/O', '%d in, %d out' % (usage.block_in, usage.block_out)),
+                ('Context switches', '%d voluntary, %d involuntary' % (usage.voluntary_switches,
+                                                                       usage.involuntary_switches)),
+            ]
         if self.timing:
             items = [
                 (self.i18n.MSG_FINISH, title),
@@ -182,8 +346,50 @@ class Terminal(object):
             ] + items
         key_width = max(unicode_width(x[0]) for x in items)
         result_lines = [self.thin_line()] + ['%s: %s' % (unicode_ljust(k, key_width), v) for k, v in items]
+        if results:
+            result_lines += [self.thin_line()] + self._get_line_results(results)
         return '\n'.join(result_lines + self._get_footer(self.i18n.MSG_INPUT_ANY))
 
+    def _get_end_reason(self, result):
+        """
+        :param result: LineResult, or None
+        :return: description why the command line ended, or None if it exited by itself
+        """
+        if result is None or result.reason is None:
+            return None
+        meta = result.command_line.meta
+        return {
+            END_TIMEOUT: lambda: self.i18n.MSG_END_TIMEOUT % ('%g' % meta.timeout),
+            END_INTERRUPTED: lambda: self.i18n.MSG_END_INTERRUPTED,
+            END_CPU_LIMIT: lambda: self.i18n.MSG_END_CPU_LIMIT % meta.cpu_limit,
+            END_SIGNAL: lambda: self.i18n.MSG_END_SIGNAL % (result.return_code - 128),
+        }[result.reason]()
+
+    def _get_line_results(self, results):
+        width = len(str(len(results)))
+        headers = ['Return code']
+        if self.timing:
+            headers.append('Running time')
+            if any(r.usage is not None for r in results):
+                headers += ['CPU time', 'Max RSS']
+
+        rows = []
+        for i, r in enumerate(results):
+            values = ['-' if r.return_code is None else '%d' % r.return_code]
+            if r.return_code is not None and self.timing:
+                values.append(self._format_timedelta(r.end_time - r.start_time))
+                if r.usage is not None and len(headers) > 2:
+                    values += ['%.2fs' % (r.usage.user_time + r.usage.system_time), format_bytes(r.usage.max_rss)]
+            values += [''] * (len(headers) - len(values))
+            rows.append(['[%*d]' % (width, i + 1)] + values + [r.command_line.cmd])
+        widths = [max(len(h), max(len(x[j + 1]) for x in rows)) for j, h in enumerate(headers)]
+
+        lines = ['  '.join([' ' * (width + 2)] + [h.rjust(w) for h, w in zip(headers, widths)] + ['Command'])]
+        for row in rows:
+            s = '  '.join([row[0]] + [v.rjust(w) for v, w in zip(row[1:-1], widths)]) + '  '
+            lines.append(s + unicode_left(row[-1].replace('\n', ' '), max(0, self.width - len(s))))
+        return lines
+
     @staticmethod
     def _format_timedelta(tm):
         hour, second = divmod(tm.seconds, 60 * 60)
@@ -215,6 +421,46 @@ class Terminal(object):
             raise KeyboardInterrupt
         return ch
 
+    def wait_input_char_timeout(self, timeout):
+        """
+        Wait for a key input at most the timeout seconds.
+
+        If getch is disabled, wait until a line is entered.
+        :return: input character, or None if timed out
+        """
+        if not self.handler.getch_enabled or tty is None:
+            return self.wait_input_char()
+
+        fd = self.handler.stdin.fileno()
+        try:
+            # keep the input typed ahead
+            tty.setcbreak(fd, termios.TCSANOW)
+            if not select.select([fd], [], [], timeout)[0]:
+                return None
+            ch = self.handler.stdin.read(1)
+        finally:
+            self.handler.restore_terminal(None, None)
+
+        if isinstance(ch, bytes):
+            ch = ch.decode('ascii', 'ignore')
+        if ch in ['\x03', '\x04', '']:
+            # pressed C-c or C-d
+            raise KeyboardInterrupt
+        return ch
+
+    def wait_input_confirm(self, background_enabled=False):
+        """
+        :param background_enabled: accept 'b' to run the command in background
+        :return: 'y', 'n' or 'b'
+        """
+        while True:
+            ch = self.wait_input_char().lower()
+            if ch in ['y', 'n'] or (ch == 'b' and background_enabled):
+                return ch
+            elif ch == '\r' or not self.handler.getch_enabled:
+                # default
+                return 'n'
+
     def wait_input_yes_no(self, default=False):
         while True:
             ch = self.wait_input_char().lower()
@@ -262,6 +508,8 @@ class Terminal(object):
                     item = menu_items[index]
 
                     # check if it is a sub menu
+                    if isinstance(item, LazyMenu):
+                        return lambda s, o: (s + [item], 0) if self.load_menu(item) else (s, o)
                     if isinstance(item, Menu):
                         return lambda s, o: (s + [item], 0)
 
@@ -274,6 +522,13 @@ class Terminal(object):
                 return lambda s, o: (s, o + 1)
             elif ch == 'p' and 0 < offset:
                 return lambda s, o: (s, o - 1)
+            elif ch == '/':
+                return self.search
+            elif ch == 'j' and self.job_table is not None and self.job_table.jobs:
+                def f(s, o):  # side effect only
+                    self.show_jobs(s[-1].title)
+                    return s, o
+                return f
             elif ch == 's' and self.source_enabled:
                 def f(s, o):  # side effect only
                     self.print_source()
@@ -284,6 +539,27 @@ class Terminal(object):
             if not self.handler.getch_enabled:
                 return lambda s, o: (s, o)
 
+    @types(bool, menu=LazyMenu)
+    def load_menu(self, menu):
+        """
+        Load the sub menu on the first access showing the loading frame.
+
+        :param menu: LazyMenu:
+        :return: True if the sub menu is available
+        """
+        if menu.loaded:
+            return True
+
+        title = menu.title
+        self._draw(self.get_loading(title))
+        try:
+            menu.load()
+        except EasyMenuError as e:
+            self._draw(self.get_load_error(title, e))
+            self.wait_input_char()  # wait for any input
+            return False
+        return True
+
     @types(command=Command)
     def execute_command(self, command):
         """
@@ -293,28 +569,221 @@ class Terminal(object):
         :return: None
         """
         # confirmation
-        self._draw(self.get_confirm(command.title))
-        if not self.wait_input_yes_no():
+        background = self.job_table is not None and command.background
+        background_enabled = self.job_table is not None and not background
+        self._draw(self.get_confirm(command.title, background, background_enabled))
+        answer = self.wait_input_confirm(background_enabled)
+        if answer == 'n':
             return
 
         # duplicate check
-        if self.executor.is_running(command):
+        force = self.executor.is_running(command)
+        if force:
             self._draw(self.get_duplicate(command.title))
             if not self.wait_input_yes_no():
                 return
 
+        if background or answer == 'b':
+            job = self.job_table.start(command, force)
+            self._draw(self.get_job_started(job))
+            self.wait_input_char()  # wait for any input
+            return
+
         # run command
-        start_time = datetime.now()
         self._draw(self.get_before_execute(command.title))
-        return_code = self.executor.execute(command)
+        ret = self._execute(command, force)
+        if ret is None:
+            return
+        start_time, return_code, results = ret
         end_time = datetime.now()
         if return_code == 130:
             # maybe interrupted
             self._print('\n')
 
-        self._print(self.get_after_execute(command.title, return_code, start_time, end_time))
+        ended = next((r for r in results if r.reason is not None), None)
+        self._print(self.get_after_execute(command.title, return_code, start_time, end_time,
+                                           results if len(command.command_lines) > 1 else None,
+                                           self._get_end_reason(ended), Usage.total(r.usage for r in results)))
         self.wait_input_char()  # wait for any input
 
+    def _execute(self, command, force):
+        """
+        Execute the command, waiting for a free slot if the user wants.
+
+        :return: tuple of the start time, the return code and list of LineResult, or None if cancelled
+        """
+        state = {'start_time': datetime.now(), 'asked': False, 'cancelled': False}
+
+        def wait(position, command_line, limit):
+            if position == 0:
+                # the slot is taken
+                self._draw(self.get_before_execute(command.title))
+                state['start_time'] = datetime.now()
+                return True
+
+            # the command line waiting for the slot
+            description = command.title
+            if len(command.command_lines) > 1:
+                description = '%s: %s' % (command.title, command_line.cmd)
+            if not state['asked']:
+                state['asked'] = True
+                self._draw(self.get_slot_full(description, limit))
+                if not self.wait_input_yes_no():
+                    state['cancelled'] = True
+                    return False
+            self._draw(self.get_slot_wait(description, limit, position))
+            if self.wait_input_char_timeout(SLOT_POLL_INTERVAL) is not None:
+                state['cancelled'] = True
+                return False
+            return True
+
+        try:
+            return_code, results = self.executor.execute_detail(command, force, wait)
+        except CommandError:
+            if state['cancelled'] or force:
+                return None
+
+            # started by someone else after the duplicate check
+            self._draw(self.get_duplicate(command.title))
+            if not self.wait_input_yes_no():
+                return None
+            self._draw(self.get_before_execute(command.title))
+            return self._execute(command, True)
+        return state['start_time'], return_code, results
+
+    def get_search_index(self):
+        """
+        :return: SearchIndex for the current root menu (rebuilt after reloading the menu or loading lazy menus)
+        """
+        index = self.search_index
+        if index is None or index.root_menu is not self.root_menu or index.outdated():
+            self.search_index = index = SearchIndex(self.root_menu)
+        return index
+
+    def search(self, stack, offset):
+        """
+        Search all the commands and sub menus incrementally, and go to the chosen one.
+
+        :param stack: current stack
+        :param offset: current offset
+        :return: new stack and offset
+        """
+        index = self.get_search_index()
+
+        # repeated keys are usual in the query
+        threshold, self.handler.getch_repeat_threshold = self.handler.getch_repeat_threshold, 0.0
+        try:
+            query = ''
+            while True:
+                query = self.wait_input_query(index, query)
+                if query is None:
+                    return stack, offset
+
+                results = index.search(query, self.page_size + 1)
+                if len(results) == 1:
+                    return self.jump(index, results[0], stack, offset)
+                if results:
+                    n = self.wait_input_search_result(index, query, results)
+                    if n is not None:
+                        return self.jump(index, n, stack, offset)
+        finally:
+            self.handler.getch_repeat_threshold = threshold
+            self.handler.last_getch_char = ''  # the keys in the query are not checked
+
+    def _draw_search(self, index, query, results, selecting):
+        titles_list = [index.titles(n) for n in results[:self.page_size]]
+        self._draw(self.get_search(query, titles_list, self.page_size < len(results), selecting))
+
+    def wait_input_query(self, index, query):
+        """
+        Update the search results on every key input.
+
+        :return: query string, or None if canceled
+        """
+        while True:
+            results = index.search(query, self.page_size + 1) if query.strip() else []
+            self._draw_search(index, query, results, False)
+
+            if not self.handler.getch_enabled:
+                query = self.handler.gets()
+                return query if query.strip() else None
+
+            ch = self.wait_input_char()
+            if ch == '\x1b':
+                return None
+            elif ch in ['\r', '\n']:
+                if query.strip():
+                    return query
+            elif ch in ['\x7f', '\x08']:
+                query = query[:-1]
+            elif ch and ' ' <= ch:
+                query += ch
+
+    def wait_input_search_result(self, index, query, results):
+        """
+        :return: entry number chosen, or None to edit the query
+        """
+        num_results = min(len(results), self.page_size)
+        while True:
+            self._draw_search(index, query, results, True)
+            ch = self.wait_input_char()
+            if ch == '0':
+                return None
+            elif ch.isdigit() and int(ch) <= num_results:
+                return results[int(ch) - 1]
+
+    def jump(self, index, n, stack, offset):
+        """
+        Go to the searched entry; show the sub menu or execute the command.
+
+        :return: new stack and offset
+        """
+        item = index.items[n]
+        parents = index.stack(n)
+        if isinstance(item, Menu):
+            if isinstance(item, LazyMenu) and not self.load_menu(item):
+                return stack, offset
+            return parents + [item], 0
+
+        position = next(i for i, x in enumerate(parents[-1].items) if x is item)
+        self.execute_command(item)
+        return parents, position // self.page_size
+
+    def show_jobs(self, return_title):
+        """
+        Show the background jobs updating the elapsed time until any key is pressed.
+
+        :param return_title: title of the current menu
+        """
+        while True:
+            jobs = self.job_table.jobs[-self.page_size:]
+            self._draw(self.get_jobs(jobs, datetime.now(), return_title))
+
+            ch = self.wait_input_char_timeout(JOB_REFRESH_INTERVAL)
+            if ch == '0':
+                return
+            elif ch and ch.isdigit() and int(ch) <= len(jobs):
+                self.show_job_log(jobs[int(ch) - 1])
+
+    def show_job_log(self, job):
+        """
+        Show the last lines of the job output, following the log file until any key is pressed.
+        """
+        while True:
+            self._draw(self.get_job_log(job, self._read_log_tail(job.log_path, JOB_LOG_LINES), datetime.now()))
+            if self.wait_input_char_timeout(JOB_REFRESH_INTERVAL) is not None:
+                return
+
+    def _read_log_tail(self, path, num_lines):
+        try:
+            with open(path, 'rb') as f:
+                f.seek(0, 2)
+                f.seek(max(0, f.tell() - 256 * num_lines))
+                data = f.read()
+        except (IOError, OSError):
+            return []
+        return data.decode(self.encoding or 'utf-8', 'replace').splitlines()[-num_lines:]
+
     def print_source(self):
         """Print source of the root menu."""
         self._draw('\n'.join(self._get_header(self.i18n.MSG_SOURCE_TITLE)))
@@ -322,11 +791,47 @@ class Terminal(object):
         self._print('\n'.join(self._get_footer(self.i18n.MSG_INPUT_ANY)))
         self.wait_input_char()
 
+    @staticmethod
+    def restore_stack(stack, root_menu):
+        """
+        Find the same position in the new menu tree.
+
+        :param stack: list of Menu from the root to the current menu
+        :param root_menu: new root menu
+        :return: new stack as deep as possible
+        """
+        ret = [root_menu]
+        for menu in stack[1:]:
+            candidates = [x for x in ret[-1].items if isinstance(x, Menu) and x.title == menu.title]
+            if not candidates:
+                break
+            ret.append(candidates[0])
+        return ret
+
+    def _get_running(self, page_items):
+        """
+        :return: list of bool for each page item whether the command is running
+        """
+        commands = [x for x in page_items if isinstance(x, Command)]
+        flags = iter(self.executor.running_commands(commands) if commands else [])
+        return [isinstance(x, Command) and next(flags) for x in page_items]
+
     def loop(self):
         stack = [self.root_menu]
         offset = 0  # current page index
 
         while stack:
+            # apply the reloaded menu
+            root_menu = None if self.watcher is None else self.watcher.poll()
+            if root_menu is not None:
+                self.root_menu = root_menu
+                new_stack = self.restore_stack(stack, root_menu)
+                if len(new_stack) == len(stack):
+                    offset = min(offset, self._num_pages(len(new_stack[-1].items)) - 1)
+                else:
+                    offset = 0
+                stack = new_stack
+
             titles = [menu.title for menu in stack]
             items = stack[-1].items
             num_pages = self._num_pages(len(items))
@@ -334,7 +839,9 @@ class Terminal(object):
             # apply offset
             page_items = items[self.page_size * offset:self.page_size * (offset + 1)]
 
-            self._draw(self.get_page(titles, page_items, offset, num_pages))
+            jobs = None if self.job_table is None else self.job_table.jobs
+            running = self._get_running(page_items)
+            self._draw(self.get_page(titles, page_items, offset, num_pages, stack[-1].stale_since, jobs, running))
 
             f = self.wait_input_menu(items, offset, num_pages)
             stack, offset = f(stack, offset)
@@ -5,9 +5,15 @@ import tempfile
 import threading
 import sys
 import os
-from mog_commons.unittest import TestCase
+import shutil
+import signal
+import subprocess
+import six
+from mog_commons.command import pid_exists
+from mog_commons.unittest import TestCase, base_unittest
 from easy_menu.controller import CommandExecutor
 from easy_menu.entity import Command, CommandLine, Meta
+from easy_menu.exceptions import CommandError
 from tests.easy_menu.logger.mock_logger import MockLogger
 
 
@@ -41,3 +47,399 @@ class TestCommandExecutor(TestCase):
                 os.removedirs(os.path.join(tempdir, child))
             if os.path.exists(tempdir):
                 os.removedirs(tempdir)
+
+    @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
+    def test_running_commands(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            cmd_a = Command('cmd a', [CommandLine('echo a', Meta(lock=True))])
+            cmd_b = Command('cmd b', [CommandLine('echo b', Meta(lock=True)), CommandLine('echo c', Meta())])
+            cmd_c = Command('cmd c', [CommandLine('echo a', Meta())])
+
+            exe = CommandExecutor(MockLogger(), 'utf-8', sys.stdin, sys.stdout, sys.stderr, tempdir)
+            self.assertEqual(exe.running_commands([cmd_a, cmd_b, cmd_c]), [False, False, False])
+
+            handle = exe.locks.acquire(cmd_a.command_lines[0].to_hash_string())
+
+            # cached result
+            self.assertEqual(exe.running_commands([cmd_a, cmd_b, cmd_c]), [False, False, False])
+            self.assertEqual(exe.running_commands([cmd_a, cmd_b, cmd_c], 0), [True, False, False])
+            self.assertEqual(exe.running_commands([cmd_a]), [True])
+
+            exe.locks.release(handle)
+            self.assertTrue(exe.running_commands([cmd_a])[0])
+            self.assertFalse(exe.is_running(cmd_a))
+            self.assertFalse(exe.running_commands([cmd_a])[0])
+        finally:
+            for child in os.listdir(tempdir):
+                os.removedirs(os.path.join(tempdir, child))
+            if os.path.exists(tempdir):
+                os.removedirs(tempdir)
+
+    def test_execute_locked(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            cmd = Command('cmd 1', [CommandLine('echo a', Meta(lock=True)), CommandLine('echo b', Meta(lock=True))])
+            with tempfile.TemporaryFile() as out:
+                exe = CommandExecutor(MockLogger(), 'utf-8', sys.stdin, out, out, tempdir)
+                other = CommandExecutor(MockLogger(), 'utf-8', sys.stdin, out, out, tempdir)
+                handle = other.locks.acquire(cmd.command_lines[1].to_hash_string())
+
+                self.assertRaisesMessage(CommandError, 'Already running: cmd 1', exe.execute, cmd)
+                self.assertEqual(exe.locks.held(), set([handle.key]))
+
+                self.assertEqual(exe.execute(cmd, force=True), 0)
+                other.locks.release(handle)
+                self.assertEqual(exe.execute(cmd), 0)
+                self.assertEqual(exe.locks.held(), set())
+
+                out.seek(0)
+                self.assertEqual(out.read(), b'a\nb\na\nb\n')
+        finally:
+            shutil.rmtree(tempdir)
+
+    @base_unittest.skipUnless(os.name != 'nt' and six.PY3, 'requires POSIX compatible')
+    def test_execute_locked_after_exit(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            pid_paths = [os.path.join(tempdir, 'pid%d' % i) for i in range(2)]
+            cmd = Command('cmd 1', [
+                CommandLine('echo $$ > %s; sleep 30' % pid_paths[0], Meta(lock=True, parallel=True)),
+                CommandLine('echo $$ > %s; sleep 30' % pid_paths[1], Meta(max_concurrent=1, parallel=True)),
+            ])
+            script = '; '.join([
+                'import sys',
+                'from easy_menu.controller import CommandExecutor',
+                'from easy_menu.entity import Command, CommandLine, Meta',
+                'from tests.easy_menu.logger.mock_logger import MockLogger',
+                'exe = CommandExecutor(MockLogger(), "utf-8", sys.stdin, sys.stdout, sys.stderr, %r)' % tempdir,
+                'exe.execute(Command("cmd 1", [CommandLine(%r, Meta(lock=True, parallel=True)), '
+                'CommandLine(%r, Meta(max_concurrent=1, parallel=True))]))' % tuple(x.cmd for x in cmd.command_lines),
+            ])
+            env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+            menu = subprocess.Popen([sys.executable, '-c', script], env=env)
+            pids = []
+            for path in pid_paths:
+                for _ in range(100):
+                    if os.path.exists(path) and os.path.getsize(path):
+                        break
+                    time.sleep(0.05)
+                with open(path) as f:
+                    pids.append(int(f.read()))
+
+            # the commands keep the lock and the slot after the menu is killed
+            menu.kill()
+            menu.wait()
+            exe = CommandExecutor(MockLogger(), 'utf-8', sys.stdin, sys.stdout, sys.stderr, tempdir)
+            keys = [x.to_hash_string() for x in cmd.command_lines]
+            self.assertEqual(exe.locks.held(), set([keys[0], keys[1] + '.0']))
+            self.assertTrue(exe.is_running(cmd))
+
+            for pid in pids:
+                os.killpg(pid, signal.SIGKILL)
+            for _ in range(100):
+                if not any(pid_exists(pid) for pid in pids):
+                    break
+                time.sleep(0.05)
+            self.assertEqual(exe.locks.held(), set())
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_execute_max_concurrent(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            cmd = Command('cmd 1', [CommandLine('echo a', Meta(max_concurrent=2))])
+            key = cmd.command_lines[0].to_hash_string()
+            with tempfile.TemporaryFile() as out:
+                exe = CommandExecutor(MockLogger(), 'utf-8', sys.stdin, out, out, tempdir)
+                slots = [exe.locks.acquire_slot(key, 2), exe.locks.acquire_slot(key, 2)]
+
+                self.assertRaisesMessage(CommandError, 'Too many running (max 2): cmd 1', exe.execute, cmd)
+                self.assertRaisesMessage(CommandError, 'Cancelled: cmd 1', exe.execute, cmd,
+                                         wait=lambda *args: False)
+
+                # the first waiter is served first
+                other = exe.locks.enqueue(key)
+                positions = []
+
+                def wait(position, command_line, limit):
+                    positions.append((position, command_line.cmd, limit))
+                    if len(positions) == 2:
+                        exe.locks.release(other)
+                        exe.locks.release(slots.pop())
+                    return True
+
+                self.assertEqual(exe.execute(cmd, wait=wait), 0)
+                self.assertEqual(positions, [(2, 'echo a', 2), (2, 'echo a', 2), (0, 'echo a', 2)])
+                self.assertEqual(exe.locks.held(), set([slots[0].key]))
+                exe.locks.release(slots[0])
+
+                out.seek(0)
+                self.assertEqual(out.read(), b'a\n')
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_execute_detail(self):
+        cmd = Command('cmd 1', [
+            CommandLine('echo a', Meta()),
+            CommandLine('exit 3', Meta()),
+            CommandLine('echo never', Meta()),
+        ])
+        with tempfile.TemporaryFile() as out:
+            exe = CommandExecutor(MockLogger(), 'utf-8', sys.stdin, out, out, '/tmp')
+            ret, results = exe.execute_detail(cmd)
+            out.seek(0)
+            self.assertEqual(out.read(), b'a\n')
+
+        self.assertEqual(ret, 3)
+        self.assertEqual([(r.command_line.cmd, r.return_code) for r in results], [('echo a', 0), ('exit 3', 3)])
+        self.assertTrue(all(r.start_time <= r.end_time for r in results))
+
+    @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
+    def test_execute_usage(self):
+        cmd = Command('cmd 1', [
+            CommandLine('%s -c "x = bytearray(256 * 1024 * 1024)"' % sys.executable, Meta()),
+            CommandLine('true', Meta()),
+        ])
+        with tempfile.TemporaryFile() as out:
+            exe = CommandExecutor(MockLogger(), 'utf-8', sys.stdin, out, out, '/tmp')
+            ret, results = exe.execute_detail(cmd)
+
+        self.assertEqual(ret, 0)
+        usage = results[0].usage
+        self.assertTrue(usage.user_time + usage.system_time > 0)
+        self.assertTrue(usage.max_rss >= 256 * 1024 * 1024)
+        self.assertTrue(results[1].usage.max_rss < usage.max_rss)
+
+    @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
+    def test_execute_parallel(self):
+        def command(meta):
+            return Command('cmd 1', [
+                CommandLine('sleep 0.5; echo a', meta),
+                CommandLine('printf "b\\nbb"; sleep 0.5; exit 2', meta),
+                CommandLine('sleep 0.5; echo c >&2; exit 3', meta),
+                CommandLine('sleep 0.5; echo d', meta),
+            ])
+
+        with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+            logger = MockLogger()
+            exe = CommandExecutor(logger, 'utf-8', sys.stdin, out, err, '/tmp')
+
+            t = time.time()
+            ret, results = exe.execute_detail(command(Meta(parallel=True)))
+            elapsed = time.time() - t
+
+            out.seek(0)
+            err.seek(0)
+            self.assertEqual(sorted(out.read().splitlines()), [b'[1] a', b'[2] b', b'[2] bb', b'[4] d'])
+            self.assertEqual(err.read(), b'[3] c\n')
+
+        # all the command lines run at the same time; the first failure is the return code
+        self.assertTrue(elapsed < 1.5)
+        self.assertEqual(ret, 2)
+        self.assertEqual([r.return_code for r in results], [0, 2, 3, 0])
+        self.assertEqual(len(logger.buffer), 12)
+
+        with tempfile.TemporaryFile() as out:
+            exe = CommandExecutor(MockLogger(), 'utf-8', sys.stdin, out, out, '/tmp')
+
+            t = time.time()
+            ret, results = exe.execute_detail(command(Meta(parallel=True, max_parallel=2)))
+            elapsed = time.time() - t
+            self.assertTrue(1.0 <= elapsed)
+            self.assertEqual([r.return_code for r in results], [0, 2, 3, 0])
+
+            # sequential
+            self.assertEqual(exe.execute(command(Meta(max_parallel=2))), 2)
+
+    @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
+    def test_execute_timeout(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            pid_path = os.path.join(tempdir, 'pid')
+            cmd = Command('cmd 1', [
+                CommandLine('sleep 30 & echo $! > %s; wait' % pid_path, Meta(timeout=0.5)),
+                CommandLine('echo never', Meta()),
+            ])
+            with tempfile.TemporaryFile() as out:
+                exe = CommandExecutor(MockLogger(), 'utf-8', sys.stdin, out, out, tempdir)
+
+                t = time.time()
+                ret, results = exe.execute_detail(cmd)
+                self.assertTrue(time.time() - t < 5)
+                self.assertEqual(ret, 124)
+                self.assertEqual([(r.return_code, r.reason) for r in results], [(124, 'timeout')])
+
+                # the whole process group is killed
+                with open(pid_path) as f:
+                    self.assertTrue(self._wait_exit(int(f.read())))
+                out.seek(0)
+                self.assertEqual(out.read(), b'')
+        finally:
+            shutil.rmtree(tempdir)
+
+    @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
+    def test_execute_timeout_kill(self):
+        from easy_menu.controller import command_executor
+
+        grace = command_executor.TERMINATE_GRACE
+        command_executor.TERMINATE_GRACE = 0.2
+        try:
+            with tempfile.TemporaryFile() as out:
+                exe = CommandExecutor(MockLogger(), 'utf-8', sys.stdin, out, out, '/tmp')
+                cmd = Command('cmd 1', [CommandLine('trap "" TERM; sleep 10; sleep 10', Meta(timeout=0.2))])
+
+                t = time.time()
+                ret, results = exe.execute_detail(cmd)
+                self.assertTrue(time.time() - t < 5)
+                self.assertEqual((ret, results[0].reason), (124, 'timeout'))
+        finally:
+            command_executor.TERMINATE_GRACE = grace
+
+    @base_unittest.skipUnless(os.name != 'nt' and six.PY3, 'requires POSIX compatible')
+    def test_terminate_unreaped(self):
+        from easy_menu.controller import command_executor
+
+        grace = command_executor.TERMINATE_GRACE
+        command_executor.TERMINATE_GRACE = 0.3
+        tempdir = tempfile.mkdtemp()
+        try:
+            # the leader ends at once, leaving a process ignoring SIGTERM
+            pid_path = os.path.join(tempdir, 'pid')
+            p = subprocess.Popen('sh -c \'trap "" TERM; echo $$ > %s; sleep 30\' & wait_pid=$!; '
+                                 'while [ ! -s %s ]; do sleep 0.01; done' % (pid_path, pid_path),
+                                 shell=True, start_new_session=True)
+            exe = CommandExecutor(MockLogger(), 'utf-8', sys.stdin, sys.stdout, sys.stderr, tempdir)
+            self.assertEqual(exe._wait(p, 5, False), 0)
+            with open(pid_path) as f:
+                pid = int(f.read())
+
+            t = time.time()
+            exe._terminate([p], 'timeout')
+            self.assertTrue(time.time() - t >= 0.3)
+            self.assertEqual(exe.logger.buffer[-1][1], '[INFO] Command did not stop. Killing the process group.')
+            self.assertTrue(self._wait_exit(pid))
+
+            # never reaped while killing the group
+            self.assertEqual(p.returncode, None)
+            self.assertEqual(exe._poll(p, True), 0)
+            self.assertNotEqual(exe._usages.get(p.pid), None)
+
+            # already reaped
+            exe._terminate([p], 'timeout')
+            self.assertEqual(exe._killed, {p.pid: 'timeout'})
+        finally:
+            command_executor.TERMINATE_GRACE = grace
+            shutil.rmtree(tempdir)
+
+    @staticmethod
+    def _wait_exit(pid):
+        """Wait for the orphan process to be reaped by init."""
+        for _ in range(100):
+            if not pid_exists(pid):
+                return True
+            time.sleep(0.05)
+        return False
+
+    @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
+    def test_execute_limits(self):
+        with tempfile.TemporaryFile() as out:
+            exe = CommandExecutor(MockLogger(), 'utf-8', sys.stdin, out, out, '/tmp')
+
+            ret, results = exe.execute_detail(Command('cmd 1', [
+                CommandLine('exec %s -c "while True: pass"' % sys.executable, Meta(cpu_limit=1))]))
+            self.assertEqual((ret, results[0].reason), (152, 'cpu_limit'))
+
+            ret = exe.execute(Command('cmd 2', [
+                CommandLine('exec %s -c "x = bytearray(512 * 1024 * 1024)"' % sys.executable,
+                            Meta(memory_limit=256 * 1024 * 1024))]))
+            self.assertEqual(ret, 1)
+
+            out.seek(0)
+            out.truncate()
+            self.assertEqual(exe.execute(Command('cmd 3', [CommandLine('nice', Meta(nice=5))])), 0)
+            out.seek(0)
+            self.assertEqual(out.read().strip(), str(os.nice(0) + 5).encode('ascii'))
+
+    @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
+    def test_execute_process_group(self):
+        script = 'import os; print(os.getpgrp() == os.getpid(), os.getsid(0) == os.getpid())'
+        cmd = Command('cmd 1', [CommandLine('exec %s -c "%s"' % (sys.executable, script), Meta())])
+        with tempfile.TemporaryFile() as out:
+            exe = CommandExecutor(MockLogger(), 'utf-8', sys.stdin, out, out, '/tmp')
+            self.assertEqual(exe.execute(cmd), 0)
+            self.assertEqual(exe.detached(sys.stdin, out, out).execute(cmd), 0)
+            out.seek(0)
+            new_session = sys.version_info < (3, 11)
+            self.assertEqual(out.read().decode('ascii'), 'True %s\nTrue True\n' % new_session)
+
+        self.assertFalse('preexec_fn' in exe._group_options())
+
+    @base_unittest.skipUnless(os.name != 'nt' and sys.version_info >= (3, 11), 'requires process_group')
+    def test_execute_stopped(self):
+        import termios
+
+        tempdir = tempfile.mkdtemp()
+        master, slave = os.openpty()
+        try:
+            pid_path = os.path.join(tempdir, 'pid')
+            script = '; '.join([
+                'import sys, fcntl, termios',
+                'from easy_menu.controller import CommandExecutor',
+                'from easy_menu.entity import Command, CommandLine, Meta',
+                'from tests.easy_menu.logger.mock_logger import MockLogger',
+                'fcntl.ioctl(0, termios.TIOCSCTTY, 0)',
+                'exe = CommandExecutor(MockLogger(), "utf-8", sys.stdin, sys.stdout, sys.stderr, %r)' % tempdir,
+                'sys.exit(exe.execute(Command("cmd 1", [CommandLine("echo $$ > %s; sleep 1", Meta())])))' % pid_path,
+            ])
+            env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+            menu = subprocess.Popen([sys.executable, '-c', script], env=env, stdin=slave, stdout=slave, stderr=slave,
+                                    start_new_session=True)
+            for _ in range(200):
+                if os.path.exists(pid_path) and os.path.getsize(pid_path):
+                    break
+                time.sleep(0.05)
+
+            # Ctrl-Z stops the command owning the terminal, which is continued since the menu has no job control
+            os.write(master, termios.tcgetattr(master)[6][termios.VSUSP])
+            for _ in range(200):
+                if menu.poll() is not None:
+                    break
+                time.sleep(0.05)
+            else:
+                menu.kill()
+            self.assertEqual(menu.wait(), 0)
+        finally:
+            os.close(master)
+            os.close(slave)
+            shutil.rmtree(tempdir)
+
+    def test_is_main_thread(self):
+        result = []
+        th = threading.Thread(target=lambda: result.append(CommandExecutor._is_main_thread()))
+        th.start()
+        th.join()
+        self.assertEqual(result, [False])
+        self.assertTrue(CommandExecutor._is_main_thread())
+
+    @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
+    def test_limit_commands(self):
+        exe = CommandExecutor(MockLogger(), 'utf-8', sys.stdin, sys.stdout, sys.stderr, '/tmp')
+        self.assertEqual(exe._limit_commands(Meta()), [])
+        self.assertEqual(exe._limit_commands(Meta(nice=5)), ['exec nice -n 5 /bin/sh -c "$1"'])
+        self.assertEqual(exe._limit_commands(Meta(cpu_limit=3, memory_limit=64 * 1024 * 1024)), [
+            'ulimit -S -t 3', 'ulimit -H -t 4', 'ulimit -v 65536', 'exec /bin/sh -c "$1"'])
+
+        # the wrapper leaves no positional parameters
+        with tempfile.TemporaryFile() as out:
+            exe = CommandExecutor(MockLogger(), 'utf-8', sys.stdin, out, out, '/tmp')
+            self.assertEqual(exe.execute(Command('cmd 1', [CommandLine('echo "[$1]" \'$1\'', Meta(nice=1))])), 0)
+            out.seek(0)
+            self.assertEqual(out.read(), b'[] $1\n')
+
+    @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
+    def test_execute_signal(self):
+        with tempfile.TemporaryFile() as out:
+            exe = CommandExecutor(MockLogger(), 'utf-8', sys.stdin, out, out, '/tmp')
+            ret, results = exe.execute_detail(Command('cmd 1', [CommandLine('kill -TERM $$', Meta())]))
+            self.assertEqual((ret, results[0].reason), (143, 'signal'))
@@ -0,0 +1,23 @@
+from __future__ import division, print_function, absolute_import, unicode_literals
+
+from mog_commons.unittest import TestCase
+from easy_menu.controller.executor import Usage, format_bytes
+
+
+class TestExecutor(TestCase):
+    def test_usage_total(self):
+        self.assertEqual(Usage.total([]), None)
+        self.assertEqual(Usage.total([None]), None)
+        self.assertEqual(Usage.total([Usage(1.5, 0.5, 100, 1, 2, 3, 4), None, Usage(0.25, 0.25, 300, 10, 20, 30, 40)]),
+                         Usage(1.75, 0.75, 300, 11, 22, 33, 44))
+
+    def test_usage_formatted(self):
+        self.assertEqual(Usage(1.5, 0.25, 3 * 1024 * 1024, 1, 2, 3, 4).formatted(),
+                         'user 1.50s, sys 0.25s, max RSS 3.0 MB, block I/O 1 in / 2 out, context switches 3 / 4')
+
+    def test_format_bytes(self):
+        self.assertEqual(format_bytes(0), '0 B')
+        self.assertEqual(format_bytes(1023), '1023 B')
+        self.assertEqual(format_bytes(1536), '1.5 KB')
+        self.assertEqual(format_bytes(200 * 1024 * 1024), '200.0 MB')
+        self.assertEqual(format_bytes(3 * 1024 ** 4), '3072.0 GB')
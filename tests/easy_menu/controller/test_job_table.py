@@ -0,0 +1,86 @@
+from __future__ import division, print_function, absolute_import, unicode_literals
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from mog_commons.unittest import TestCase, base_unittest
+from easy_menu.controller import CommandExecutor, Job, JobTable
+from easy_menu.entity import Command, CommandLine, Meta
+from tests.easy_menu.logger.mock_logger import MockLogger
+
+
+class TestJobTable(TestCase):
+    @staticmethod
+    def _wait(job_table, timeout=10):
+        t = time.time() + timeout
+        while job_table.running_jobs() and time.time() < t:
+            time.sleep(0.05)
+
+    def test_job(self):
+        job = Job(1, 'title', '/tmp/x.log', datetime(2015, 12, 3, 4, 56, 7))
+        self.assertTrue(job.running)
+        self.assertEqual(job.elapsed(datetime(2015, 12, 3, 4, 56, 10)), timedelta(seconds=3))
+
+        job.return_code, job.end_time = 0, datetime(2015, 12, 3, 4, 56, 8)
+        self.assertFalse(job.running)
+        self.assertEqual(job.elapsed(datetime(2015, 12, 3, 4, 56, 10)), timedelta(seconds=1))
+
+    @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
+    def test_start(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            log_dir = os.path.join(tempdir, 'job')
+            exe = CommandExecutor(MockLogger(), 'utf-8', sys.stdin, sys.stdout, sys.stderr, tempdir)
+            job_table = JobTable(exe, log_dir)
+
+            job1 = job_table.start(Command('cmd 1', [
+                CommandLine('echo hello', Meta()),
+                CommandLine('echo world >&2; exit 3', Meta()),
+                CommandLine('echo never', Meta()),
+            ]))
+            job2 = job_table.start(Command('cmd 2', [
+                CommandLine('%s -c "import os; print(os.getsid(0))"' % sys.executable, Meta()),
+            ]))
+            self.assertEqual([j.job_id for j in job_table.jobs], [1, 2])
+            self.assertEqual(job1.title, 'cmd 1')
+            self.assertEqual(os.path.dirname(job1.log_path), log_dir)
+
+            self._wait(job_table)
+            self.assertEqual(job_table.running_jobs(), [])
+            self.assertEqual(job1.return_code, 3)
+            self.assertEqual(job2.return_code, 0)
+            self.assertTrue(job1.start_time <= job1.end_time)
+
+            with open(job1.log_path) as f:
+                self.assertEqual(f.read(), 'hello\nworld\n')
+
+            # detached from the terminal session
+            with open(job2.log_path) as f:
+                self.assertNotEqual(int(f.read()), os.getsid(0))
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_start_error(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            exe = CommandExecutor(MockLogger(), 'utf-8', sys.stdin, sys.stdout, sys.stderr, tempdir)
+
+            def detached(stdin, stdout, stderr):
+                raise ValueError('broken executor')
+
+            exe.detached = detached
+            job_table = JobTable(exe, os.path.join(tempdir, 'job'))
+            job = job_table.start(Command('cmd 1', [CommandLine('echo never', Meta())]))
+
+            self._wait(job_table)
+            self.assertFalse(job.running)
+            self.assertEqual(job.return_code, 1)
+            with open(job.log_path) as f:
+                log = f.read()
+            self.assertTrue(log.startswith('Traceback'))
+            self.assertTrue(log.endswith('ValueError: broken executor\n'))
+        finally:
+            shutil.rmtree(tempdir)
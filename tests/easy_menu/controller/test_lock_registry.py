@@ -0,0 +1,154 @@
+from __future__ import division, print_function, absolute_import, unicode_literals
+
+import os
+import shutil
+import tempfile
+import threading
+import subprocess
+import six
+from mog_commons.unittest import TestCase, base_unittest
+from easy_menu.controller.lock_registry import LockRegistry, FcntlLockRegistry, PidLockRegistry, new_lock_registry, \
+    fcntl
+
+
+class LockRegistryTestMixin(object):
+    registry_class = None
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.locks = self.registry_class(self.tempdir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_acquire(self):
+        a = self.locks.acquire('0123abc')
+        self.assertEqual(a.key, '0123abc')
+        self.assertTrue(os.path.exists(os.path.join(self.tempdir, '01', '23abc')))
+        self.assertEqual(self.locks.acquire('0123abc'), None)
+
+        # other sessions
+        self.assertEqual(self.registry_class(self.tempdir).acquire('0123abc'), None)
+
+        b = self.locks.acquire('0199')
+        self.locks.release(a)
+        self.assertFalse(os.path.exists(os.path.join(self.tempdir, '01', '23abc')))
+
+        a = self.locks.acquire('0123abc')
+        self.assertNotEqual(a, None)
+        self.locks.release(a)
+        self.locks.release(b)
+
+    def test_acquire_threads(self):
+        results = []
+
+        def run():
+            results.append(self.locks.acquire('0123abc'))
+
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        acquired = [x for x in results if x is not None]
+        self.assertEqual(len(acquired), 1)
+        self.locks.release(acquired[0])
+
+    def test_held(self):
+        self.assertEqual(self.locks.held(), set())
+        self.assertEqual(self.locks.held(['0123abc']), set())
+
+        a = self.locks.acquire('0123abc')
+        b = self.locks.acquire('ff00')
+        self.assertEqual(self.locks.held(), set(['0123abc', 'ff00']))
+        self.assertEqual(self.locks.held(['0123abc', '0124', 'aa00']), set(['0123abc']))
+
+        self.locks.release(a)
+        self.assertEqual(self.locks.held(), set(['ff00']))
+        self.locks.release(b)
+        self.assertEqual(self.locks.held(), set())
+
+    def test_acquire_slot(self):
+        a = self.locks.acquire_slot('0123abc', 2)
+        b = self.locks.acquire_slot('0123abc', 2)
+        self.assertEqual(set([a.key, b.key]), set(['0123abc.0', '0123abc.1']))
+        self.assertEqual(self.locks.acquire_slot('0123abc', 2), None)
+        self.assertEqual(self.locks.held(['0123abc']), set())
+
+        self.locks.release(a)
+        c = self.locks.acquire_slot('0123abc', 2)
+        self.assertEqual(c.key, a.key)
+        self.locks.release(b)
+        self.locks.release(c)
+
+    def test_position(self):
+        a = self.locks.enqueue('0123abc')
+        b = self.locks.enqueue('0123abc')
+        c = self.locks.enqueue('0123abc')
+        d = self.locks.enqueue('0124')
+        self.assertEqual([self.locks.position(x) for x in [a, b, c, d]], [1, 2, 3, 1])
+
+        self.locks.release(b)
+        self.assertEqual([self.locks.position(x) for x in [a, c]], [1, 2])
+        self.locks.release(a)
+        self.assertEqual(self.locks.position(c), 1)
+        self.locks.release(c)
+        self.locks.release(d)
+
+
+@base_unittest.skipUnless(fcntl is not None, 'requires fcntl')
+class TestFcntlLockRegistry(LockRegistryTestMixin, TestCase):
+    registry_class = FcntlLockRegistry
+
+    def test_held_stale(self):
+        # left by a crashed process
+        os.makedirs(os.path.join(self.tempdir, '01'))
+        with open(os.path.join(self.tempdir, '01', '23abc'), 'w') as f:
+            f.write('99999999')
+        self.assertEqual(self.locks.held(), set())
+
+        a = self.locks.acquire('0123abc')
+        self.assertEqual(self.locks.held(), set(['0123abc']))
+        self.locks.release(a)
+
+    @base_unittest.skipUnless(six.PY3, 'requires pass_fds')
+    def test_held_by_child(self):
+        a = self.locks.acquire('0123abc')
+        p = subprocess.Popen(['sleep', '30'], pass_fds=[a.fd])
+        try:
+            # the parent is gone without releasing the lock
+            os.close(a.fd)
+            self.assertEqual(self.registry_class(self.tempdir).held(), set(['0123abc']))
+            self.assertEqual(self.registry_class(self.tempdir).acquire('0123abc'), None)
+        finally:
+            p.kill()
+            p.wait()
+        self.assertEqual(self.locks.held(), set())
+        b = self.locks.acquire('0123abc')
+        self.assertNotEqual(b, None)
+        self.locks.release(b)
+
+    def test_new_lock_registry(self):
+        self.assertTrue(isinstance(new_lock_registry(self.tempdir), FcntlLockRegistry))
+
+
+class TestPidLockRegistry(LockRegistryTestMixin, TestCase):
+    registry_class = PidLockRegistry
+
+    def test_acquire_stale(self):
+        os.makedirs(os.path.join(self.tempdir, '01'))
+        with open(os.path.join(self.tempdir, '01', '23abc'), 'w') as f:
+            f.write('99999999')
+        self.assertEqual(self.locks.held(), set())
+
+        a = self.locks.acquire('0123abc')
+        self.assertNotEqual(a, None)
+        with open(os.path.join(self.tempdir, '01', '23abc')) as f:
+            self.assertEqual(f.read(), str(os.getpid()))
+        self.locks.release(a)
+
+
+class TestLockRegistry(TestCase):
+    def test_abstract(self):
+        self.assertRaises(TypeError, LockRegistry, tempfile.gettempdir())
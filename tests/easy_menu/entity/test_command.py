@@ -21,6 +21,14 @@ class TestCommand(TestCase):
             CommandLine('cmd 3', Meta('/work2', {'xxx': '123', 'zzz': '345'}, True)),
         ]))
 
+    def test_max_concurrent(self):
+        self.assertEqual(Command('a', [CommandLine('x', Meta())]).max_concurrent, None)
+        self.assertEqual(Command('a', [
+            CommandLine('x', Meta(max_concurrent=3)),
+            CommandLine('y', Meta(max_concurrent=2)),
+            CommandLine('z', Meta(lock=True, max_concurrent=1)),
+        ]).max_concurrent, 2)
+
     def test_parse_error(self):
         loader = Loader('/tmp', '.')
         self.assertRaisesMessage(
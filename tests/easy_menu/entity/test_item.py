@@ -3,7 +3,7 @@ from __future__ import division, print_function, absolute_import, unicode_litera
 
 import six
 from mog_commons.unittest import TestCase
-from easy_menu.entity import Item, Meta
+from easy_menu.entity import Item, Meta, Menu, LazyMenu, Command, CommandLine
 from easy_menu.setting.loader import Loader
 
 
@@ -13,3 +13,34 @@ class TestItem(TestCase):
             TypeError, "data must be dict, not %s." % ('unicode' if six.PY2 else 'str'),
             Item.parse, {'a': ['b', {}]}, Meta(), Loader('.', '.')
         )
+
+    def test_find_sources(self):
+        self.assertEqual(Item.find_sources({'Main': [
+            {'Menu 1': 'echo 1'},
+            {'include': 'a.yml'},
+            {'Sub': [
+                {'eval': 'echo b', 'cache': 10, 'stale': 60},
+                {'Menu 2': [{'echo 2': {'env': {'include': 'x'}}}]},
+            ], 'meta': {'work_dir': '/tmp'}},
+            {'eval': 'echo c'},
+        ]}), [(False, 'a.yml', None, None), (True, 'echo b', 10, 60), (True, 'echo c', None, None)])
+
+    def test_validate(self):
+        meta = Meta('/tmp', {'A': 'a'})
+        sub = Menu('Sub', [Command('Menu 2', [CommandLine('echo 2', meta)])], meta)
+        Item.validate(Menu('Main', [Command('Menu 1', [CommandLine('echo 1', meta)]), sub, sub], meta))
+        Item.validate(LazyMenu('echo 3', meta, True, 'echo 3', 10))
+
+        unicode_name = 'unicode' if six.PY2 else 'str'
+        self.assertRaisesMessage(
+            TypeError, 'Menu.title must be %s, not int.' % unicode_name,
+            Item.validate, Menu('Main', [Menu(123, [], meta)], meta)
+        )
+        self.assertRaisesMessage(
+            TypeError, 'CommandLine.meta must be Meta, not NoneType.',
+            Item.validate, Menu('Main', [sub, Command('Menu 1', [CommandLine('echo 1', None)])], meta)
+        )
+        self.assertRaisesMessage(
+            TypeError, 'Meta.lock must be bool, not int.',
+            Item.validate, Command('Menu 1', [CommandLine('echo 1', meta.copy(lock=1))])
+        )
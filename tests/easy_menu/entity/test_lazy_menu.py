@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function, absolute_import, unicode_literals
+
+import os
+from mog_commons.unittest import TestCase
+from easy_menu.entity import Item, Menu, LazyMenu, Command, CommandLine, Meta
+from easy_menu.setting.loader import Loader
+from easy_menu.exceptions import ConfigError
+
+
+class TestLazyMenu(TestCase):
+    def _testfile(self, filename):
+        return os.path.join(os.path.abspath(os.path.curdir), 'tests', 'resources', filename)
+
+    def test_parse(self):
+        meta = Meta('/tmp', lazy=True)
+
+        with self.withAssertOutput('', '') as (out, err):
+            loader = Loader(self._testfile(''), '.', stdout=out)
+            self.assertEqual(Item.parse({'include': 'flat.yml'}, meta, loader),
+                             LazyMenu('flat.yml', meta, False, 'flat.yml', None))
+            self.assertEqual(Item.parse({'eval': 'echo x', 'cache': 10}, meta, loader),
+                             LazyMenu('echo x', meta, True, 'echo x', 10))
+
+    def test_load(self):
+        meta = Meta('/tmp', lazy=True)
+
+        with self.withAssertOutput('Reading file: %s\n' % self._testfile('flat.yml'), '') as (out, err):
+            loader = Loader(self._testfile(''), '.', stdout=out)
+            menu = Item.parse({'include': 'flat.yml'}, meta, loader)
+            self.assertFalse(menu.loaded)
+            self.assertEqual(menu.formatted(), '# flat.yml: (not loaded)')
+
+            # loaded only once
+            self.assertEqual(menu.load(), menu)
+            self.assertEqual(menu.load(), menu)
+
+        self.assertTrue(menu.loaded)
+        self.assertEqual(menu.title, 'Main Menu')
+        self.assertEqual(menu.items[0], Command('Menu 1', [CommandLine('echo 1', meta)]))
+
+    def test_load_error(self):
+        path = self._testfile(os.path.join('error', 'error_multiple_items.yml'))
+
+        with self.withAssertOutput('Reading file: %s\n' % path, '') as (out, err):
+            menu = LazyMenu('x', Meta(), False, path, None, Loader('.', '.', stdout=out))
+            self.assertRaisesMessage(ConfigError, '%s: Menu should have only one item, not 2.' % path, menu.load)
+        self.assertFalse(menu.loaded)
+
+    def test_check_types(self):
+        LazyMenu('x', Meta(), True, 'echo x', 10, eval_stale=60).check_types()
+        LazyMenu('x', Meta(), False, 'flat.yml').check_types()
+
+        menu = LazyMenu('x', Meta(), True, 'echo x')
+        menu.source = (True, 'echo x', 'y', None)
+        self.assertRaises(TypeError, menu.check_types)
+        menu.source = (True, 'echo x', None)
+        self.assertRaises(TypeError, menu.check_types)
@@ -1,8 +1,14 @@
 from __future__ import division, print_function, absolute_import, unicode_literals
 
+import os
+import copy
+import shutil
+import pickle
+import tempfile
 from mog_commons.unittest import TestCase
 from easy_menu.entity import *
 from easy_menu.setting.loader import Loader
+from easy_menu.exceptions import ConfigError
 
 
 class TestMenu(TestCase):
@@ -47,4 +53,146 @@ class TestMenu(TestCase):
         ], root_meta)
 
         loader = Loader('/tmp', '.')
+        original = copy.deepcopy(data)
         self.assertEqual(Menu.parse(data, Meta('/tmp'), loader), expect)
+
+        # data is not modified
+        self.assertEqual(data, original)
+        self.assertEqual(Menu.parse(data, Meta('/tmp'), loader), expect)
+
+    def test_parse_deep(self):
+        data = {'Menu 0': [{'Command': 'echo'}]}
+        for i in range(1, 3000):
+            data = {'Menu %d' % i: [{'Command': 'echo'}, data]}
+
+        menu = Menu.parse(data, Meta(), Loader('.', '.'))
+        for i in reversed(range(3000)):
+            self.assertEqual(menu.title, 'Menu %d' % i)
+            menu = menu.items[-1]
+        self.assertEqual(menu, Command('Command', [CommandLine('echo', Meta())]))
+
+    def test_slots(self):
+        menu = Menu('Main', [LazyMenu('sub.yml', Meta(), False, 'sub.yml', loader=Loader('.', '.'))], Meta('/tmp'),
+                    stale_since=1.5)
+        self.assertFalse(hasattr(menu, '__dict__'))
+        self.assertRaises(AttributeError, setattr, menu, 'unknown', 1)
+
+        # non-compared attributes are kept by copy and pickle
+        for m in [copy.copy(menu), pickle.loads(pickle.dumps(menu, 2))]:
+            self.assertEqual(m, menu)
+            self.assertEqual(m.stale_since, 1.5)
+            self.assertEqual(m.items[0].loaded, False)
+        self.assertEqual(pickle.loads(pickle.dumps(menu, 2)).items[0].loader, None)
+
+    def test_parse_shared(self):
+        work_dir = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(work_dir, 'sub.yml'), 'w') as f:
+                f.write('Sub:\n  - eval: \'echo "A: [{a: echo a}]"\'\n    cache: 10\n')
+
+            data = {'Main': [
+                {'include': 'sub.yml'},
+                {'Sub 2': [{'include': 'sub.yml'}]},
+                {'Sub 3': [{'include': 'sub.yml'}], 'meta': {'env': {'X': 'x'}}},
+            ]}
+            meta = Meta(work_dir)
+            with self.withOutput() as (out, err):
+                menu = Menu.parse(data, meta, Loader(work_dir, os.path.join(work_dir, 'cache'), stdout=out))
+            self.assertEqual(out.getvalue().count('Reading file:'), 1)
+            self.assertEqual(out.getvalue().count('Executing:'), 1)
+
+            # shared only if the inherited meta is the same
+            self.assertTrue(menu.items[0] is menu.items[1].items[0])
+            self.assertFalse(menu.items[0] is menu.items[2].items[0])
+            self.assertEqual(menu.items[2].items[0].items[0].items[0].command_lines[0],
+                             CommandLine('echo a', Meta(work_dir, {'X': 'x'})))
+        finally:
+            shutil.rmtree(work_dir)
+
+    def test_parse_glob(self):
+        work_dir = tempfile.mkdtemp()
+        try:
+            os.mkdir(os.path.join(work_dir, 'services'))
+            for name, content in [('b.yml', 'B:\n  - b: echo b\n'), ('a.yml', 'A:\n  - a: echo a\n'),
+                                  ('c.txt', 'C:\n  - c: echo c\n')]:
+                with open(os.path.join(work_dir, 'services', name), 'w') as f:
+                    f.write(content)
+            with open(os.path.join(work_dir, 'root.yml'), 'w') as f:
+                f.write('Main:\n  - include: "*.yml"\n')
+
+            data = {'Main': [{'include': 'services/*.yml'}, {'include': 'services/a.yml'}, {'include': 'x/*.yml'}]}
+            meta = Meta(work_dir)
+            with self.withOutput() as (out, err):
+                loader = Loader(work_dir, '.', stdout=out)
+                menu = Menu.parse(data, meta, loader)
+            self.assertEqual(out.getvalue().count('Reading file:'), 2)
+            self.assertEqual(menu, Menu('Main', [
+                Menu('services/*.yml', [
+                    Menu('A', [Command('a', [CommandLine('echo a', meta)])], meta),
+                    Menu('B', [Command('b', [CommandLine('echo b', meta)])], meta),
+                ], meta),
+                Menu('A', [Command('a', [CommandLine('echo a', meta)])], meta),
+                Menu('x/*.yml', [], meta),
+            ], meta))
+
+            # shared with the explicit include
+            self.assertTrue(menu.items[0].items[0] is menu.items[1])
+
+            # the including file itself is skipped
+            with self.withOutput() as (out, err):
+                loader = Loader(work_dir, '.', stdout=out)
+                chain = (loader.source_key(False, 'root.yml'),)
+                menu = Menu.parse(loader.load(False, 'root.yml'), meta, loader, 'utf-8', chain)
+            self.assertEqual(menu, Menu('Main', [Menu('*.yml', [], meta)], meta))
+
+            # lazy
+            lazy_meta = Meta(work_dir, lazy=True)
+            menu = Menu.parse(data, lazy_meta, Loader(work_dir, '.'))
+            self.assertEqual(menu.items[0], Menu('services/*.yml', [
+                LazyMenu(os.path.join('services', 'a.yml'), lazy_meta, False, os.path.join('services', 'a.yml')),
+                LazyMenu(os.path.join('services', 'b.yml'), lazy_meta, False, os.path.join('services', 'b.yml')),
+            ], lazy_meta))
+
+            # the matched paths are never expanded again
+            os.mkdir(os.path.join(work_dir, 'svc'))
+            with open(os.path.join(work_dir, 'svc', 'a[1].yml'), 'w') as f:
+                f.write('A1:\n  - a: echo a1\n')
+            with self.withOutput() as (out, err):
+                menu = Menu.parse({'Main': [{'include': 'svc/*.yml'}]}, meta, Loader(work_dir, '.', stdout=out))
+            self.assertEqual(menu, Menu('Main', [
+                Menu('svc/*.yml', [Menu('A1', [Command('a', [CommandLine('echo a1', meta)])], meta)], meta),
+            ], meta))
+            menu = Menu.parse({'Main': [{'include': 'svc/*.yml'}]}, lazy_meta, Loader(work_dir, '.'))
+            self.assertEqual(menu.items[0].items[0].load().title, 'A1')
+        finally:
+            shutil.rmtree(work_dir)
+
+    def test_find(self):
+        base_dir = os.path.join(os.path.abspath(os.path.curdir), 'tests', 'resources')
+        meta = Meta(base_dir, lazy=True)
+        with self.withOutput() as (out, err):
+            loader = Loader(base_dir, '.', stdout=out)
+            menu = Menu.parse(loader.load(False, 'integration_1.yml'), meta, loader)
+
+            self.assertEqual(menu.find([]), menu)
+            self.assertEqual(menu.find(['Menu 2']), Command('Menu 2', [CommandLine('exit 2', meta)]))
+            self.assertEqual(menu.find(['Menu 2', 'Menu 1']), None)
+            self.assertFalse(menu.items[2].loaded)
+
+            # only the lazy menus on the way are loaded
+            self.assertEqual(menu.find(['Include Menu', 'Menu 3']), Command('Menu 3', [CommandLine('exit 3', meta)]))
+            self.assertTrue(menu.items[2].loaded)
+            self.assertFalse(menu.items[3].loaded)
+
+            self.assertEqual(menu.find(['Dynamic Menu', 'Menu 5']), None)
+            self.assertTrue(menu.items[3].loaded)
+            self.assertEqual(menu.find(['Dynamic Menu']), menu.items[3])
+
+            # the lazy menus failing to load are skipped
+            menu = Menu.parse({'Main': [{'include': 'error/error_not_exist.yml'}, {'include': 'integration_2.yml'},
+                                        {'include': 'error/error_parser.yml'}]}, meta, loader)
+            self.assertEqual(menu.find(['Include Menu', 'Menu 3']), Command('Menu 3', [CommandLine('exit 3', meta)]))
+            self.assertFalse(menu.items[0].loaded)
+            self.assertFalse(menu.items[2].loaded)
+            path = os.path.join(base_dir, 'error', 'error_not_exist.yml')
+            self.assertRaisesMessage(ConfigError, '%s: Failed to open.' % path, menu.find, ['Menu 4'])
@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
 from __future__ import division, print_function, absolute_import, unicode_literals
 
+import pickle
 from mog_commons.unittest import TestCase
-from easy_menu.entity import Meta
+from easy_menu.entity import Meta, Env
 
 
 class TestMeta(TestCase):
@@ -14,8 +15,82 @@ class TestMeta(TestCase):
         self.assertEqual(m2, Meta('/path/to/work_dir', {'xxx': '123', 'yyy': '234'}, True))
         self.assertEqual(m3, Meta('/tmp2', {'xxx': '789', 'yyy': '234', 'zzz': '345'}, False))
 
+    def test_updated_background(self):
+        m1 = Meta().updated({'background': True}, 'utf-8')
+        self.assertEqual(m1, Meta(background=True))
+        self.assertTrue(m1.updated({'lock': True}, 'utf-8').background)
+        self.assertFalse(m1.updated({'background': False}, 'utf-8').background)
+        self.assertTrue(Meta(background=True).interned() is m1)
+        self.assertRaisesMessage(TypeError, 'data must be bool, not str.', Meta().updated, {'background': 'x'}, 'utf-8')
+
+    def test_updated_parallel(self):
+        m1 = Meta().updated({'parallel': True, 'max_parallel': 4}, 'utf-8')
+        self.assertEqual(m1, Meta(parallel=True, max_parallel=4))
+        self.assertRaisesMessage(ValueError, 'max_parallel must be a positive integer, not 0.',
+                                 Meta().updated, {'max_parallel': 0}, 'utf-8')
+        self.assertRaisesMessage(TypeError, 'data must be int, not str.',
+                                 Meta().updated, {'max_parallel': '1'}, 'utf-8')
+
+    def test_updated_max_concurrent(self):
+        self.assertEqual(Meta().updated({'max_concurrent': 3}, 'utf-8'), Meta(max_concurrent=3))
+        self.assertRaisesMessage(ValueError, 'max_concurrent must be a positive integer, not 0.',
+                                 Meta().updated, {'max_concurrent': 0}, 'utf-8')
+        self.assertRaisesMessage(ValueError, 'max_concurrent must be a positive integer, not True.',
+                                 Meta().updated, {'max_concurrent': True}, 'utf-8')
+
+    def test_updated_limits(self):
+        m1 = Meta().updated({'timeout': 1.5, 'cpu_limit': 10, 'memory_limit': '512M', 'nice': 10}, 'utf-8')
+        self.assertEqual(m1, Meta(timeout=1.5, cpu_limit=10, memory_limit=512 * 1024 * 1024, nice=10))
+        self.assertEqual(Meta().updated({'memory_limit': 1000}, 'utf-8').memory_limit, 1000)
+        self.assertEqual(Meta().updated({'memory_limit': '2 GB'}, 'utf-8').memory_limit, 2 * 1024 ** 3)
+        self.assertEqual(Meta().updated({'memory_limit': '64k'}, 'utf-8').memory_limit, 64 * 1024)
+
+        self.assertRaisesMessage(ValueError, 'timeout must be a positive number, not 0.',
+                                 Meta().updated, {'timeout': 0}, 'utf-8')
+        self.assertRaisesMessage(ValueError, 'cpu_limit must be a positive integer, not -1.',
+                                 Meta().updated, {'cpu_limit': -1}, 'utf-8')
+        self.assertRaisesMessage(ValueError, "memory_limit must be a positive integer or a size such as 512M, not 'x'.",
+                                 Meta().updated, {'memory_limit': 'x'}, 'utf-8')
+        self.assertRaisesMessage(ValueError, 'nice must be an integer from 0 to 19, not -5.',
+                                 Meta().updated, {'nice': -5}, 'utf-8')
+        self.assertRaisesMessage(TypeError, 'data must be int, not float.',
+                                 Meta().updated, {'cpu_limit': 1.5}, 'utf-8')
+
     def test_updated_error(self):
         self.assertRaisesMessage(
             ValueError, "Unknown field: a",
             Meta().updated, {'a': 'b'}, 'utf-8'
         )
+
+    def test_updated_shared(self):
+        m1 = Meta('/tmp', {'xxx': '123', 'yyy': '234'})
+        m2 = m1.updated({'env': {'zzz': '345'}}, 'utf-8')
+        m3 = m1.updated({'env': {'zzz': '345'}}, 'utf-8')
+
+        # equal instances are interned and only the difference is kept
+        self.assertTrue(m2 is m3)
+        self.assertTrue(m2.env.parent is m1.env)
+        self.assertEqual(m2.env.delta, {'zzz': '345'})
+        self.assertEqual(m2.env.flatten(), {'xxx': '123', 'yyy': '234', 'zzz': '345'})
+
+        # no new level for the same values
+        self.assertTrue(m1.updated({'env': {'xxx': '123'}}, 'utf-8').env is m1.env)
+
+    def test_env(self):
+        e1 = Env({'xxx': '123', 'yyy': '234'})
+        e2 = e1.updated({'yyy': '999', 'zzz': '345'})
+        e3 = Env({'xxx': '123', 'yyy': '999', 'zzz': '345'})
+
+        self.assertEqual(e2['xxx'], '123')
+        self.assertEqual(e2['yyy'], '999')
+        self.assertEqual(e2.get('aaa'), None)
+        self.assertEqual(sorted(e2.items()), [('xxx', '123'), ('yyy', '999'), ('zzz', '345')])
+        self.assertEqual(len(e2), 3)
+        self.assertEqual(e1, {'xxx': '123', 'yyy': '234'})
+        self.assertEqual(e2, e3)
+        self.assertEqual(hash(e2), hash(e3))
+        self.assertNotEqual(e1, e2)
+        self.assertFalse(Env())
+        self.assertTrue(Env().updated({'a': 'b'}))
+        self.assertEqual(pickle.loads(pickle.dumps(e2, 2)), e3)
+        self.assertEqual(Meta('/tmp', e2), Meta('/tmp', e3.flatten()))
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function, absolute_import, unicode_literals
+
+import os
+import shutil
+import tempfile
+from mog_commons.unittest import TestCase, base_unittest
+from easy_menu.setting.eval_cache import EvalCache
+
+
+class TestEvalCache(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_get_put(self):
+        cache = EvalCache(self.cache_dir)
+        self.assertEqual(cache.get('echo 1', 10, now=100), None)
+
+        cache.put('echo 1', b'1\n', 10, now=100)
+        self.assertEqual(cache.get('echo 1', 10, now=105), b'1\n')
+        self.assertEqual(cache.get('echo 1', 10, now=110), None)
+        self.assertEqual(cache.get('echo 2', 10, now=105), None)
+
+        # compatible with the former layout
+        with open(os.path.join(self.cache_dir, 'e5', '8da952399a06c3070da7d8c5ef745f'), 'rb') as f:
+            self.assertEqual(f.read(), b'1\n')
+
+    def test_get_put_compressed(self):
+        data = b'x' * 1000
+        EvalCache(self.cache_dir, compress=True).put('echo x', data, 10, now=100)
+        self.assertLess(os.path.getsize(EvalCache(self.cache_dir).path('echo x')), len(data))
+
+        # readable without the compress option
+        self.assertEqual(EvalCache(self.cache_dir).get('echo x', 10, now=100), data)
+
+    def test_evict(self):
+        cache = EvalCache(self.cache_dir, max_size=25)
+        cache.put('echo 1', b'1' * 10, 100, now=100)
+        cache.put('echo 2', b'2' * 10, 100, now=101)
+        cache.get('echo 1', 100, now=102)
+
+        # "echo 2" is the least recently used
+        cache.put('echo 3', b'3' * 10, 100, now=103)
+        self.assertEqual(cache.get('echo 1', 100, now=104), b'1' * 10)
+        self.assertEqual(cache.get('echo 2', 100, now=104), None)
+        self.assertEqual(cache.get('echo 3', 100, now=104), b'3' * 10)
+        self.assertFalse(os.path.exists(cache.path('echo 2')))
+
+    def test_gc(self):
+        cache = EvalCache(self.cache_dir)
+        cache.put('echo 1', b'1' * 10, 10, now=100)
+        cache.put('echo 2', b'2' * 20, 100, now=100)
+
+        # orphan file
+        os.makedirs(os.path.join(self.cache_dir, 'ab'))
+        with open(os.path.join(self.cache_dir, 'ab', 'cdef'), 'wb') as f:
+            f.write(b'x' * 5)
+
+        self.assertEqual(cache.gc(now=150), (2, 15))
+        self.assertFalse(os.path.exists(cache.path('echo 1')))
+        self.assertEqual(cache.get('echo 2', 100, now=150), b'2' * 20)
+        self.assertEqual(cache.gc(now=150), (0, 0))
+
+    def test_gc_max_size(self):
+        cache = EvalCache(self.cache_dir)
+        cache.put('echo 1', b'1' * 10, 100, now=100)
+        cache.put('echo 2', b'2' * 20, 100, now=101)
+        cache.put('echo 3', b'3' * 30, 100, now=102)
+        cache.get('echo 1', 100, now=103)
+
+        # "echo 2" and "echo 3" are the least recently used
+        cache = EvalCache(self.cache_dir, max_size=25)
+        self.assertEqual(cache.gc(now=104), (2, 50))
+        self.assertEqual(cache.get('echo 1', 100, now=104), b'1' * 10)
+        self.assertFalse(os.path.exists(cache.path('echo 2')))
+        self.assertFalse(os.path.exists(cache.path('echo 3')))
+        self.assertEqual(cache.gc(now=104), (0, 0))
+
+    def test_put_atomic(self):
+        cache = EvalCache(self.cache_dir)
+        cache.put('echo 1', b'1', 10, now=100)
+        cache.put('echo 1', b'2', 10, now=100)
+        self.assertEqual(os.listdir(os.path.dirname(cache.path('echo 1'))), ['8da952399a06c3070da7d8c5ef745f'])
+        self.assertEqual(cache.get('echo 1', 10, now=100), b'2')
+
+    @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
+    def test_lock(self):
+        cache = EvalCache(self.cache_dir)
+        waited = []
+        with cache.lock('echo 1', 1) as locked1:
+            self.assertTrue(locked1)
+            with cache.lock('echo 1', 0.2, lambda: waited.append(1)) as locked2:
+                self.assertFalse(locked2)
+            with cache.lock('echo 2', 0) as locked3:
+                self.assertTrue(locked3)
+        self.assertEqual(waited, [1])
+
+        with cache.lock('echo 1', 0) as locked4:
+            self.assertTrue(locked4)
+
+        # lock files are not counted
+        self.assertEqual(cache.gc(), (0, 0))
+
+    @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
+    def test_gc_lock(self):
+        cache = EvalCache(self.cache_dir)
+        lock_dir = os.path.join(self.cache_dir, 'lock')
+        lock_names = dict((cmd, cache._name(cmd).replace('/', '')) for cmd in ['echo 1', 'echo 2', 'echo 3', 'echo 4'])
+        for cmd in sorted(lock_names):
+            with cache.lock(cmd, 0) as locked:
+                self.assertTrue(locked)
+        cache.put('echo 1', b'1', 10, now=100)
+        cache.put('echo 2', b'2', 100, now=100)
+
+        # "echo 1" is expired and "echo 3" is never cached, but "echo 4" is being evaluated
+        with cache.lock('echo 4', 0) as locked:
+            self.assertTrue(locked)
+            self.assertEqual(cache.gc(now=150), (1, 1))
+            self.assertEqual(sorted(os.listdir(lock_dir)), sorted([lock_names['echo 2'], lock_names['echo 4']]))
+        cache.gc(now=150)
+        self.assertEqual(os.listdir(lock_dir), [lock_names['echo 2']])
+
+        # the lock file of the evicted entry is removed as well
+        cache = EvalCache(self.cache_dir, max_size=1)
+        with cache.lock('echo 3', 0):
+            cache.put('echo 3', b'3', 100, now=200)
+        self.assertEqual(os.listdir(lock_dir), [lock_names['echo 3']])
+
+        # the lock file removed after opened is not used
+        with open(os.path.join(lock_dir, lock_names['echo 3'])) as f:
+            os.remove(os.path.join(lock_dir, lock_names['echo 3']))
+            self.assertFalse(cache._is_same_file(f, os.path.join(lock_dir, lock_names['echo 3'])))
+        with cache.lock('echo 3', 0) as locked:
+            self.assertTrue(locked)
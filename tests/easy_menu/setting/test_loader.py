@@ -4,9 +4,14 @@ from __future__ import division, print_function, absolute_import, unicode_litera
 import os
 import sys
 import time
+import shutil
+import threading
+import tempfile
+import yaml
 from mog_commons.unittest import TestCase, base_unittest
 from easy_menu.setting.setting import Loader
-from easy_menu.exceptions import EncodingError
+from easy_menu.setting.loader import LIBYAML_AVAILABLE
+from easy_menu.exceptions import ConfigError, EncodingError, SettingError
 
 if sys.version_info < (3, 3):
     import mock
@@ -24,6 +29,25 @@ class TestLoader(TestCase):
         self.assertEqual(Loader('.', '.').is_url('ftp://example.com/foo.yml'), False)
         self.assertEqual(Loader('.', '.').is_url('/etc/foo/bar.yml'), False)
 
+    def test_is_glob(self):
+        self.assertEqual(Loader.is_glob('services/*.yml'), True)
+        self.assertEqual(Loader.is_glob('services/[ab].yml'), True)
+        self.assertEqual(Loader.is_glob('services/a.yml'), False)
+        self.assertEqual(Loader.is_glob('http://example.com/foo.yml?a=*'), False)
+
+    def test_glob(self):
+        loader = Loader(self._testfile(''), '.')
+        self.assertEqual(loader.glob('error/error_include_cycle_*.yml'),
+                         [os.path.join('error', 'error_include_cycle_%d.yml' % i) for i in [1, 2]])
+        self.assertEqual(loader.glob(self._testfile('error/error_include_cycle_*.yml')),
+                         [self._testfile('error/error_include_cycle_%d.yml' % i) for i in [1, 2]])
+        self.assertEqual(loader.glob('not_exist/*.yml'), [])
+
+        with self.withOutput() as (out, err):
+            loader = Loader(self._testfile(''), '.', stdout=out)
+            self.assertEqual(len(loader.prefetch([(False, 'error/error_include_cycle_*.yml', None, None)], 4)), 2)
+        self.assertEqual(out.getvalue().count('Reading file:'), 2)
+
     def test_load(self):
         self.maxDiff = None
 
@@ -167,6 +191,63 @@ class TestLoader(TestCase):
                 expect_data
             )
 
+    def test_init_error(self):
+        self.assertRaisesMessage(SettingError, 'Unknown loader backend: xxx', Loader, '.', '.', backend='xxx')
+
+    def test_parse(self):
+        expect = {'Main Menu': [{'Menu 1': 'echo 1'}, {'Menu 2': 'echo 2'}]}
+        backends = ['auto', 'yaml'] + (['libyaml'] if LIBYAML_AVAILABLE else [])
+
+        for backend in backends:
+            loader = Loader('.', '.', backend=backend)
+            self.assertEqual(loader._parse('{"Main Menu": [{"Menu 1": "echo 1"}, {"Menu 2": "echo 2"}]}', True), expect)
+            self.assertEqual(loader._parse('{Main Menu: [{Menu 1: echo 1}, {Menu 2: echo 2}]}', True), expect)
+            self.assertEqual(loader._parse('Main Menu:\n  - Menu 1: echo 1\n  - Menu 2: echo 2\n', True), expect)
+            self.assertEqual(loader._parse('Main Menu:\n  - Menu 1: echo 1\n  - Menu 2: echo 2\n', False), expect)
+
+    def test_parse_error(self):
+        backends = ['auto', 'yaml'] + (['libyaml'] if LIBYAML_AVAILABLE else [])
+
+        # error messages should not depend on the backend
+        for backend in backends:
+            self.assertRaisesMessage(
+                yaml.YAMLError,
+                'while scanning a quoted scalar\n  in "<unicode string>", line 1, column 1:\n    "\n    ^\n'
+                'found unexpected end of stream\n  in "<unicode string>", line 1, column 2:\n    "\n     ^',
+                Loader('.', '.', backend=backend)._parse, '"', True
+            )
+
+    def test_render(self):
+        loader = Loader('.', '.')
+        self.assertEqual(loader._render('a: [{{ 1 + 2 }}]\n', 'x'), 'a: [3]')
+        self.assertEqual(loader._render('a: [{% for i in range(3) %}{{ i }},{% endfor %}]', 'x'), 'a: [0,1,2,]')
+        self.assertEqual(loader._render('a: [1, 2]{# comment #}\n', 'y'), 'a: [1, 2]')
+
+        # the source of the same name can change
+        self.assertEqual(loader._render('a: {{ 4 }}', 'x'), 'a: 4')
+
+    def test_render_without_template(self):
+        loader = Loader('.', '.')
+        self.assertEqual(loader._render('a: [1, 2]\n', 'x'), 'a: [1, 2]')
+        self.assertEqual(loader._render('a: [1, 2]\r\n', 'x'), 'a: [1, 2]')
+        self.assertEqual(loader._render('a: [1, 2]\n\n', 'x'), 'a: [1, 2]\n')
+        self.assertEqual(loader._render('{"a": [1, 2]}', 'x'), '{"a": [1, 2]}')
+        self.assertEqual(loader._environment, None)
+
+    def test_render_bytecode_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            self.assertEqual(Loader('.', '.', template_cache_dir=cache_dir)._render('a: {{ 1 + 2 }}', 'x'), 'a: 3')
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+            # compiled template is reused
+            self.assertEqual(Loader('.', '.', template_cache_dir=cache_dir)._render('a: {{ 1 + 2 }}', 'x'), 'a: 3')
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+            self.assertEqual(Loader('.', '.', template_cache_dir=cache_dir)._render('a: {{ 5 }}', 'x'), 'a: 5')
+        finally:
+            shutil.rmtree(cache_dir)
+
     @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
     def test_load_dynamic(self):
         with self.withAssertOutput(
@@ -230,12 +311,8 @@ class TestLoader(TestCase):
         ])
 
         def clear_files():
-            if os.path.exists(cache_path):
-                os.remove(cache_path)
-            if os.path.exists(os.path.dirname(cache_path)):
-                os.removedirs(os.path.dirname(cache_path))
             if os.path.exists(cache_dir):
-                os.removedirs(cache_dir)
+                shutil.rmtree(cache_dir)
 
         try:
             with self.withAssertOutput(expected, '') as (out, err):
@@ -258,3 +335,153 @@ class TestLoader(TestCase):
                 self.assertNotEqual(d3, d4)
         finally:
             clear_files()
+
+    @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
+    def test_eval_command_with_cache_wait(self):
+        cache_dir = tempfile.mkdtemp()
+        cmd = 'echo "Menu: []"'
+        cache_path = Loader('.', cache_dir).eval_cache.path(cmd)
+        acquired = threading.Event()
+
+        def refresh():
+            # another process is evaluating the same command
+            with Loader('.', cache_dir).eval_cache.lock(cmd, 10) as locked:
+                self.assertTrue(locked)
+                acquired.set()
+                time.sleep(0.5)
+                Loader('.', cache_dir).eval_cache.put(cmd, b'Menu: [1]\n', 10)
+
+        expected = '\n'.join([
+            'Waiting for eval cache: %s' % cache_path,
+            'Reading eval cache: %s' % cache_path,
+            ''
+        ])
+        try:
+            t = threading.Thread(target=refresh)
+            t.start()
+            acquired.wait()
+            with self.withAssertOutput(expected, '') as (out, err):
+                data = Loader('.', cache_dir, stdout=out)._eval_command_with_cache(cmd, 10)
+            t.join()
+            self.assertEqual(data, b'Menu: [1]\n')
+        finally:
+            shutil.rmtree(cache_dir)
+
+    @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
+    def test_eval_command_with_cache_wait_timeout(self):
+        cache_dir = tempfile.mkdtemp()
+        cmd = 'echo "Menu: []"'
+        cache_path = Loader('.', cache_dir).eval_cache.path(cmd)
+        Loader('.', cache_dir).eval_cache.put(cmd, b'Menu: [1]\n', 10, now=time.time() - 20)
+
+        expected = '\n'.join([
+            'Waiting for eval cache: %s' % cache_path,
+            'Reading stale eval cache: %s' % cache_path,
+            ''
+        ])
+        try:
+            with Loader('.', cache_dir).eval_cache.lock(cmd, 10):
+                with self.withAssertOutput(expected, '') as (out, err):
+                    data = Loader('.', cache_dir, stdout=out, cache_lock_timeout=0)._eval_command_with_cache(cmd, 10)
+            self.assertEqual(data, b'Menu: [1]\n')
+        finally:
+            shutil.rmtree(cache_dir)
+
+    @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
+    def test_load_stale_while_revalidate(self):
+        cache_dir = tempfile.mkdtemp()
+        cmd = 'echo "Menu: [2]"'
+        cache_path = Loader('.', cache_dir).eval_cache.path(cmd)
+        created = time.time() - 20
+        Loader('.', cache_dir).eval_cache.put(cmd, b'Menu: [1]\n', 10, now=created)
+
+        try:
+            # too old
+            with self.withAssertOutput('', '') as (out, err):
+                loader = Loader('.', cache_dir, stdout=out)
+                self.assertEqual(loader.eval_cache.get(cmd, 10 + 5), None)
+
+            # expired, but served while refreshing
+            with self.withAssertOutput('Reading stale eval cache: %s\n' % cache_path, '') as (out, err):
+                loader = Loader('.', cache_dir, stdout=out)
+                self.assertEqual(loader.load(True, cmd, 10, 60), {'Menu': [1]})
+                self.assertEqual(loader.stale_since(True, cmd), created)
+                loader.join_refresh()
+
+            # refreshed
+            with self.withAssertOutput('Reading eval cache: %s\n' % cache_path, '') as (out, err):
+                loader = Loader('.', cache_dir, stdout=out)
+                self.assertEqual(loader.load(True, cmd, 10, 60), {'Menu': [2]})
+                self.assertEqual(loader.stale_since(True, cmd), None)
+        finally:
+            shutil.rmtree(cache_dir)
+
+    @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
+    def test_load_fallback_eval(self):
+        fallback_dir = tempfile.mkdtemp()
+        flag_path = os.path.join(fallback_dir, 'ok')
+        cmd = 'test -f %s && echo "Menu: [1]" || (echo broken; exit 1)' % flag_path
+        copy_path = Loader('.', '.', fallback_dir=fallback_dir).fallback.path(True, cmd)
+
+        def load(out):
+            loader = Loader('.', '.', stdout=out, fallback_dir=fallback_dir)
+            return loader.load(True, cmd), loader.stale_since(True, cmd)
+
+        try:
+            # no copy yet
+            with self.withAssertOutput('Executing: %s\n' % cmd, '') as (out, err):
+                self.assertEqual(load(out), ('broken', None))
+
+            # save the copy
+            open(flag_path, 'w').close()
+            with self.withAssertOutput('Executing: %s\n' % cmd, '') as (out, err):
+                self.assertEqual(load(out), ({'Menu': [1]}, None))
+            saved = Loader('.', '.', fallback_dir=fallback_dir).fallback.get(True, cmd)[1]
+
+            # failed
+            os.remove(flag_path)
+            expected = 'Executing: %s\nReading last known good copy: %s\n' % (cmd, copy_path)
+            with self.withAssertOutput(expected, '') as (out, err):
+                self.assertEqual(load(out), ({'Menu': [1]}, saved))
+        finally:
+            shutil.rmtree(fallback_dir)
+
+    @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
+    def test_load_fallback_timeout(self):
+        fallback_dir = tempfile.mkdtemp()
+        cmd = 'sleep 3; echo "Menu: [2]"'
+        copy_path = Loader('.', '.', fallback_dir=fallback_dir).fallback.path(True, cmd)
+        Loader('.', '.', fallback_dir=fallback_dir).fallback.put(True, cmd, b'Menu: [1]\n', now=100.0)
+
+        expected = 'Executing: %s\nReading last known good copy: %s\n' % (cmd, copy_path)
+        try:
+            with self.withAssertOutput(expected, '') as (out, err):
+                loader = Loader('.', '.', stdout=out, fallback_dir=fallback_dir, fetch_timeout=0.2)
+                t = time.time()
+                self.assertEqual(loader.load(True, cmd), {'Menu': [1]})
+                self.assertLess(time.time() - t, 2)
+                self.assertEqual(loader.stale_since(True, cmd), 100.0)
+        finally:
+            shutil.rmtree(fallback_dir)
+
+    @mock.patch('easy_menu.setting.loader.urlopen')
+    def test_load_fallback_http(self, urlopen_mock):
+        fallback_dir = tempfile.mkdtemp()
+        url = 'http://localhost/xxx.yml'
+        Loader('.', '.', fallback_dir=fallback_dir).fallback.put(False, url, b'Menu: [1]\n', now=100.0)
+        copy_path = Loader('.', '.', fallback_dir=fallback_dir).fallback.path(False, url)
+        urlopen_mock.side_effect = IOError('connection refused')
+
+        expected = 'Reading from URL: %s\nReading last known good copy: %s\n' % (url, copy_path)
+        try:
+            with self.withAssertOutput(expected, '') as (out, err):
+                loader = Loader('.', '.', stdout=out, fallback_dir=fallback_dir)
+                self.assertEqual(loader.load(False, url), {'Menu': [1]})
+                self.assertEqual(loader.stale_since(False, url), 100.0)
+
+            # without the copy
+            with self.withAssertOutput('Reading from URL: %s\n' % url, '') as (out, err):
+                self.assertRaisesMessage(ConfigError, '%s: Failed to open.' % url,
+                                         Loader('.', '.', stdout=out).load, False, url)
+        finally:
+            shutil.rmtree(fallback_dir)
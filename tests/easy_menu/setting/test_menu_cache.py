@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function, absolute_import, unicode_literals
+
+import os
+import shutil
+import tempfile
+from mog_commons.unittest import TestCase
+from easy_menu.setting.setting import Setting
+from easy_menu.setting.loader import Loader
+from easy_menu.setting.menu_cache import MenuCache
+from easy_menu.entity import Menu, Command, CommandLine, Meta
+
+
+class TestMenuCache(TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.work_dir, 'cache')
+        self.root_path = os.path.join(self.work_dir, 'root.yml')
+        self.sub_path = os.path.join(self.work_dir, 'sub.yml')
+        self._write(self.root_path, 'Main Menu:\n  - Menu 1: echo 1\n  - include: sub.yml\n')
+        self._write(self.sub_path, 'Sub Menu:\n  - Menu 2: echo 2\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    @staticmethod
+    def _write(path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def _load(self, out):
+        return Setting(config_path=self.root_path, encoding='utf-8', stdout=out, menu_cache=True,
+                       menu_cache_dir=self.cache_dir).load_config().root_menu
+
+    def _cache_path(self):
+        return MenuCache(self.cache_dir, Loader(self.work_dir, '.', 'utf-8'))._cache_path(self.root_path)
+
+    def test_load(self):
+        meta = Meta(self.work_dir)
+        expected = Menu('Main Menu', [
+            Command('Menu 1', [CommandLine('echo 1', meta)]),
+            Menu('Sub Menu', [Command('Menu 2', [CommandLine('echo 2', meta)])], meta),
+        ], meta)
+
+        # create cache
+        expect = '\n'.join([
+            'Reading file: %s' % self.root_path,
+            'Reading file: %s' % self.sub_path,
+            'Writing menu cache: %s' % self._cache_path(),
+            '',
+        ])
+        with self.withAssertOutput(expect, '') as (out, err):
+            self.assertEqual(self._load(out), expected)
+
+        # read from cache
+        with self.withAssertOutput('Reading menu cache: %s\n' % self._cache_path(), '') as (out, err):
+            self.assertEqual(self._load(out), expected)
+
+    def test_load_modified(self):
+        meta = Meta(self.work_dir)
+
+        with self.withOutput() as (out, err):
+            self._load(out)
+
+        # the modified file is read only once
+        self._write(self.sub_path, 'Sub Menu:\n  - Menu 3: echo 3\n')
+        expect = '\n'.join([
+            'Reading file: %s' % self.sub_path,
+            'Reading file: %s' % self.root_path,
+            'Writing menu cache: %s' % self._cache_path(),
+            '',
+        ])
+        with self.withAssertOutput(expect, '') as (out, err):
+            self.assertEqual(self._load(out), Menu('Main Menu', [
+                Command('Menu 1', [CommandLine('echo 1', meta)]),
+                Menu('Sub Menu', [Command('Menu 3', [CommandLine('echo 3', meta)])], meta),
+            ], meta))
+
+    def test_load_broken(self):
+        with self.withOutput() as (out, err):
+            self._load(out)
+
+        self._write(self._cache_path(), 'broken')
+        expect = '\n'.join([
+            'Reading file: %s' % self.root_path,
+            'Reading file: %s' % self.sub_path,
+            'Writing menu cache: %s' % self._cache_path(),
+            '',
+        ])
+        with self.withAssertOutput(expect, '') as (out, err):
+            self._load(out)
+
+    def test_save_deep(self):
+        depth = 1500
+        for i in range(depth):
+            self._write(os.path.join(self.work_dir, 'd%d.yml' % i), 'D%d:\n  - include: d%d.yml\n' % (i, i + 1))
+        self._write(os.path.join(self.work_dir, 'd%d.yml' % depth), 'Bottom:\n  - Menu 1: echo 1\n')
+        self._write(self.root_path, 'Main Menu:\n  - include: d0.yml\n')
+
+        with self.withOutput() as (out, err):
+            menu = self._load(out)
+        self.assertTrue(out.getvalue().splitlines()[-1].startswith('Failed to write menu cache: '))
+        self.assertFalse(os.path.exists(self._cache_path()))
+
+        for _ in range(depth + 1):
+            menu = menu.items[0]
+        self.assertEqual(menu.title, 'Bottom')
@@ -2,10 +2,12 @@
 from __future__ import division, print_function, absolute_import, unicode_literals
 
 import os
+import shutil
+import tempfile
 from mog_commons.unittest import TestCase, base_unittest
 from mog_commons.string import to_unicode
 from easy_menu.setting.setting import Setting
-from easy_menu.entity import Menu, Command, CommandLine, Meta
+from easy_menu.entity import Menu, LazyMenu, Command, CommandLine, Meta
 from easy_menu.exceptions import ConfigError, SettingError, EncodingError
 
 
@@ -98,6 +100,51 @@ class TestSetting(TestCase):
             Setting().parse_args(['easy-menu', 'xyz.yml', '--no-getch']),
             Setting(config_path=abspath('xyz.yml'), getch_enabled=False)
         )
+        self.assertEqual(
+            Setting().parse_args(['easy-menu', 'xyz.yml', '--menu-cache']),
+            Setting(config_path=abspath('xyz.yml'), menu_cache=True)
+        )
+        self.assertEqual(
+            Setting().parse_args(['easy-menu', 'xyz.yml', '--menu-cache', '--no-validate']),
+            Setting(config_path=abspath('xyz.yml'), menu_cache=True, validate=False)
+        )
+        self.assertEqual(
+            Setting().parse_args(['easy-menu', 'xyz.yml', '--workers', '8']),
+            Setting(config_path=abspath('xyz.yml'), workers=8)
+        )
+        self.assertEqual(
+            Setting().parse_args(['easy-menu', 'xyz.yml', '--lazy']),
+            Setting(config_path=abspath('xyz.yml'), lazy=True)
+        )
+        self.assertEqual(
+            Setting().parse_args(['easy-menu', 'xyz.yml', '--loader-backend', 'yaml']),
+            Setting(config_path=abspath('xyz.yml'), loader_backend='yaml')
+        )
+        self.assertEqual(
+            Setting().parse_args(['easy-menu', 'xyz.yml', '--cache-max-size', '16', '--cache-compress',
+                                  '--cache-lock-timeout', '5']),
+            Setting(config_path=abspath('xyz.yml'), cache_max_mb=16, cache_compress=True, cache_lock_timeout=5)
+        )
+        self.assertEqual(
+            Setting().parse_args(['easy-menu', 'xyz.yml', '--run', 'Main Menu > Sub Menu > Command']),
+            Setting(config_path=abspath('xyz.yml'), run_path='Main Menu > Sub Menu > Command')
+        )
+        self.assertEqual(
+            Setting().parse_args(['easy-menu', '--gc-cache']),
+            Setting(gc_cache=True)
+        )
+        self.assertEqual(
+            Setting().parse_args(['easy-menu', 'http://example.com/xyz.yml', '--url-max-age', '300']),
+            Setting(config_path='http://example.com/xyz.yml', url_max_age=300)
+        )
+        self.assertEqual(
+            Setting().parse_args(['easy-menu', 'xyz.yml', '--fallback', '--fetch-timeout', '1.5']),
+            Setting(config_path=abspath('xyz.yml'), fallback=True, fetch_timeout=1.5)
+        )
+        self.assertEqual(
+            Setting().parse_args(['easy-menu', 'xyz.yml', '--watch', '--watch-interval', '0.5']),
+            Setting(config_path=abspath('xyz.yml'), watch=True, watch_interval=0.5)
+        )
 
     def test_parse_args_error(self):
         self.maxDiff = None
@@ -112,8 +159,43 @@ class TestSetting(TestCase):
             '  --width=WIDTH         set window width to WIDTH',
             '  -d DIR, --work-dir=DIR',
             '                        set working directory to DIR',
+            '  --workers=NUM         load "include" and "eval" sections concurrently with',
+            '                        NUM threads (default: 1)',
+            '  --lazy                load "include" and "eval" sections when the sub menu',
+            '                        is opened (default: False)',
+            '  --loader-backend=BACKEND',
+            '                        set configuration parser to BACKEND (auto, libyaml,',
+            '                        yaml) (default: auto)',
             '  --clear-cache         clear old cache when evaluating "eval" section',
             '                        (default: False)',
+            '  --cache-max-size=MB   evict least recently used "eval" cache entries beyond',
+            '                        MB megabytes (default: 256)',
+            '  --cache-compress      compress new "eval" cache entries (default: False)',
+            '  --cache-lock-timeout=SEC',
+            '                        wait SEC seconds for another process evaluating the',
+            '                        same "eval" section, then use the expired cache',
+            '                        (default: 60)',
+            '  --url-max-age=SEC     use the local copy of the configuration loaded by URL',
+            '                        without any request for SEC seconds (default: always',
+            '                        revalidate)',
+            '  --fallback            keep the last known good copy of each "eval" section',
+            '                        and URL, and use it when loading fails (default:',
+            '                        False)',
+            '  --fetch-timeout=SEC   with --fallback, use the last known good copy if',
+            '                        loading "eval" section or URL takes more than SEC',
+            '                        seconds (default: wait until finished)',
+            '  --watch               reload the menu when the configuration files are',
+            '                        modified (default: False)',
+            '  --watch-interval=SEC  check the configuration files every SEC seconds in',
+            '                        watch mode (default: 2)',
+            '  --run=PATH            execute the command at PATH (titles separated by ">",',
+            '                        e.g. "Main Menu > Sub Menu > Command") without the',
+            '                        menu screen and exit with its return code',
+            '  --gc-cache            remove expired "eval" cache entries and exit',
+            '  --menu-cache          reuse the compiled menu while its sources are',
+            '                        unchanged (default: False)',
+            '  --no-validate         skip checking the types of the loaded menu entities',
+            '                        for trusted configurations (default: enabled)',
             '  --no-getch            disable real-time key input (without pressing ENTER',
             '                        key) (default: enabled)',
             '',
@@ -201,12 +283,8 @@ class TestSetting(TestCase):
         cache_path = os.path.join(cache_dir, '57', '8f2d1550c1fad02f46409db2b538c9')
 
         def clear_files():
-            if os.path.exists(cache_path):
-                os.remove(cache_path)
-            if os.path.exists(os.path.dirname(cache_path)):
-                os.removedirs(os.path.dirname(cache_path))
             if os.path.exists(cache_dir):
-                os.removedirs(cache_dir)
+                shutil.rmtree(cache_dir)
 
         expect = '\n'.join([
             'Reading file: %s' % path,
@@ -251,6 +329,73 @@ class TestSetting(TestCase):
         finally:
             clear_files()
 
+    @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
+    def test_load_config_parallel(self):
+        path = self._testfile('integration_1.yml')
+
+        with self.withOutput() as (out, err):
+            expect = Setting(config_path=path, encoding='utf-8', stdout=out, stderr=err).load_config().root_menu
+        with self.withOutput() as (out, err):
+            actual = Setting(config_path=path, encoding='utf-8', stdout=out, stderr=err, workers=4).load_config()
+        self.assertEqual(actual.root_menu, expect)
+
+    def test_load_config_parallel_error(self):
+        inputs = [
+            ('error_include_as_submenu.yml', '"include" section must have string content, not list.'),
+            ('error_multiple_items.yml', 'Menu should have only one item, not 2.'),
+        ]
+
+        for filename, expect in inputs:
+            path = self._testfile(os.path.join('error', filename))
+            with self.withOutput() as (out, err):
+                self.assertRaisesMessage(
+                    ConfigError,
+                    '%s: %s' % (path, expect),
+                    Setting(config_path=path, stdout=out, stderr=err, encoding='utf-8', workers=4).load_config)
+
+    def test_load_config_include_cycle(self):
+        path = self._testfile(os.path.join('error', 'error_include_loop.yml'))
+        path1 = self._testfile(os.path.join('error', 'error_include_cycle_1.yml'))
+        path2 = self._testfile(os.path.join('error', 'error_include_cycle_2.yml'))
+
+        for workers in [1, 4]:
+            with self.withOutput() as (out, err):
+                self.assertRaisesMessage(
+                    ConfigError,
+                    '%s: Include cycle detected: %s -> %s' % (path, path, path),
+                    Setting(config_path=path, stdout=out, stderr=err, encoding='utf-8', workers=workers).load_config)
+
+            with self.withOutput() as (out, err):
+                self.assertRaisesMessage(
+                    ConfigError,
+                    '%s: Include cycle detected: %s -> %s -> %s' % (path2, path1, path2, path1),
+                    Setting(config_path=path1, stdout=out, stderr=err, encoding='utf-8', workers=workers).load_config)
+
+    def test_load_config_lazy(self):
+        meta = Meta(to_unicode(os.path.join(os.path.abspath(os.path.curdir), 'tests', 'resources')), lazy=True)
+        path = self._testfile('integration_1.yml')
+        cmd = 'echo \'{"Dynamic Menu": [{"Menu 4": "exit 4"}]}\''
+
+        with self.withAssertOutput('Reading file: %s\n' % path, '') as (out, err):
+            setting = Setting(config_path=path, encoding='utf-8', stdout=out, stderr=err, lazy=True).load_config()
+        self.assertEqual(setting.root_menu, Menu('Main Menu', [
+            Command('Menu 1', [CommandLine('exit 1', meta)]),
+            Command('Menu 2', [CommandLine('exit 2', meta)]),
+            LazyMenu('integration_2.yml', meta, False, 'integration_2.yml'),
+            LazyMenu(cmd, meta, True, cmd),
+        ], meta))
+
+        # the last known good copies are kept only if enabled
+        self.assertEqual(setting.loader.fallback, None)
+        fallback_dir = tempfile.mkdtemp()
+        try:
+            with self.withOutput() as (out, err):
+                setting = Setting(config_path=path, encoding='utf-8', stdout=out, stderr=err, lazy=True,
+                                  fallback=True, fallback_dir=fallback_dir).load_config()
+            self.assertEqual(setting.loader.fallback.cache_dir, fallback_dir)
+        finally:
+            shutil.rmtree(fallback_dir)
+
     def test_load_config_error_not_found(self):
         self.assertRaisesMessage(
             SettingError,
@@ -279,7 +424,6 @@ class TestSetting(TestCase):
             ('error_command_only.yml', 'Menu content must be list, not str.'),
             ('error_include_as_submenu.yml', '"include" section must have string content, not list.'),
             ('error_dynamic_as_submenu.yml', '"eval" section must have string content, not list.'),
-            ('error_include_loop.yml', 'Nesting level too deep.'),
             ('error_key_only1.yml', 'Menu content must be list, not NoneType.'),
             ('error_key_only2.yml', 'Menu content must be list, not NoneType.'),
             ('error_meta_only.yml', 'Menu should have only one item, not 0.'),
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function, absolute_import, unicode_literals
+
+import gc
+import os
+import time
+import shutil
+import tempfile
+from mog_commons.unittest import TestCase
+from easy_menu.setting.setting import Setting
+from easy_menu.setting.eval_cache import EvalCache
+from easy_menu.entity import Menu, Command, CommandLine, Meta
+from tests.easy_menu.logger.mock_logger import MockLogger
+
+
+class TestWatcher(TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.root_path = os.path.join(self.work_dir, 'root.yml')
+        self.sub1_path = os.path.join(self.work_dir, 'sub1.yml')
+        self.sub2_path = os.path.join(self.work_dir, 'sub2.yml')
+        self._write(self.root_path, 'Main Menu:\n  - include: sub1.yml\n  - include: sub2.yml\n')
+        self._write(self.sub1_path, 'Sub 1:\n  - Menu 1: echo 1\n')
+        self._write(self.sub2_path, 'Sub 2:\n  - Menu 2: echo 2\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    @staticmethod
+    def _write(path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def _load(self, **kwargs):
+        with self.withOutput() as (out, err):
+            return Setting(config_path=self.root_path, encoding='utf-8', stdout=out, watch=True,
+                           **kwargs).load_config()
+
+    def test_rebuild_sub_menu(self):
+        meta = Meta(self.work_dir)
+        watcher = self._load().watcher
+        old = watcher.root_menu
+
+        self.assertEqual(watcher.check(), set())
+
+        self._write(self.sub1_path, 'Sub 1:\n  - Menu 30: echo 30\n')
+        changed = watcher.check()
+        self.assertEqual(changed, set([(False, self.sub1_path)]))
+
+        with self.withAssertOutput('', '') as (out, err):
+            new = watcher.rebuild(changed)
+        self.assertEqual(new, Menu('Main Menu', [
+            Menu('Sub 1', [Command('Menu 30', [CommandLine('echo 30', meta)])], meta),
+            Menu('Sub 2', [Command('Menu 2', [CommandLine('echo 2', meta)])], meta),
+        ], meta))
+
+        # the unchanged sub tree is shared
+        self.assertFalse(new is old)
+        self.assertTrue(new.items[1] is old.items[1])
+        self.assertEqual(old.items[0].items[0].title, 'Menu 1')
+        self.assertEqual(watcher.check(), set())
+
+    def test_rebuild_root(self):
+        meta = Meta(self.work_dir)
+        watcher = self._load().watcher
+
+        self._write(self.root_path, 'Main Menu:\n  - include: sub2.yml\n')
+        self._write(self.sub1_path, 'Sub 1:\n  - Menu 30: echo 30\n')
+        self.assertEqual(watcher.rebuild(watcher.check()), Menu('Main Menu', [
+            Menu('Sub 2', [Command('Menu 2', [CommandLine('echo 2', meta)])], meta),
+        ], meta))
+
+        # sub1.yml is no longer watched
+        self._write(self.sub1_path, 'Sub 1:\n  - Menu 40: echo 40\n')
+        self.assertEqual(watcher.check(), set())
+
+    def test_rebuild_loaders(self):
+        watcher = self._load().watcher
+        for i in range(5):
+            self._write(self.sub1_path, 'Sub 1:\n  - Menu %d: echo %d\n' % (i, i))
+            watcher.rebuild(watcher.check())
+
+        # the loaders of the replaced menus are forgotten
+        gc.collect()
+        self.assertEqual(list(watcher._loaders), [watcher.loader])
+
+    def test_rebuild_stale(self):
+        cache_dir = os.path.join(self.work_dir, 'cache')
+        cmd = 'echo \'{"Dynamic Menu": [{"Menu 4": "exit 4"}]}\''
+        EvalCache(cache_dir).put(cmd, b'{"Dynamic Menu": [{"Menu 4": "exit 4"}]}', 10, now=time.time() - 100)
+        self._write(self.root_path, 'Main Menu:\n  - include: sub1.yml\n  - include: sub2.yml\n  - eval: "%s"\n'
+                                    '    cache: 10\n    stale: 1000\n' % cmd.replace('"', '\\"'))
+
+        setting = self._load(cache_dir=cache_dir)
+        setting.loader.join_refresh()
+        watcher = setting.watcher
+        stale_since = watcher.root_menu.items[2].stale_since
+        self.assertFalse(stale_since is None)
+
+        # the stale data is shared with the rebuilt menus
+        self._write(self.sub1_path, 'Sub 1:\n  - Menu 30: echo 30\n')
+        self.assertEqual(watcher.rebuild(watcher.check()).items[2].stale_since, stale_since)
+        self._write(self.root_path, 'Main Menu:\n  - eval: "%s"\n    cache: 10\n    stale: 1000\n' %
+                    cmd.replace('"', '\\"'))
+        self.assertEqual(watcher.rebuild(watcher.check()).items[0].stale_since, stale_since)
+
+    def test_rebuild_touched(self):
+        watcher = self._load().watcher
+        st = os.stat(self.sub1_path)
+        os.utime(self.sub1_path, (st.st_atime, st.st_mtime + 10))
+        self.assertEqual(watcher.check(), set())
+
+    def test_rebuild_error(self):
+        watcher = self._load(watch_interval=0.05).watcher
+        old = watcher.root_menu
+        logger = MockLogger()
+        watcher.start(logger)
+        try:
+            self._write(self.sub1_path, 'Sub 1: [')
+            time.sleep(0.3)
+            self.assertEqual(watcher.poll(), None)
+            self.assertTrue(watcher.root_menu is old)
+            self.assertTrue(logger.buffer[0][1].startswith('[ERROR]Failed to reload the menu: ConfigError: '))
+
+            # fixed
+            self._write(self.sub1_path, 'Sub 1:\n  - Menu 30: echo 30\n')
+            for _ in range(100):
+                new = watcher.poll()
+                if new is not None:
+                    break
+                time.sleep(0.05)
+            self.assertEqual(new.items[0].items[0].title, 'Menu 30')
+        finally:
+            watcher.stop()
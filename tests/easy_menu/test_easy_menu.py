@@ -5,6 +5,8 @@ import sys
 import os
 import socket
 import getpass
+import shutil
+import tempfile
 from contextlib import contextmanager
 from easy_menu import easy_menu
 from mog_commons.string import *
@@ -50,12 +52,16 @@ class TestTerminal(TestCase):
             self.assertEqual(ml.buffer, [
                 (6, '[INFO] Command started: exit 1'),
                 (6, '[INFO] Command ended with return code: 1'),
+                (6, '[INFO] Resource usage: ...'),
                 (6, '[INFO] Command started: exit 2'),
                 (6, '[INFO] Command ended with return code: 2'),
+                (6, '[INFO] Resource usage: ...'),
                 (6, '[INFO] Command started: exit 3'),
                 (6, '[INFO] Command ended with return code: 3'),
+                (6, '[INFO] Resource usage: ...'),
                 (6, '[INFO] Command started: exit 4'),
                 (6, '[INFO] Command ended with return code: 4'),
+                (6, '[INFO] Resource usage: ...'),
             ])
 
     @mock.patch('easy_menu.easy_menu.SystemLogger')
@@ -74,3 +80,84 @@ class TestTerminal(TestCase):
                 self.assertEqual(easy_menu.main(stdout=stdout, stderr=stderr), 2)
 
         self.assertEqual(ml.buffer, [])
+
+    @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
+    @mock.patch('easy_menu.easy_menu.SystemLogger')
+    def test_main_run(self, mock_logger):
+        ml = MockLogger()
+        mock_logger.return_value = ml
+
+        base_dir = os.path.abspath('tests/resources')
+        with self.with_argv(['easy-menu', 'tests/resources/integration_1.yml', '--run',
+                             'Main Menu > Include Menu > Menu 3']):
+            with tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile('w+') as stderr:
+                self.assertEqual(easy_menu.main(stdout=stdout, stderr=stderr), 3)
+
+                # the "eval" section is not needed
+                stderr.seek(0)
+                self.assertEqual(stderr.read(), ''.join('Reading file: %s\n' % os.path.join(base_dir, x)
+                                                        for x in ['integration_1.yml', 'integration_2.yml']))
+
+        self.assertEqual(ml.buffer, [
+            (6, '[INFO] Command started: exit 3'),
+            (6, '[INFO] Command ended with return code: 3'),
+            (6, '[INFO] Resource usage: ...'),
+        ])
+
+    @mock.patch('easy_menu.easy_menu.SystemLogger')
+    def test_main_run_not_found(self, mock_logger):
+        ml = MockLogger()
+        mock_logger.return_value = ml
+
+        for run_path in ['Main Menu > Menu 5', 'Main Menu > Include Menu', 'Main Menu > Menu 1 > Menu 2', 'Main']:
+            with self.with_argv(['easy-menu', 'tests/resources/integration_1.yml', '--run', run_path]):
+                with self.withOutput() as (stdout, stderr):
+                    self.assertEqual(easy_menu.main(stdout=stdout, stderr=stderr), 2)
+                    self.assertTrue(stderr.getvalue().endswith('SettingError: Command not found: %s\n' % run_path))
+                    self.assertEqual(stdout.getvalue(), '')
+
+        self.assertEqual(ml.buffer, [])
+
+    @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
+    @mock.patch('easy_menu.easy_menu.SystemLogger')
+    def test_main_run_os_error(self, mock_logger):
+        mock_logger.return_value = MockLogger()
+
+        work_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(work_dir, 'easy-menu.yml')
+            with open(path, 'w') as f:
+                f.write('meta:\n  work_dir: %s\n\nMain Menu:\n  - Menu 1: echo 1\n' % os.path.join(work_dir, 'x'))
+            with self.with_argv(['easy-menu', path, '--run', 'Menu 1']):
+                with tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile('w+') as stderr:
+                    self.assertEqual(easy_menu.main(stdout=stdout, stderr=stderr), 2)
+                    stderr.seek(0)
+                    self.assertTrue(os.path.join(work_dir, 'x') in stderr.read().splitlines()[-1])
+        finally:
+            shutil.rmtree(work_dir)
+
+    @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
+    @mock.patch('easy_menu.easy_menu.SystemLogger')
+    def test_run(self, mock_logger):
+        ml = MockLogger()
+        mock_logger.return_value = ml
+
+        cache_dir = tempfile.mkdtemp()
+        try:
+            with tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile() as stderr:
+                # the root title can be omitted
+                self.assertEqual(easy_menu.run('Menu 2', 'tests/resources/integration_1.yml', stdout=stdout,
+                                               stderr=stderr, cache_dir=cache_dir), 2)
+                self.assertEqual(easy_menu.run('Dynamic Menu > Menu 4', 'tests/resources/integration_1.yml',
+                                               stdout=stdout, stderr=stderr, cache_dir=cache_dir), 4)
+        finally:
+            shutil.rmtree(cache_dir)
+
+        self.assertEqual(ml.buffer, [
+            (6, '[INFO] Command started: exit 2'),
+            (6, '[INFO] Command ended with return code: 2'),
+            (6, '[INFO] Resource usage: ...'),
+            (6, '[INFO] Command started: exit 4'),
+            (6, '[INFO] Command ended with return code: 4'),
+            (6, '[INFO] Resource usage: ...'),
+        ])
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+from __future__ import division, print_function, absolute_import, unicode_literals
+
+import os
+import time
+from mog_commons.unittest import TestCase
+from easy_menu.view import SearchIndex
+from easy_menu.view import search_index
+from easy_menu.entity import Menu, LazyMenu, Command, CommandLine, Meta
+from easy_menu.setting.loader import Loader
+
+
+class TestSearchIndex(TestCase):
+    def _command(self, title):
+        return Command(title, [CommandLine('echo %s' % title, Meta())])
+
+    def _menu(self):
+        return Menu('Main', [
+            self._command('Deploy web'),
+            Menu('Database', [
+                self._command('Deploy DB'),
+                self._command('Restart'),
+                Menu('Replica', [self._command('Restart'), self._command('Status')], Meta()),
+            ], Meta()),
+            self._command('Status'),
+        ], Meta())
+
+    def test_init(self):
+        index = SearchIndex(self._menu())
+        self.assertEqual([x.title for x in index.items],
+                         ['Deploy web', 'Database', 'Deploy DB', 'Restart', 'Replica', 'Restart', 'Status', 'Status'])
+        self.assertEqual(list(index.parents), [-1, -1, 1, 1, 1, 4, 4, -1])
+        self.assertEqual(list(index.ends), [1, 7, 3, 4, 7, 6, 7, 8])
+
+    def test_search(self):
+        index = SearchIndex(self._menu())
+        self.assertEqual(index.search('deploy', 10), [0, 2])
+        self.assertEqual(index.search('DEPLOY', 10), [0, 2])
+        self.assertEqual(index.search('deploy', 1), [0])
+        self.assertEqual(index.search('restart', 10), [3, 5])
+        self.assertEqual(index.search('restart rep', 10), [5])
+        self.assertEqual(index.search('rep restart', 10), [5])
+        self.assertEqual(index.search('data', 10), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(index.search('data stat', 10), [6])
+        self.assertEqual(index.search('stat', 10), [6, 7])
+        self.assertEqual(index.search('replica > status', 10), [6])
+        self.assertEqual(index.search('xyz', 10), [])
+        self.assertEqual(index.search('deploy xyz', 10), [])
+        self.assertEqual(index.search('  ', 10), [])
+
+    def test_search_sets(self):
+        steps = search_index.MAX_SEARCH_STEPS
+        search_index.MAX_SEARCH_STEPS = 0
+        try:
+            index = SearchIndex(self._menu())
+            self.assertEqual(index.search('deploy', 10), [0, 2])
+            self.assertEqual(index.search('deploy', 1), [0])
+            self.assertEqual(index.search('restart rep', 10), [5])
+            self.assertEqual(index.search('rep restart', 10), [5])
+            self.assertEqual(index.search('data', 10), [1, 2, 3, 4, 5, 6])
+            self.assertEqual(index.search('data stat', 10), [6])
+            self.assertEqual(index.search('replica > status', 10), [6])
+            self.assertEqual(index.search('deploy xyz', 10), [])
+
+            # narrowed from the previous query
+            self.assertEqual(index.search('data s', 10), [1, 2, 3, 4, 5, 6])
+            self.assertEqual(index.search('data st', 10), [3, 5, 6])
+            self.assertEqual(index.search('data sta', 10), [3, 5, 6])
+            self.assertEqual(index.search('data stat', 10), [6])
+        finally:
+            search_index.MAX_SEARCH_STEPS = steps
+
+    def test_search_performance(self):
+        # the words alternate in 100k entries but never match the same entry
+        root_menu = Menu('Main', [
+            Menu('Group %d' % i, [self._command('%s %d-%d' % ('start' if j % 2 else 'stop', i, j)) for j in range(100)],
+                 Meta()) for i in range(1000)], Meta())
+        index = SearchIndex(root_menu)
+
+        t = time.time()
+        for query in ['s', 'st', 'sta', 'star', 'start', 'start ', 'start s', 'start st', 'start sto', 'start stop']:
+            index.search(query, 20)
+        self.assertLess(time.time() - t, 0.5)
+
+        t = time.time()
+        self.assertEqual(index.search('start stop', 20), [])
+        self.assertEqual(index.search('stop start', 20), [])
+        self.assertEqual(index.search('start 999-99', 20), [100999])
+        self.assertLess(time.time() - t, 0.1)
+
+    def test_search_shared(self):
+        shared = Menu('Shared', [self._command('Echo')], Meta())
+        index = SearchIndex(Menu('Main', [Menu('A', [shared], Meta()), Menu('B', [shared], Meta())], Meta()))
+        self.assertEqual(index.search('echo', 10), [2, 5])
+        self.assertEqual(index.titles(5), ['B', 'Shared', 'Echo'])
+
+    def test_titles(self):
+        index = SearchIndex(self._menu())
+        self.assertEqual(index.titles(0), ['Deploy web'])
+        self.assertEqual(index.titles(1), ['Database'])
+        self.assertEqual(index.titles(6), ['Database', 'Replica', 'Status'])
+
+    def test_stack(self):
+        root_menu = self._menu()
+        index = SearchIndex(root_menu)
+        self.assertEqual(index.stack(0), [root_menu])
+        self.assertEqual(index.stack(1), [root_menu])
+        self.assertEqual(index.stack(6), [root_menu, root_menu.items[1], root_menu.items[1].items[2]])
+        self.assertTrue(index.stack(6)[2] is root_menu.items[1].items[2])
+
+    def test_outdated(self):
+        base_dir = os.path.join(os.path.abspath(os.path.curdir), 'tests', 'resources')
+        with self.withOutput() as (out, err):
+            lazy_menu = LazyMenu('flat.yml', Meta(), False, 'flat.yml', None, Loader(base_dir, '.', stdout=out))
+            root_menu = Menu('Main', [lazy_menu], Meta())
+
+            index = SearchIndex(root_menu)
+            self.assertFalse(index.outdated())
+            self.assertEqual(index.search('menu', 10), [])
+
+            lazy_menu.load()
+            self.assertTrue(index.outdated())
+            self.assertFalse(SearchIndex(root_menu).outdated())
+            self.assertEqual(SearchIndex(root_menu).search('menu 3', 10), [3])
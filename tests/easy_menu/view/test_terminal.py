@@ -3,12 +3,17 @@ from __future__ import division, print_function, absolute_import, unicode_litera
 
 import sys
 import os
+import time
+import tempfile
+import shutil
 from datetime import datetime, timedelta
 from mog_commons.unittest import TestCase, base_unittest, FakeInput
 from mog_commons.terminal import TerminalHandler
 from easy_menu.view import Terminal
-from easy_menu.controller import CommandExecutor
-from easy_menu.entity import Menu, Command, CommandLine, Meta
+from easy_menu.controller import CommandExecutor, Job, JobTable
+from easy_menu.controller.executor import LineResult, Usage
+from easy_menu.entity import Menu, LazyMenu, Command, CommandLine, Meta
+from easy_menu.setting.loader import Loader
 from easy_menu.exceptions import SettingError, EncodingError
 
 from tests.easy_menu.logger.mock_logger import MockLogger
@@ -201,6 +206,22 @@ class TestTerminal(TestCase):
             'Press menu number (0-2): '
         ]))
 
+        # menus built from stale data
+        since = time.mktime(datetime(2026, 10, 18, 9, 30, 0).timetuple())
+        self.assertEqual(t.get_page(['Main Menu', 'title'], [
+            Menu('menu a', [Command('menu b', [CommandLine('command b', Meta())])], Meta(), stale_since=since),
+        ], 0, 1, since), '\n'.join([
+            'Host: host                                                            User: user',
+            '================================================================================',
+            '  Main Menu > title (stale since 2026-10-18 09:30:00)',
+            '--------------------------------------------------------------------------------',
+            '  [1] | Go to menu a (stale since 2026-10-18 09:30:00)',
+            '------+-------------------------------------------------------------------------',
+            '  [0] | Return to Main Menu',
+            '================================================================================',
+            'Press menu number (0-1): '
+        ]))
+
         # multiple command lines
         self.assertEqual(t.get_page(['Main Menu', 'title'], [
             Command('menu a', [CommandLine('command a', Meta())]),
@@ -226,6 +247,41 @@ class TestTerminal(TestCase):
             'Press menu number (0-3): '
         ]))
 
+    def test_get_page_running(self):
+        self.maxDiff = None
+
+        t = Terminal({'': []}, 'host', 'user', self.get_exec(), handler=self.handler, encoding='utf-8', lang='C',
+                     width=80)
+        self.assertEqual(t.get_page(['title'], [
+            Command('menu a', [CommandLine('command a', Meta(lock=True))]),
+            Menu('menu b', [], Meta()),
+            Command('menu c', [CommandLine('command c', Meta(lock=True))]),
+        ], 0, 1, running=[True, False, False]), '\n'.join([
+            'Host: host                                                            User: user',
+            '================================================================================',
+            '  title',
+            '--------------------------------------------------------------------------------',
+            '  [1] | menu a (running)',
+            '  [2] | Go to menu b',
+            '  [3] | menu c',
+            '------+-------------------------------------------------------------------------',
+            '  [0] | Quit',
+            '================================================================================',
+            'Press menu number (0-3): '
+        ]))
+
+    def test_get_running(self):
+        t = Terminal({'': []}, 'host', 'user', MockExecutor(0, True), handler=self.handler)
+        items = [
+            Command('menu a', [CommandLine('command a', Meta(lock=True))]),
+            Menu('menu b', [], Meta()),
+        ]
+        self.assertEqual(t._get_running(items), [True, False])
+        self.assertEqual(t._get_running([Menu('menu b', [], Meta())]), [False])
+
+        t = Terminal({'': []}, 'host', 'user', MockExecutor(0, False), handler=self.handler)
+        self.assertEqual(t._get_running(items), [False, False])
+
     def test_get_page_ja(self):
         self.maxDiff = None
 
@@ -406,6 +462,22 @@ class TestTerminal(TestCase):
             '番号を入力してください (0-3): '
         ]))
 
+    def test_restore_stack(self):
+        a = Menu('a', [Command('x', [CommandLine('echo x', Meta())])], Meta())
+        b = Menu('b', [a], Meta())
+        root = Menu('root', [b], Meta())
+
+        new_a = Menu('a', [], Meta())
+        new_root = Menu('root', [Menu('b', [new_a], Meta())], Meta())
+        stack = Terminal.restore_stack([root, b, a], new_root)
+        self.assertEqual(len(stack), 3)
+        self.assertTrue(stack[0] is new_root)
+        self.assertTrue(stack[2] is new_a)
+
+        # the sub menu has been removed
+        stack = Terminal.restore_stack([root, b, a], Menu('root', [Menu('b', [], Meta())], Meta()))
+        self.assertEqual([m.title for m in stack], ['root', 'b'])
+
     def test_get_confirm(self):
         self.maxDiff = None
 
@@ -421,6 +493,37 @@ class TestTerminal(TestCase):
             'Do you really want to execute? (y/n) [n]: '
         ]))
 
+    def test_get_slot(self):
+        self.maxDiff = None
+
+        t = Terminal({'': []}, 'host', 'user', self.get_exec(), handler=self.handler, encoding='utf-8', lang='C',
+                     width=80)
+        self.assertEqual(t.get_slot_wait('description', 3, 2), '\n'.join([
+            'Host: host                                                            User: user',
+            '================================================================================',
+            '  Concurrency limit',
+            '--------------------------------------------------------------------------------',
+            '  description is running at the limit of 3.',
+            '  Waiting for a free slot: position 2 in the queue',
+            '================================================================================',
+            'Press any key to cancel...'
+        ]))
+
+    def test_get_slot_ja(self):
+        self.maxDiff = None
+
+        t = Terminal({'': []}, 'ホスト', 'ユーザ', self.get_exec(), handler=self.handler, encoding='utf-8', lang='ja_JP',
+                     width=80)
+        self.assertEqual(t.get_slot_full('メニュー 1', 3), '\n'.join([
+            'ホスト名: ホスト                                              実行ユーザ: ユーザ',
+            '================================================================================',
+            '  同時実行数の制限',
+            '--------------------------------------------------------------------------------',
+            '  メニュー 1 は同時実行数の上限 (3) に達しています。',
+            '================================================================================',
+            '空きを待ちますか? (y/n) [n]: '
+        ]))
+
     def test_get_confirm_ja(self):
         self.maxDiff = None
 
@@ -436,6 +539,112 @@ class TestTerminal(TestCase):
             'よろしいですか? (y/n) [n]: '
         ]))
 
+    def test_get_confirm_background(self):
+        self.maxDiff = None
+
+        t = Terminal({'': []}, 'host', 'user', self.get_exec(), handler=self.handler, encoding='utf-8', lang='C',
+                     width=80)
+        self.assertEqual(t.get_confirm('description', background_enabled=True), '\n'.join([
+            'Host: host                                                            User: user',
+            '================================================================================',
+            '  Confirmation',
+            '--------------------------------------------------------------------------------',
+            '  Would execute: description',
+            '================================================================================',
+            'Do you really want to execute? (y/n, b: in background) [n]: '
+        ]))
+        self.assertEqual(t.get_confirm('description', background=True), '\n'.join([
+            'Host: host                                                            User: user',
+            '================================================================================',
+            '  Confirmation',
+            '--------------------------------------------------------------------------------',
+            '  Would execute in background: description',
+            '================================================================================',
+            'Do you really want to execute? (y/n) [n]: '
+        ]))
+
+    def test_get_jobs(self):
+        self.maxDiff = None
+
+        t = Terminal({'': []}, 'host', 'user', self.get_exec(), handler=self.handler, encoding='utf-8', lang='C',
+                     width=80)
+        job1 = Job(1, 'Deploy', '/tmp/1.log', datetime(2015, 12, 3, 4, 56, 7))
+        job2 = Job(2, 'Backup', '/tmp/2.log', datetime(2015, 12, 3, 4, 58, 7))
+        job2.return_code, job2.end_time = 3, datetime(2015, 12, 3, 4, 58, 10)
+        now = datetime(2015, 12, 3, 5, 6, 8)
+
+        self.assertEqual(t.get_jobs([job1, job2], now, 'Main menu'), '\n'.join([
+            'Host: host                                                            User: user',
+            '================================================================================',
+            '  Background jobs',
+            '--------------------------------------------------------------------------------',
+            '  [1] | #1 Deploy - running for 10m 1s',
+            '  [2] | #2 Backup - return code 3 in 3s',
+            '------+-------------------------------------------------------------------------',
+            '  [0] | Return to Main menu',
+            '================================================================================',
+            'Press menu number (0-2): ',
+        ]))
+        self.assertEqual(t.get_job_log(job2, ['line 1', 'line 2'], now), '\n'.join([
+            'Host: host                                                            User: user',
+            '================================================================================',
+            '  #2 Backup - return code 3 in 3s',
+            '--------------------------------------------------------------------------------',
+            '  Log file: /tmp/2.log',
+            '--------------------------------------------------------------------------------',
+            'line 1',
+            'line 2',
+            '================================================================================',
+            'Press any key to continue...',
+        ]))
+        self.assertEqual(t.get_page(['Main menu'], [], 0, 1, jobs=[job1, job2]), '\n'.join([
+            'Host: host                                                            User: user',
+            '================================================================================',
+            '  Main menu',
+            '--------------------------------------------------------------------------------',
+            '  [J] | Background jobs (1 running / 2)',
+            '------+-------------------------------------------------------------------------',
+            '  [0] | Quit',
+            '================================================================================',
+            'Press menu number (0-0): ',
+        ]))
+
+    @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
+    def test_loop_background(self):
+        root_menu = Menu('Main', [
+            Command('Job 1', [CommandLine('echo job 1', Meta())]),
+            Command('Job 2', [CommandLine('echo job 2', Meta(background=True))]),
+        ], Meta())
+
+        _in = FakeInput('\n'.join(['1', 'b', 'x', '2', 'y', 'x', 'j', '1', 'x', '0', '-', '0', '']))
+
+        tempdir = tempfile.mkdtemp()
+        try:
+            with self.withOutput() as (out, err):
+                executor = self.get_exec(encoding='utf-8', stdout=out, stderr=out, pid_dir=tempdir)
+                t = Terminal(
+                    root_menu, 'host', 'user', executor,
+                    handler=TerminalHandler(stdin=_in, stdout=out, stderr=out, keep_input_clean=False,
+                                            getch_enabled=False),
+                    _input=_in, _output=out, encoding='utf-8', lang='en_US', width=80, timing=False,
+                    job_table=JobTable(executor, os.path.join(tempdir, 'job')))
+                t.loop()
+
+            self.assertTrue('  Started in background: Job 1\n' in out.getvalue())
+            self.assertTrue('  Would execute in background: Job 2\n' in out.getvalue())
+            self.assertTrue('  Started in background: Job 2\n' in out.getvalue())
+            self.assertTrue('  [J] | Background jobs (' in out.getvalue())
+            self.assertTrue('  [1] | #1 Job 1 - ' in out.getvalue())
+            self.assertTrue('  Log file: %s\n' % t.job_table.jobs[0].log_path in out.getvalue())
+
+            for job in t.job_table.jobs:
+                while job.running:
+                    time.sleep(0.05)
+                with open(job.log_path) as f:
+                    self.assertEqual(f.read(), '%s\n' % job.title.lower())
+        finally:
+            shutil.rmtree(tempdir)
+
     def test_get_before_execute(self):
         self.maxDiff = None
 
@@ -462,6 +671,61 @@ class TestTerminal(TestCase):
             ''
         ]))
 
+    def test_get_loading(self):
+        t = Terminal({'': []}, 'host', 'user', self.get_exec(), handler=self.handler, encoding='utf-8', lang='C',
+                     width=80)
+        self.assertEqual(t.get_loading('sub.yml'), '\n'.join([
+            'Host: host                                                            User: user',
+            '================================================================================',
+            '  Loading: sub.yml',
+            '--------------------------------------------------------------------------------',
+            ''
+        ]))
+
+    def test_load_menu(self):
+        self.maxDiff = None
+
+        base_dir = os.path.join(os.path.abspath(os.path.curdir), 'tests', 'resources')
+        path = os.path.join(base_dir, 'flat.yml')
+        error_path = os.path.join(base_dir, 'error', 'error_not_exist.yml')
+        _in = FakeInput('x')
+
+        with self.withOutput() as (out, err):
+            t = Terminal(
+                Menu('', [], Meta()), 'host', 'user', self.get_exec(encoding='utf-8', stdout=out, stderr=err),
+                handler=TerminalHandler(stdin=_in, stdout=out, stderr=err, keep_input_clean=False, getch_enabled=False),
+                _input=_in, _output=out, encoding='utf-8', lang='en_US', width=80, timing=False)
+            loader = Loader(base_dir, '.', stdout=out)
+
+            menu = LazyMenu('flat.yml', Meta(), False, 'flat.yml', None, loader)
+            self.assertTrue(t.load_menu(menu))
+            self.assertEqual(menu.title, 'Main Menu')
+            self.assertTrue(t.load_menu(menu))
+
+            menu = LazyMenu('error_not_exist.yml', Meta(), False, error_path, None, loader)
+            self.assertFalse(t.load_menu(menu))
+            self.assertEqual(menu.title, 'error_not_exist.yml')
+
+        self.assertEqual(out.getvalue(), '\n'.join([
+            'Host: host                                                            User: user',
+            '================================================================================',
+            '  Loading: flat.yml',
+            '--------------------------------------------------------------------------------',
+            'Reading file: %s' % path,
+            'Host: host                                                            User: user',
+            '================================================================================',
+            '  Loading: error_not_exist.yml',
+            '--------------------------------------------------------------------------------',
+            'Reading file: %s' % error_path,
+            'Host: host                                                            User: user',
+            '================================================================================',
+            '  Failed to load: error_not_exist.yml',
+            '--------------------------------------------------------------------------------',
+            'ConfigError: %s: Failed to open.' % error_path,
+            '================================================================================',
+            'Press any key to continue...',
+        ]))
+
     def test_get_after_execute(self):
         self.maxDiff = None
 
@@ -478,6 +742,36 @@ class TestTerminal(TestCase):
             'Press any key to continue...'
         ]))
 
+    def test_get_after_execute_reason(self):
+        self.maxDiff = None
+
+        t = Terminal({'': []}, 'host', 'user', self.get_exec(), handler=self.handler, encoding='utf-8', lang='C',
+                     width=80, timing=False)
+        result = LineResult(CommandLine('sleep 100', Meta(timeout=1.5)), 124, None, None, 'timeout', None)
+        self.assertEqual(t.get_after_execute('description', 124, None, None, reason=t._get_end_reason(result)),
+                         '\n'.join([
+                             '--------------------------------------------------------------------------------',
+                             'Return code: 124',
+                             'Reason     : Timed out after 1.5 seconds',
+                             '================================================================================',
+                             'Press any key to continue...'
+                         ]))
+
+    def test_get_end_reason(self):
+        t = Terminal({'': []}, 'host', 'user', self.get_exec(), handler=self.handler, encoding='utf-8', lang='C')
+        cmd = CommandLine('x', Meta(timeout=10, cpu_limit=3))
+        self.assertEqual(t._get_end_reason(None), None)
+        self.assertEqual(t._get_end_reason(LineResult(cmd, 0, None, None, None, None)), None)
+        self.assertEqual(t._get_end_reason(LineResult(cmd, 124, None, None, 'timeout', None)),
+                         'Timed out after 10 seconds')
+        self.assertEqual(t._get_end_reason(LineResult(cmd, 130, None, None, 'interrupted', None)), 'Interrupted')
+        self.assertEqual(t._get_end_reason(LineResult(cmd, 152, None, None, 'cpu_limit', None)),
+                         'CPU time limit exceeded (3 seconds)')
+        self.assertEqual(t._get_end_reason(LineResult(cmd, 137, None, None, 'signal', None)), 'Killed by signal 9')
+
+        t = Terminal({'': []}, 'host', 'user', self.get_exec(), handler=self.handler, encoding='utf-8', lang='ja_JP')
+        self.assertEqual(t._get_end_reason(LineResult(cmd, 124, None, None, 'timeout', None)), '10 秒でタイムアウトしました')
+
     def test_get_after_execute_ja(self):
         self.maxDiff = None
 
@@ -494,6 +788,93 @@ class TestTerminal(TestCase):
             '何かキーを押すとメニューに戻ります...'
         ]))
 
+    def test_get_after_execute_parallel(self):
+        self.maxDiff = None
+
+        t = Terminal({'': []}, 'host', 'user', self.get_exec(), handler=self.handler, encoding='utf-8', lang='C',
+                     width=80, timing=False)
+        results = [
+            LineResult(CommandLine('ssh server-%d sudo systemctl restart httpd' % i, Meta()), i, datetime(2015, 12, 3),
+                       datetime(2015, 12, 3, 0, 0, i), None, None) for i in range(10)
+        ] + [LineResult(CommandLine('echo ' + 'x' * 80, Meta()), None, None, None, None, None)]
+
+        self.assertEqual(t.get_after_execute('description', 1, datetime(2015, 12, 3), datetime(2015, 12, 3), results),
+                         '\n'.join([
+                             '--------------------------------------------------------------------------------',
+                             'Return code: 1',
+                             '--------------------------------------------------------------------------------',
+                             '      Return code  Command',
+                             '[ 1]            0  ssh server-0 sudo systemctl restart httpd',
+                             '[ 2]            1  ssh server-1 sudo systemctl restart httpd',
+                             '[ 3]            2  ssh server-2 sudo systemctl restart httpd',
+                             '[ 4]            3  ssh server-3 sudo systemctl restart httpd',
+                             '[ 5]            4  ssh server-4 sudo systemctl restart httpd',
+                             '[ 6]            5  ssh server-5 sudo systemctl restart httpd',
+                             '[ 7]            6  ssh server-6 sudo systemctl restart httpd',
+                             '[ 8]            7  ssh server-7 sudo systemctl restart httpd',
+                             '[ 9]            8  ssh server-8 sudo systemctl restart httpd',
+                             '[10]            9  ssh server-9 sudo systemctl restart httpd',
+                             '[11]            -  echo %s' % ('x' * 56),
+                             '================================================================================',
+                             'Press any key to continue...',
+                         ]))
+
+        t = Terminal({'': []}, 'host', 'user', self.get_exec(), handler=self.handler, encoding='utf-8', lang='C',
+                     width=80)
+        self.assertEqual(t.get_after_execute('description', 1, datetime(2015, 12, 3), datetime(2015, 12, 3), results),
+                         '\n'.join([
+                             '--------------------------------------------------------------------------------',
+                             'Finished    : description',
+                             'Running time: 0ms  (2015-12-03 00:00:00 -> 2015-12-03 00:00:00)',
+                             'Return code : 1',
+                             '--------------------------------------------------------------------------------',
+                             '      Return code  Running time  Command',
+                             '[ 1]            0           0ms  ssh server-0 sudo systemctl restart httpd',
+                             '[ 2]            1            1s  ssh server-1 sudo systemctl restart httpd',
+                             '[ 3]            2            2s  ssh server-2 sudo systemctl restart httpd',
+                             '[ 4]            3            3s  ssh server-3 sudo systemctl restart httpd',
+                             '[ 5]            4            4s  ssh server-4 sudo systemctl restart httpd',
+                             '[ 6]            5            5s  ssh server-5 sudo systemctl restart httpd',
+                             '[ 7]            6            6s  ssh server-6 sudo systemctl restart httpd',
+                             '[ 8]            7            7s  ssh server-7 sudo systemctl restart httpd',
+                             '[ 9]            8            8s  ssh server-8 sudo systemctl restart httpd',
+                             '[10]            9            9s  ssh server-9 sudo systemctl restart httpd',
+                             '[11]            -                echo %s' % ('x' * 42),
+                             '================================================================================',
+                             'Press any key to continue...',
+                         ]))
+
+    def test_get_after_execute_usage(self):
+        self.maxDiff = None
+
+        t = Terminal({'': []}, 'host', 'user', self.get_exec(), handler=self.handler, encoding='utf-8', lang='C',
+                     width=80)
+        results = [
+            LineResult(CommandLine('make', Meta()), 0, datetime(2015, 12, 3), datetime(2015, 12, 3, 0, 1, 2), None,
+                       Usage(50.5, 9.25, 123 * 1024 * 1024, 10, 2048, 300, 40)),
+            LineResult(CommandLine('make install', Meta()), 2, datetime(2015, 12, 3, 0, 1, 2),
+                       datetime(2015, 12, 3, 0, 1, 3), None, Usage(0.5, 0.25, 8 * 1024 * 1024, 0, 16, 3, 1)),
+        ]
+        usage = Usage.total(r.usage for r in results)
+        self.assertEqual(t.get_after_execute('build', 2, datetime(2015, 12, 3), datetime(2015, 12, 3, 0, 1, 3),
+                                             results, usage=usage),
+                         '\n'.join([
+                             '--------------------------------------------------------------------------------',
+                             'Finished        : build',
+                             'Running time    : 1m 3s  (2015-12-03 00:00:00 -> 2015-12-03 00:01:03)',
+                             'Return code     : 2',
+                             'CPU time        : user 51.00s, sys 9.50s',
+                             'Max RSS         : 123.0 MB',
+                             'Block I/O       : 10 in, 2064 out',
+                             'Context switches: 303 voluntary, 41 involuntary',
+                             '--------------------------------------------------------------------------------',
+                             '     Return code  Running time  CPU time   Max RSS  Command',
+                             '[1]            0         1m 2s    59.75s  123.0 MB  make',
+                             '[2]            2            1s     0.75s    8.0 MB  make install',
+                             '================================================================================',
+                             'Press any key to continue...',
+                         ]))
+
     def test_format_timedelta(self):
         self.assertEqual(Terminal._format_timedelta(timedelta(-1, 1)), '')
         self.assertEqual(Terminal._format_timedelta(timedelta(0, 0)), '0ms')
@@ -546,6 +927,130 @@ class TestTerminal(TestCase):
                 _input=_in, _output=out, encoding='utf-8', lang='en_US', width=80, timing=False)
             t.loop()
 
+    def test_get_search(self):
+        self.maxDiff = None
+
+        t = Terminal({'': []}, 'host', 'user', self.get_exec(), handler=self.handler, encoding='utf-8', lang='C',
+                     width=40)
+        self.assertEqual(t.get_search('', [], False, False), '\n'.join([
+            'Host: host                    User: user',
+            '========================================',
+            '  Search: ',
+            '----------------------------------------',
+            '========================================',
+            'Type words to search, Enter to choose, Esc to cancel: ',
+        ]))
+        self.assertEqual(t.get_search('xyz', [], False, False), '\n'.join([
+            'Host: host                    User: user',
+            '========================================',
+            '  Search: xyz',
+            '----------------------------------------',
+            '  No matches.',
+            '========================================',
+            'Type words to search, Enter to choose, Esc to cancel: ',
+        ]))
+        titles_list = [['Restart'], ['Sub Menu 1', 'Sub Menu 2', 'Sub Menu 3', 'Restart']]
+        self.assertEqual(t.get_search('re', titles_list, True, True), '\n'.join([
+            'Host: host                    User: user',
+            '========================================',
+            '  Search: re',
+            '----------------------------------------',
+            '  [1] | Restart',
+            '  [2] | ~b Menu 2 > Sub Menu 3 > Restart',
+            '  ... more matches (type more words)',
+            '------+---------------------------------',
+            '  [0] | Edit the query',
+            '========================================',
+            'Press menu number (0-2): ',
+        ]))
+
+    def test_get_search_ja(self):
+        self.maxDiff = None
+
+        t = Terminal({'': []}, 'host', 'user', self.get_exec(), handler=self.handler, encoding='utf-8', lang='ja_JP',
+                     width=40)
+        self.assertEqual(t.get_search('xyz', [], False, False), '\n'.join([
+            'ホスト名: host          実行ユーザ: user',
+            '========================================',
+            '  検索: xyz',
+            '----------------------------------------',
+            '  該当なし',
+            '========================================',
+            '検索語を入力してください (Enter: 選択, Esc: 中止): ',
+        ]))
+
+    @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
+    def test_search(self):
+        root_menu = Menu('Main', [
+            Command('Deploy web', [CommandLine('echo deploy web', Meta())]),
+            Menu('Database', [
+                Command('Deploy db', [CommandLine('echo deploy db', Meta())]),
+                Command('Restart db', [CommandLine('echo restart db', Meta())]),
+            ], Meta()),
+        ], Meta())
+
+        # 1. single match: go to the parent menu after the confirmation
+        # 2. edit the query, then single match
+        # 3. choose from multiple matches (invalid number is ignored)
+        # 4. go to the sub menu
+        # 5. no matches, cancel
+        _in = FakeInput('\n'.join(['/', 'restart', 'n', '0', '/', 'deploy', '0', 'deploy db', 'y', 'x', '0',
+                                   '/', 'deploy', '3', '1', 'y', 'x', '/', 'data', '1', '0', '/', 'xyz', '', '0', '']))
+
+        # We use a temporary file due to capture the output of subprocess#call.
+        with self.withOutput() as (out, err), tempfile.TemporaryFile() as f:
+            t = Terminal(
+                root_menu, 'host', 'user', self.get_exec(encoding='utf-8', stdout=f, stderr=f),
+                handler=TerminalHandler(stdin=_in, stdout=out, stderr=out, keep_input_clean=False, getch_enabled=False),
+                _input=_in, _output=out, encoding='utf-8', lang='en_US', width=80, timing=False)
+            t.loop()
+
+        self.assertTrue('  Would execute: Restart db' in out.getvalue())
+        self.assertTrue('  [2] | Database > Deploy db' in out.getvalue())
+        self.assertTrue('  No matches.' in out.getvalue())
+        self.assertEqual(out.getvalue().count('  Main > Database\n'), 3)
+        self.assertEqual(t.executor.logger.buffer, [
+            (6, '[INFO] Command started: echo deploy db'),
+            (6, '[INFO] Command ended with return code: 0'),
+            (6, '[INFO] Resource usage: ...'),
+            (6, '[INFO] Command started: echo deploy web'),
+            (6, '[INFO] Command ended with return code: 0'),
+            (6, '[INFO] Resource usage: ...'),
+        ])
+
+    def test_search_getch(self):
+        root_menu = Menu('Main', [
+            Command('Deploy web', [CommandLine('echo deploy web', Meta())]),
+            Command('Deploy db', [CommandLine('echo deploy db', Meta())]),
+        ], Meta())
+
+        # typed keys are not dropped even if repeated
+        _in = FakeInput(''.join(['/', 'dd', '\x7f', '\x1b', '/', 'dep', '\x7f', 'p db', '\r', 'n', '0']))
+
+        with self.withOutput() as (out, err):
+            handler = TerminalHandler(stdin=_in, stdout=out, stderr=out, keep_input_clean=False)
+            if not handler.getch_enabled:
+                return
+            t = Terminal(
+                root_menu, 'host', 'user', self.get_exec(encoding='utf-8', stdout=out, stderr=out),
+                handler=handler, _input=_in, _output=out, encoding='utf-8', lang='en_US', width=80, timing=False)
+            t.loop()
+
+        self.assertTrue('  Search: dd\n' in out.getvalue())
+        self.assertTrue('  Would execute: Deploy db' in out.getvalue())
+        self.assertEqual(handler.getch_repeat_threshold, 0.3)
+
+    def test_get_search_index(self):
+        root_menu = Menu('Main', [Command('Deploy web', [CommandLine('echo deploy web', Meta())])], Meta())
+        t = Terminal(root_menu, 'host', 'user', self.get_exec(), handler=self.handler)
+        index = t.get_search_index()
+        self.assertTrue(index.root_menu is root_menu)
+        self.assertTrue(t.get_search_index() is index)
+
+        t.root_menu = Menu('Main', [], Meta())
+        self.assertFalse(t.get_search_index() is index)
+        self.assertTrue(t.get_search_index().root_menu is t.root_menu)
+
     def test_print_source(self):
         self.maxDiff = None
 
@@ -633,12 +1138,16 @@ class TestTerminal(TestCase):
         self.assertEqual(t.executor.logger.buffer, [
             (6, '[INFO] Command started: echo executing a'),
             (6, '[INFO] Command ended with return code: 0'),
+            (6, '[INFO] Resource usage: ...'),
             (6, '[INFO] Command started: echo executing b && exit 130'),
             (6, '[INFO] Command ended with return code: 130'),
+            (6, '[INFO] Resource usage: ...'),
             (6, '[INFO] Command started: echo executing 10'),
             (6, '[INFO] Command ended with return code: 0'),
+            (6, '[INFO] Resource usage: ...'),
             (6, '[INFO] Command started: echo executing 9'),
             (6, '[INFO] Command ended with return code: 0'),
+            (6, '[INFO] Resource usage: ...'),
         ])
 
     @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
@@ -663,6 +1172,7 @@ class TestTerminal(TestCase):
         self.assertEqual(t.executor.logger.buffer, [
             (6, "[INFO] Command started: echo 'あいうえお'"),
             (6, "[INFO] Command ended with return code: 0"),
+            (6, '[INFO] Resource usage: ...'),
         ])
 
     @base_unittest.skipUnless(os.name != 'nt', 'requires POSIX compatible')
@@ -705,16 +1215,22 @@ class TestTerminal(TestCase):
         self.assertEqual(t.executor.logger.buffer, [
             (6, '[INFO] Command started: echo 1'),
             (6, '[INFO] Command ended with return code: 0'),
+            (6, '[INFO] Resource usage: ...'),
             (6, '[INFO] Command started: echo 2'),
             (6, '[INFO] Command ended with return code: 0'),
+            (6, '[INFO] Resource usage: ...'),
             (6, '[INFO] Command started: echo 3'),
             (6, '[INFO] Command ended with return code: 0'),
+            (6, '[INFO] Resource usage: ...'),
             (6, '[INFO] Command started: echo 6'),
             (6, '[INFO] Command ended with return code: 0'),
+            (6, '[INFO] Resource usage: ...'),
             (6, '[INFO] Command started: echo 7'),
             (6, '[INFO] Command ended with return code: 0'),
+            (6, '[INFO] Resource usage: ...'),
             (6, '[INFO] Command started: false'),
             (6, '[INFO] Command ended with return code: 1'),
+            (6, '[INFO] Resource usage: ...'),
         ])
 
     def test_execute_command_duplicate(self):
@@ -771,3 +1287,88 @@ class TestTerminal(TestCase):
                 TerminalHandler(stdin=_in2, stdout=out, stderr=err, keep_input_clean=False, getch_enabled=False),
                 _input=_in2, _output=out, encoding='utf-8', lang='ja_JP', width=80, timing=False)
             t.execute_command(Command('Menu 1', [CommandLine(sleep_cmd, Meta(lock=True))]))
+
+    def test_execute_command_max_concurrent(self):
+        self.maxDiff = None
+        _in = FakeInput('\n'.join(['y', 'n']))
+        command = Command('Menu 1', [CommandLine('echo x', Meta(max_concurrent=1))])
+
+        expected = '\n'.join([
+            'Host: host                                                            User: user',
+            '================================================================================',
+            '  Confirmation',
+            '--------------------------------------------------------------------------------',
+            '  Would execute: Menu 1',
+            '================================================================================',
+            'Do you really want to execute? (y/n) [n]: '
+            'Host: host                                                            User: user',
+            '================================================================================',
+            '  Executing: Menu 1',
+            '--------------------------------------------------------------------------------',
+            'Host: host                                                            User: user',
+            '================================================================================',
+            '  Concurrency limit',
+            '--------------------------------------------------------------------------------',
+            '  Menu 1 is running at the limit of 1.',
+            '================================================================================',
+            'Do you want to wait for a free slot? (y/n) [n]: ',
+        ])
+
+        tempdir = tempfile.mkdtemp()
+        try:
+            with self.withAssertOutput(expected, '') as (out, err):
+                executor = self.get_exec(stdout=out, stderr=out, pid_dir=tempdir)
+                slot = executor.locks.acquire_slot(command.command_lines[0].to_hash_string(), 1)
+                t = Terminal(
+                    Menu('Main Menu', [command]), 'host', 'user', executor,
+                    TerminalHandler(stdin=_in, stdout=out, stderr=err, keep_input_clean=False, getch_enabled=False),
+                    _input=_in, _output=out, encoding='utf-8', lang='en_US', width=80, timing=False)
+                t.execute_command(command)
+                executor.locks.release(slot)
+        finally:
+            shutil.rmtree(tempdir)
+
+    def test_execute_command_max_concurrent_lines(self):
+        self.maxDiff = None
+        _in = FakeInput('\n'.join(['y', 'n']))
+        command = Command('Menu 1', [
+            CommandLine('echo x', Meta(max_concurrent=2)),
+            CommandLine('echo y', Meta(max_concurrent=1)),
+        ])
+
+        expected = '\n'.join([
+            'Host: host                                                            User: user',
+            '================================================================================',
+            '  Confirmation',
+            '--------------------------------------------------------------------------------',
+            '  Would execute: Menu 1',
+            '================================================================================',
+            'Do you really want to execute? (y/n) [n]: '
+            'Host: host                                                            User: user',
+            '================================================================================',
+            '  Executing: Menu 1',
+            '--------------------------------------------------------------------------------',
+            'Host: host                                                            User: user',
+            '================================================================================',
+            '  Concurrency limit',
+            '--------------------------------------------------------------------------------',
+            '  Menu 1: echo x is running at the limit of 2.',
+            '================================================================================',
+            'Do you want to wait for a free slot? (y/n) [n]: ',
+        ])
+
+        tempdir = tempfile.mkdtemp()
+        try:
+            with self.withAssertOutput(expected, '') as (out, err):
+                executor = self.get_exec(stdout=out, stderr=out, pid_dir=tempdir)
+                key = command.command_lines[0].to_hash_string()
+                slots = [executor.locks.acquire_slot(key, 2) for _ in range(2)]
+                t = Terminal(
+                    Menu('Main Menu', [command]), 'host', 'user', executor,
+                    TerminalHandler(stdin=_in, stdout=out, stderr=err, keep_input_clean=False, getch_enabled=False),
+                    _input=_in, _output=out, encoding='utf-8', lang='en_US', width=80, timing=False)
+                t.execute_command(command)
+                for slot in slots:
+                    executor.locks.release(slot)
+        finally:
+            shutil.rmtree(tempdir)